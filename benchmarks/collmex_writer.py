@@ -0,0 +1,62 @@
+"""
+Benchmark for the Collmex import writer.
+
+Encodes RFQs with 1, 100 and 5000 positions for both record types and reports
+the time per document and per line.
+
+Usage (from the repository root):
+    python -m benchmarks.collmex_writer
+"""
+import logging
+import time
+
+from integrations.collmex_csv import iter_encoded_body
+from integrations.erp_collmex import buildCollmexImport
+
+POSITION_COUNTS = (1, 100, 5000)
+REPEATS = 5
+
+
+def make_rfq(positions):
+    """Builds a synthetic RFQ with the given number of positions."""
+    return {
+        "referenceNumber": "BENCH-1",
+        "submittedDate": "2025-03-01T10:00:00Z",
+        "discountPercentage": 2.5,
+        "freightCost": 120.0,
+        "lineItems": [
+            {
+                "id": f"item-{number}",
+                "number": number,
+                "description": f"Pump seal kit; size {number}\nstainless",
+                "quantity": 2,
+                "unitPrice": 10.5 + number,
+                "discountPercentage": 3,
+                "partIdentification": [{"partType": "OEM", "partCode": f"X-{number}"}],
+                "equipmentSection": {"name": "Main engine", "manufacturer": "MAN", "serialNumber": "S-1"},
+                "comment": "urgent",
+            }
+            for number in range(1, positions + 1)
+        ],
+    }
+
+
+def run():
+    logging.disable(logging.INFO)
+    print(f"{'docType':<16}{'positions':>10}{'ms/doc':>12}{'us/line':>12}{'kB':>10}")
+    for doc_type in ("RequestForQuote", "PurchaseOrder"):
+        for positions in POSITION_COUNTS:
+            data = make_rfq(positions)
+            best = None
+            size = 0
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                lines, _processed = buildCollmexImport(data, docType=doc_type)
+                size = sum(len(chunk) for chunk in iter_encoded_body(lines))
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{doc_type:<16}{positions:>10}{best * 1000:>12.2f}{best * 1e6 / positions:>12.1f}{size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,115 @@
+"""
+Benchmark for the date normalisation engine.
+
+Compares date_engine.to_collmex_date with a copy of the former strptime loop of
+format_document_date, for a mix of input shapes as they occur in portal documents.
+Also checks that both produce the same Collmex date for every sample.
+
+Usage (from the repository root):
+    python -m benchmarks.date_engine
+"""
+import logging
+import time
+from datetime import datetime
+
+from date_engine import normalize_date, to_collmex_date
+
+SAMPLES = (
+    "2025-03-01T10:00:00.123Z",
+    "2025-03-01T10:00:00Z",
+    "2025-03-01T10:00:00+0100",
+    "2025-03-01T10:00:00.5",
+    "2025-03-01T10:00:00",
+    "2025-03-01",
+    "01.03.2025",
+    "03/01/2025",
+    "25/12/2025",
+    "20250301",
+)
+ITERATIONS = 20000
+
+
+def legacy_format_document_date(date_value):
+    """Former implementation of erp_collmex.format_document_date."""
+    if date_value is None:
+        return datetime.utcnow().strftime("%Y%m%d")
+    if isinstance(date_value, datetime):
+        return date_value.strftime("%Y%m%d")
+    if isinstance(date_value, str):
+        date_formats = [
+            "%Y-%m-%dT%H:%M:%S.%fZ",
+            "%Y-%m-%dT%H:%M:%SZ",
+            "%Y-%m-%dT%H:%M:%S%z",
+            "%Y-%m-%dT%H:%M:%S.%f",
+            "%Y-%m-%dT%H:%M:%S",
+            "%Y-%m-%d",
+            "%d.%m.%Y",
+            "%m/%d/%Y",
+            "%d/%m/%Y",
+            "%Y%m%d"
+        ]
+        if 'Z' in date_value:
+            try:
+                date_obj = datetime.fromisoformat(date_value.replace('Z', '+00:00'))
+                return date_obj.strftime("%Y%m%d")
+            except ValueError:
+                pass
+        for fmt in date_formats:
+            try:
+                date_obj = datetime.strptime(date_value, fmt)
+                return date_obj.strftime("%Y%m%d")
+            except ValueError:
+                continue
+    return datetime.utcnow().strftime("%Y%m%d")
+
+
+def legacy_all_formats(date_value):
+    """Former way of getting Collmex date, SharePoint date and ISO timestamp."""
+    return (
+        legacy_format_document_date(date_value),
+        date_value[:10],
+        datetime.utcnow().isoformat() + "Z",
+    )
+
+
+def engine_all_formats(date_value):
+    formats = normalize_date(date_value)
+    return formats.collmex, formats.sharepoint, formats.iso_z
+
+
+def measure(function, samples):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        for sample in samples:
+            function(sample)
+    return (time.perf_counter() - start) * 1e6 / (ITERATIONS * len(samples))
+
+
+def run():
+    logging.disable(logging.WARNING)
+    for sample in SAMPLES:
+        legacy, engine = legacy_format_document_date(sample), to_collmex_date(sample)
+        if legacy != engine:
+            raise AssertionError(f"{sample}: legacy {legacy} != engine {engine}")
+
+    print(f"{'variant':<28}{'us/value':>12}")
+    print(f"{'legacy collmex date':<28}{measure(legacy_format_document_date, SAMPLES):>12.2f}")
+    print(f"{'engine collmex date':<28}{measure(to_collmex_date, SAMPLES):>12.2f}")
+    print(f"{'legacy all formats':<28}{measure(legacy_all_formats, SAMPLES):>12.2f}")
+    print(f"{'engine all formats':<28}{measure(engine_all_formats, SAMPLES):>12.2f}")
+
+    # Ohne Memoisierung: jeder Wert ist neu (gemischte Formen, alle Zielformate)
+    unique = []
+    for month in range(1, 13):
+        for day in range(1, 29):
+            unique += [f"2025-{month:02d}-{day:02d}T10:00:00Z", f"2025-{month:02d}-{day:02d}",
+                       f"{day:02d}.{month:02d}.2025", f"2025{month:02d}{day:02d}"]
+    for label, function in (("legacy unique values", legacy_all_formats), ("engine unique values", engine_all_formats)):
+        start = time.perf_counter()
+        for sample in unique:
+            function(sample)
+        print(f"{label:<28}{(time.perf_counter() - start) * 1e6 / len(unique):>12.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,86 @@
+"""
+Benchmark for matching quotation items to existing Odoo order lines.
+
+Matches 100, 1000 and 2000 items against offers with as many lines with
+line_matcher.LineMatcher and with the former four-step loop of
+ERPodooIntegration.update_existing_offer, whose item-number fallback scanned
+every line name per item. In the "mixed" case a third of the items only match
+by item number, in the "renamed" case every description was changed.
+
+Usage (from the repository root):
+    python -m benchmarks.line_matcher
+"""
+import random
+import time
+
+from integrations.line_matcher import LineMatcher
+
+SIZES = (100, 1000, 2000)
+REPEATS = 3
+
+
+def legacy_match(lines, items):
+    """Former matching of update_existing_offer (without logging)."""
+    line_map = {line['name'].strip(): line['id'] for line in lines}
+    line_sequence_map = {line['sequence']: line['id'] for line in lines if 'sequence' in line}
+    matched = []
+    for item in items:
+        item_number = item.get('ItemNumber', '')
+        description = item.get('Description', '')
+        position = item.get('Position', 0)
+        matched_line_id = None
+        full_name = f"{item_number} {description}".strip()
+        if full_name in line_map:
+            matched_line_id = line_map[full_name]
+        elif position and position in line_sequence_map:
+            matched_line_id = line_sequence_map[position]
+        elif description in line_map:
+            matched_line_id = line_map[description]
+        elif item_number:
+            matching_keys = [key for key in line_map if item_number in key]
+            if matching_keys:
+                matched_line_id = line_map[matching_keys[0]]
+        matched.append(matched_line_id)
+    return matched
+
+
+def make_offer(size, renamed_share):
+    generator = random.Random(size)
+    words = ["valve", "pump", "gasket", "filter", "seal", "bearing", "impeller", "shaft", "ring", "bolt"]
+    lines, items = [], []
+    for index in range(size):
+        item_number = f"{generator.randint(100, 999)}-{index:05d}"
+        description = " ".join(generator.sample(words, 3))
+        lines.append({"id": 1000 + index, "name": f"{item_number} {description}", "sequence": 10})
+        if generator.random() < renamed_share:
+            # Nur über die Artikelnummer auffindbar
+            items.append({"ItemNumber": item_number, "Description": f"{description} new", "Position": 0})
+        else:
+            items.append({"ItemNumber": item_number, "Description": description, "Position": 0})
+    generator.shuffle(items)
+    return lines, items
+
+
+def best_of(function, *args):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    print(f"{'case':>10}{'items x lines':>16}{'legacy ms':>12}{'matcher ms':>12}{'matched':>10}")
+    for case, renamed_share in (("mixed", 1 / 3), ("renamed", 1.0)):
+        for size in SIZES:
+            lines, items = make_offer(size, renamed_share)
+            legacy = best_of(legacy_match, lines, items)
+            matcher = best_of(lambda: LineMatcher(lines).match(items))
+            matched = sum(1 for match in LineMatcher(lines).match(items) if match)
+            print(f"{case:>10}{f'{size} x {size}':>16}{legacy * 1000:>12.2f}{matcher * 1000:>12.2f}{matched:>10}")
+
+
+if __name__ == "__main__":
+    run()
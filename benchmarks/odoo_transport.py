@@ -0,0 +1,156 @@
+"""
+Benchmark for the Odoo transports.
+
+Runs the RPCs of an offer update (sale.order create with all lines, line
+search_read, sale.order write with one command per line) for offers with 10,
+200 and 2000 lines against a local stand-in for the Odoo /xmlrpc/2 and
+/jsonrpc endpoints:
+
+- legacy: a new xmlrpc.client.ServerProxy per offer, as get_odoo_executor
+  created before
+- xmlrpc: odoo_transport.XmlRpcTransport (shared keep-alive connection)
+- xmlrpc+gzip / jsonrpc+gzip: request bodies from 8 KiB compressed
+- jsonrpc: odoo_transport.JsonRpcTransport (pooled requests.Session)
+
+The stand-in runs on localhost, so the numbers show marshalling and
+connection costs only; gzip pays off on real network links, not here.
+
+Usage (from the repository root):
+    python -m benchmarks.odoo_transport
+"""
+import gzip
+import json
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from integrations.odoo_transport import JsonRpcTransport, XmlRpcTransport
+
+LINE_COUNTS = (10, 200, 2000)
+REPEATS = 5
+GZIP_THRESHOLD = 8192
+
+
+class StandInOdoo:
+    """Minimal execute_kw for the benchmark RPCs."""
+
+    def __init__(self):
+        self.lines = {}
+
+    def dispatch(self, service, method, args):
+        if service == "common":
+            return {"server_version": "17.0"} if method == "version" else 2
+        model, model_method, model_args = args[3], args[4], args[5]
+        if model == "sale.order" and model_method == "create":
+            order_id = len(self.lines) + 1
+            self.lines[order_id] = [command[2] for command in model_args[0].get("order_line", [])]
+            return order_id
+        if model == "sale.order.line" and model_method == "search_read":
+            order_id = model_args[0][0][2]
+            return [
+                {"id": index + 1, "name": vals["name"], "product_id": [vals["product_id"], "Product"],
+                 "product_uom_qty": vals["product_uom_qty"], "price_unit": vals["price_unit"], "sequence": 10}
+                for index, vals in enumerate(self.lines.get(order_id, []))
+            ]
+        return True
+
+
+def make_handler(odoo):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Kopf und Rumpf werden getrennt geschrieben, ohne TCP_NODELAY misst man sonst Delayed ACKs
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            if self.path == "/jsonrpc":
+                params = json.loads(body)["params"]
+                result = odoo.dispatch(params["service"], params["method"], params["args"])
+                response = json.dumps({"jsonrpc": "2.0", "id": 1, "result": result}).encode("utf-8")
+                content_type = "application/json"
+            else:
+                args, method = xmlrpc.client.loads(body)
+                result = odoo.dispatch(self.path.rsplit("/", 1)[-1], method, args)
+                response = xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True).encode("utf-8")
+                content_type = "text/xml"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+    return Handler
+
+
+class LegacyTransport:
+    """New ServerProxy per offer (connection set up again for every offer)."""
+
+    name = "legacy"
+
+    def __init__(self, url):
+        self.url = url
+        self.proxy = None
+
+    def new_offer(self):
+        self.proxy = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object", allow_none=True)
+
+    def call(self, service, method, *args):
+        return getattr(self.proxy, method)(*args)
+
+
+def update_offer(transport, lines):
+    def execute(model, method, args, kwargs=None):
+        return transport.call("object", "execute_kw", "db", 2, "pw", model, method, args, kwargs or {})
+
+    if hasattr(transport, "new_offer"):
+        transport.new_offer()
+    order_lines = [
+        (0, 0, {"product_id": 3, "product_uom_qty": 2.0, "name": f"ITEM-{index:05d} Pump housing, stainless",
+                "price_unit": 123.45})
+        for index in range(lines)
+    ]
+    order_id = execute("sale.order", "create", [{"partner_id": 7, "order_line": order_lines}])
+    existing = execute("sale.order.line", "search_read", [[("order_id", "=", order_id)]],
+                       {"fields": ["product_id", "name", "product_uom_qty", "price_unit", "sequence"]})
+    commands = [(1, line["id"], {"price_unit": line["price_unit"] * 1.1}) for line in existing]
+    execute("sale.order", "write", [[order_id], {"order_line": commands, "note": "Prices updated"}])
+
+
+def best_of(function, *args):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(StandInOdoo()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    transports = [
+        ("legacy", LegacyTransport(url)),
+        ("xmlrpc", XmlRpcTransport(url, gzip_threshold=0)),
+        ("xmlrpc+gzip", XmlRpcTransport(url, gzip_threshold=GZIP_THRESHOLD)),
+        ("jsonrpc", JsonRpcTransport(url, gzip_threshold=0)),
+        ("jsonrpc+gzip", JsonRpcTransport(url, gzip_threshold=GZIP_THRESHOLD)),
+    ]
+    try:
+        print(f"{'lines':>8}" + "".join(f"{name + ' ms':>16}" for name, _ in transports))
+        for lines in LINE_COUNTS:
+            timings = [best_of(update_offer, transport, lines) for _, transport in transports]
+            print(f"{lines:>8}" + "".join(f"{timing * 1000:>16.2f}" for timing in timings))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    run()
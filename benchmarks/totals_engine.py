@@ -0,0 +1,78 @@
+"""
+Benchmark for the line-item totals engine.
+
+Computes totals of documents with 100, 1000 and 10000 lines with
+totals_engine.compute_totals (NumPy backend and pure-Python fallback) and
+with the former per-item float loops of ERPcollmexIntegration.fetch_document.
+
+Usage (from the repository root):
+    python -m benchmarks.totals_engine
+"""
+import random
+import time
+
+import totals_engine
+from totals_engine import compute_totals
+
+LINE_COUNTS = (100, 1000, 10000)
+REPEATS = 5
+
+
+def legacy_totals(quantities, unit_prices, discount_percentages, discount_percentage, freight_cost):
+    """Former calculation of ERPcollmexIntegration.fetch_document (without logging)."""
+    line_items = []
+    for quantity, unit_price, item_discount in zip(quantities, unit_prices, discount_percentages):
+        discount_cost = round(unit_price * (item_discount / 100.0), 2)
+        line_items.append({
+            "quantity": quantity,
+            "unitPrice": unit_price,
+            "discountCost": discount_cost,
+            "totalCost": quantity * (unit_price - discount_cost),
+        })
+    sub_cost = 0.0
+    for item in line_items:
+        sub_cost += item["quantity"] * item["unitPrice"] - item["discountCost"]
+    discount_cost = round(sub_cost * discount_percentage / 100.0, 2)
+    return sub_cost - discount_cost + freight_cost
+
+
+def make_columns(lines):
+    generator = random.Random(lines)
+    quantities = [float(generator.randint(1, 50)) for _ in range(lines)]
+    unit_prices = [generator.randint(100, 500000) / 100 for _ in range(lines)]
+    discounts = [generator.choice((0.0, 2.5, 5.0, 10.0)) for _ in range(lines)]
+    return quantities, unit_prices, discounts
+
+
+def best_of(function, *args):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def python_totals(*args):
+    """compute_totals with the pure-Python fallback, as without NumPy."""
+    numpy_module, totals_engine.np = totals_engine.np, None
+    try:
+        return compute_totals(*args)
+    finally:
+        totals_engine.np = numpy_module
+
+
+def run():
+    has_numpy = totals_engine.np is not None
+    print(f"{'lines':>8}{'legacy ms':>12}{'numpy ms':>12}{'python ms':>12}")
+    for lines in LINE_COUNTS:
+        columns = make_columns(lines)
+        legacy = best_of(legacy_totals, *columns, 3.0, 120.0)
+        numpy_time = f"{best_of(compute_totals, *columns, 3.0, 120.0) * 1000:>12.2f}" if has_numpy else f"{'n/a':>12}"
+        python_time = best_of(python_totals, *columns, 3.0, 120.0)
+        print(f"{lines:>8}{legacy * 1000:>12.2f}{numpy_time}{python_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    run()
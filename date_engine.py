@@ -0,0 +1,149 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# Ein vorkompiliertes Muster klassifiziert die Eingabe, danach wird direkt der passende Parser aufgerufen
+_DATE_PATTERN = re.compile(r"""
+    (?P<iso>
+        (?P<iso_y>\d{4})-(?P<iso_m>\d{1,2})-(?P<iso_d>\d{1,2})
+        (?:[T\ ](?P<hour>\d{1,2}):(?P<minute>\d{2})
+            (?::(?P<second>\d{2})(?:\.(?P<fraction>\d{1,6})\d*)?)?
+            (?P<tz>Z|[+-]\d{2}:?\d{2})?
+        )?
+    )
+    | (?P<dotted>(?P<dot_d>\d{1,2})\.(?P<dot_m>\d{1,2})\.(?P<dot_y>\d{4}))
+    | (?P<slashed>(?P<slash_a>\d{1,2})/(?P<slash_b>\d{1,2})/(?P<slash_y>\d{4}))
+    | (?P<compact>(?P<cmp_y>\d{4})(?P<cmp_m>\d{2})(?P<cmp_d>\d{2}))
+""", re.VERBOSE)
+
+# Anzahl gemerkter Eingabewerte (Belegdaten wiederholen sich stark)
+DATE_CACHE_SIZE = 2048
+
+
+class DateFormats(NamedTuple):
+    """All target representations of one parsed date."""
+    utc: datetime     # naive datetime in UTC (naive input is taken as UTC)
+    collmex: str      # YYYYMMDD, calendar date as written in the input
+    sharepoint: str   # YYYY-MM-DD, calendar date as written in the input
+    iso_z: str        # ISO 8601 in UTC with trailing Z
+    portal: str       # %Y-%m-%dT%H:%M:%S in UTC (ShipServ submittedDate)
+
+
+def _parse_offset(text):
+    if text == "Z":
+        return timezone.utc
+    sign = -1 if text[0] == "-" else 1
+    digits = text[1:].replace(":", "")
+    return timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+
+
+def _build(value):
+    """Computes all representations from one datetime (aware or naive)."""
+    local_date = value.date().isoformat()
+    if value.tzinfo is None:
+        utc = value
+    elif value.utcoffset():
+        utc = value.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        utc = value.replace(tzinfo=None)
+    return DateFormats(
+        utc,
+        local_date.replace("-", ""),
+        local_date,
+        utc.isoformat() + "Z",
+        utc.isoformat(timespec="seconds"),
+    )
+
+
+def _match_to_datetime(text, match):
+    kind = match.lastgroup
+    if kind == "iso":
+        # Der C-Parser deckt die üblichen ISO-Formen ab; Sonderformen über die Gruppen
+        try:
+            return datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        fraction = match["fraction"]
+        return datetime(
+            int(match["iso_y"]), int(match["iso_m"]), int(match["iso_d"]),
+            int(match["hour"] or 0), int(match["minute"] or 0), int(match["second"] or 0),
+            int(fraction.ljust(6, "0")) if fraction else 0,
+            tzinfo=_parse_offset(match["tz"]) if match["tz"] else None,
+        )
+    if kind == "dotted":
+        return datetime(int(match["dot_y"]), int(match["dot_m"]), int(match["dot_d"]))
+    if kind == "slashed":
+        year, first, second = int(match["slash_y"]), int(match["slash_a"]), int(match["slash_b"])
+        # Wie bisher: zuerst MM/DD/YYYY, dann DD/MM/YYYY
+        try:
+            return datetime(year, first, second)
+        except ValueError:
+            return datetime(year, second, first)
+    return datetime(int(match["cmp_y"]), int(match["cmp_m"]), int(match["cmp_d"]))
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_string(text):
+    text = text.strip()
+    match = _DATE_PATTERN.fullmatch(text)
+    if match is None:
+        return None
+    try:
+        return _build(_match_to_datetime(text, match))
+    except ValueError:
+        return None
+
+
+def parse_date(value) -> Optional[DateFormats]:
+    """
+    Parses a date string or datetime into all target formats.
+
+    Supported strings: ISO 8601 (with or without time, fraction, Z or offset),
+    DD.MM.YYYY, MM/DD/YYYY (DD/MM/YYYY if the month is out of range) and YYYYMMDD.
+
+    Args:
+        value: String date or datetime object
+
+    Returns:
+        DateFormats or None if the value could not be parsed
+    """
+    if isinstance(value, datetime):
+        return _build(value)
+    if isinstance(value, str):
+        return _parse_string(value)
+    return None
+
+
+def now_formats() -> DateFormats:
+    """All target formats of the current UTC time."""
+    return _build(datetime.utcnow())
+
+
+def normalize_date(value) -> DateFormats:
+    """
+    Like parse_date, but falls back to the current UTC time for None or unparseable values.
+    """
+    if value is None:
+        return now_formats()
+    formats = parse_date(value)
+    if formats is None:
+        logging.warning(f"Could not parse date: {value}, using current UTC time")
+        return now_formats()
+    return formats
+
+
+def to_collmex_date(value):
+    """Date in the YYYYMMDD format required by Collmex (today if not parseable)."""
+    return normalize_date(value).collmex
+
+
+def to_sharepoint_date(value):
+    """Date in the YYYY-MM-DD format of the SharePoint date columns (today if not parseable)."""
+    return normalize_date(value).sharepoint
+
+
+def to_iso_z(value):
+    """ISO 8601 timestamp in UTC with trailing Z (now if not parseable)."""
+    return normalize_date(value).iso_z
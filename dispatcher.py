@@ -3,6 +3,10 @@ from integrations.erp_pds import ERPpdsIntegration
 from integrations.erp_sharepoint import ERPsharepointIntegration
 import logging
 from typing import Dict, Any, List, Callable, Optional, Union
+from resilience import (
+    BulkheadFullError, CircuitOpenError, DeadlineExceeded, breaker_stats, bulkhead_stats, deadline_expired,
+    is_available, retry_stats
+)
 
 # Registrierung der ERP-Integrationen
 _erp_integrations = {}
@@ -26,6 +30,29 @@ def register_document_type_handler(doc_type: str, handler_func: Callable):
     _document_type_handlers[doc_type] = handler_func
     logging.info(f"Registered document type handler: {doc_type}")
 
+def _skip_result(erp_name: str, erp_class) -> Optional[Dict[str, Any]]:
+    """
+    Result for a target that is skipped: its upstream circuit is open, or the request
+    deadline has passed and the remaining targets are reported as not processed.
+    """
+    if deadline_expired():
+        logging.warning(f"Skipping {erp_name}: request deadline exceeded")
+        return {"success": False, "status": "deadline_exceeded", "error": "Request deadline exceeded"}
+    upstream = getattr(erp_class, 'upstream', None)
+    if upstream and not is_available(upstream):
+        logging.warning(f"Skipping {erp_name}: circuit for {upstream} is open")
+        return {"success": False, "status": "circuit_open", "error": f"Circuit for {upstream} is open"}
+    return None
+
+def _error_result(error: Exception) -> Dict[str, Any]:
+    if isinstance(error, CircuitOpenError):
+        return {"success": False, "status": "circuit_open", "error": str(error)}
+    if isinstance(error, BulkheadFullError):
+        return {"success": False, "status": "bulkhead_full", "error": str(error)}
+    if isinstance(error, DeadlineExceeded):
+        return {"success": False, "status": "deadline_exceeded", "error": str(error)}
+    return {"success": False, "error": str(error)}
+
 def dispatch_to_erps(document_data: Dict[str, Any], erp_targets: List[str]) -> Dict[str, Any]:
     """
     Hauptmethode zum Dispatching von Dokumenten zu ERPs basierend auf dem Dokumenttyp.
@@ -68,12 +95,16 @@ def dispatch_to_erps_RequestForQuote(document_data: Dict[str, Any], erp_targets:
             continue
             
         erp_class = _erp_integrations[erp_name]
+        skip_result = _skip_result(erp_name, erp_class)
+        if skip_result:
+            results[erp_name] = skip_result
+            continue
         try:
             erp_result = erp_class.send_to_erp(document_data)
             results[erp_name] = {"success": True, "result": erp_result}
         except Exception as e:
             logging.error(f"Error dispatching to {erp_name}: {str(e)}")
-            results[erp_name] = {"success": False, "error": str(e)}
+            results[erp_name] = _error_result(e)
     
     return results
 
@@ -89,6 +120,10 @@ def dispatch_to_erps_Quote(document_data: Dict[str, Any], erp_targets: List[str]
             continue
             
         erp_class = _erp_integrations[erp_name]
+        skip_result = _skip_result(erp_name, erp_class)
+        if skip_result:
+            results[erp_name] = skip_result
+            continue
         try:
             # Spezielle Methode für Quote, falls vorhanden
             if hasattr(erp_class, 'send_quote_to_erp'):
@@ -99,7 +134,7 @@ def dispatch_to_erps_Quote(document_data: Dict[str, Any], erp_targets: List[str]
             results[erp_name] = {"success": True, "result": erp_result}
         except Exception as e:
             logging.error(f"Error dispatching Quote to {erp_name}: {str(e)}")
-            results[erp_name] = {"success": False, "error": str(e)}
+            results[erp_name] = _error_result(e)
     
     return results
 
@@ -115,6 +150,10 @@ def dispatch_to_erps_PurchaseOrder(document_data: Dict[str, Any], erp_targets: L
             continue
             
         erp_class = _erp_integrations[erp_name]
+        skip_result = _skip_result(erp_name, erp_class)
+        if skip_result:
+            results[erp_name] = skip_result
+            continue
         try:
             # Spezielle Methode für PurchaseOrder, falls vorhanden
             if hasattr(erp_class, 'send_purchase_order_to_erp'):
@@ -124,7 +163,7 @@ def dispatch_to_erps_PurchaseOrder(document_data: Dict[str, Any], erp_targets: L
             results[erp_name] = {"success": True, "result": erp_result}
         except Exception as e:
             logging.error(f"Error dispatching PurchaseOrder to {erp_name}: {str(e)}")
-            results[erp_name] = {"success": False, "error": str(e)}
+            results[erp_name] = _error_result(e)
     
     return results
 
@@ -140,6 +179,10 @@ def dispatch_to_erps_Requisition(document_data: Dict[str, Any], erp_targets: Lis
             continue
             
         erp_class = _erp_integrations[erp_name]
+        skip_result = _skip_result(erp_name, erp_class)
+        if skip_result:
+            results[erp_name] = skip_result
+            continue
         try:
             # Spezielle Methode für Requisition, falls vorhanden
             if hasattr(erp_class, 'send_requisition_to_erp'):
@@ -148,7 +191,7 @@ def dispatch_to_erps_Requisition(document_data: Dict[str, Any], erp_targets: Lis
             results[erp_name] = {"success": True, "result": erp_result}
         except Exception as e:
             logging.error(f"Error dispatching Requisition to {erp_name}: {str(e)}")
-            results[erp_name] = {"success": False, "error": str(e)}
+            results[erp_name] = _error_result(e)
     
     return results
 
@@ -164,6 +207,10 @@ def dispatch_to_erps_PurchaseOrderConfirmation(document_data: Dict[str, Any], er
             continue
             
         erp_class = _erp_integrations[erp_name]
+        skip_result = _skip_result(erp_name, erp_class)
+        if skip_result:
+            results[erp_name] = skip_result
+            continue
         try:
             # Spezielle Methode für PurchaseOrderConfirmation, falls vorhanden
             if hasattr(erp_class, 'send_purchase_order_confirmation_to_erp'):
@@ -173,7 +220,7 @@ def dispatch_to_erps_PurchaseOrderConfirmation(document_data: Dict[str, Any], er
             results[erp_name] = {"success": True, "result": erp_result}
         except Exception as e:
             logging.error(f"Error dispatching PurchaseOrderConfirmation to {erp_name}: {str(e)}")
-            results[erp_name] = {"success": False, "error": str(e)}
+            results[erp_name] = _error_result(e)
     
     return results
 
@@ -206,6 +253,67 @@ def fetch_data_from_erp(erp_name: str, document_id: str, document_type: str) ->
         logging.error(f"Error fetching {document_type} from {erp_name}: {str(e)}")
         return None
 
+def fetch_many_from_erp(erp_name: str, document_ids: List[str], document_type: str) -> Dict[str, Any]:
+    """
+    Fetches several documents from an ERP system.
+    Uses the batch fetch of the integration (one round-trip) if it provides one.
+
+    Returns:
+        Dictionary keyed by document ID (as string), None for documents that could not be fetched
+    """
+    if erp_name not in _erp_integrations:
+        logging.error(f"ERP integration '{erp_name}' not found")
+        return {str(document_id): None for document_id in document_ids}
+
+    erp_class = _erp_integrations[erp_name]
+    if hasattr(erp_class, 'fetch_documents'):
+        try:
+            return erp_class.fetch_documents(document_ids, document_type)
+        except Exception as e:
+            logging.error(f"Error fetching {len(document_ids)} {document_type} documents from {erp_name}: {str(e)}")
+            return {str(document_id): None for document_id in document_ids}
+
+    results = {}
+    for document_id in document_ids:
+        # Nach Ablauf der Deadline nichts mehr abrufen, bisherige Ergebnisse zurückgeben
+        results[str(document_id)] = None if deadline_expired() else fetch_data_from_erp(erp_name, document_id, document_type)
+    return results
+
+def invalidate_erp_document(erp_name: str, document_id: str, document_type: str, changed_on=None) -> bool:
+    """
+    Drops cached data of a document in an ERP integration that caches fetches.
+
+    Args:
+        changed_on: Optional change timestamp reported by the ERP; the cache entry is
+            only dropped if it is older. Without it the entry is always dropped.
+
+    Returns:
+        True if cached data was dropped
+    """
+    erp_class = _erp_integrations.get(erp_name)
+    if erp_class is None:
+        return False
+    try:
+        if changed_on and hasattr(erp_class, 'notify_document_changed'):
+            return bool(erp_class.notify_document_changed(document_id, document_type, changed_on))
+        if hasattr(erp_class, 'invalidate_cached_document'):
+            return bool(erp_class.invalidate_cached_document(document_id, document_type))
+    except Exception as e:
+        logging.error(f"Error invalidating cached {document_type} {document_id} in {erp_name}: {str(e)}")
+    return False
+
+def get_integration_stats() -> Dict[str, Any]:
+    """Collects the statistics of all registered integrations that provide get_stats(), plus circuit breakers, bulkheads and retry budget."""
+    stats = {
+        name: erp_class.get_stats()
+        for name, erp_class in _erp_integrations.items()
+        if hasattr(erp_class, 'get_stats')
+    }
+    stats["circuitBreakers"] = breaker_stats()
+    stats["bulkheads"] = bulkhead_stats()
+    stats["retryBudget"] = retry_stats()
+    return stats
+
 def dispatch_document(document_data, erp_targets):
     """
     Routes a document to the appropriate dispatch method based on its type.
@@ -4,22 +4,30 @@ import os
 import requests
 import json
 from utils import transform_response  # Importiere die Funktion
+from resilience import (
+    FAST_FAIL_ERRORS, BulkheadFullError, CircuitOpenError, DeadlineExceeded, deadline_expired, deadline_timeout,
+    function_deadline_seconds, http_request, remaining_time, reset_deadline, set_deadline
+)
 import uuid
-from datetime import datetime
 import dispatcher
+from date_engine import now_formats
+from totals_engine import totals_from_line_items
 from dispatcher import register_erp_integration
 from integrations.erp_collmex import ERPcollmexIntegration
 from integrations.erp_pds import ERPpdsIntegration
-from integrations.erp_sharepoint import ERPsharepointIntegration
+from integrations.erp_sharepoint import ERPsharepointIntegration, ensure_indexed_columns
 from integrations.erp_odoo import ERPodooIntegration
 from portals.shipserv.client import ShipServPortal
 #from portals.cfm.downloadExcel import CloudFleetExcelExporter
 import urllib.parse
 import base64
+import functools
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
 shipserv_url= os.getenv("SHIPSERV_URL")
 funcode_shipserv_getDocument = os.getenv("FUNCODE_SHIPSERV_GETDOCUMENT")
+# Maximale Anzahl Angebote je createOffersOdoo-Aufruf
+odoo_bulk_max_offers = int(os.getenv("ODOO_BULK_MAX_OFFERS", "100"))
 
 def load_schema():
     schema_path = os.path.join(os.path.dirname(__file__), "shipservschema.json")
@@ -37,6 +45,43 @@ def initialize_erp_integrations():
 
 # Initialisierung aufrufen
 initialize_erp_integrations()
+
+# Restbudget (Sekunden) des Aufrufers, wenn eine Route dieser App eine andere aufruft
+DEADLINE_HEADER = "X-Request-Deadline-Seconds"
+
+def caller_deadline_seconds(req):
+    """Remaining budget sent by a calling route of this app, None if absent or invalid."""
+    value = req.headers.get(DEADLINE_HEADER) if req is not None else None
+    if not value:
+        return None
+    try:
+        return min(function_deadline_seconds, max(0.0, float(value)))
+    except ValueError:
+        return None
+
+def with_deadline(handler):
+    """
+    Sets the request deadline (FUNCTION_DEADLINE_SECONDS, or the shorter budget of a
+    calling route in X-Request-Deadline-Seconds) for an HTTP trigger, so every
+    outbound call of the invocation gets at most the remaining time as its timeout.
+
+    Returns 504 when the deadline is exceeded before the handler produced a response and
+    503 when an upstream circuit is open or its bulkhead is full.
+    """
+    @functools.wraps(handler)
+    def wrapper(req: func.HttpRequest) -> func.HttpResponse:
+        token = set_deadline(caller_deadline_seconds(req))
+        try:
+            return handler(req)
+        except DeadlineExceeded as e:
+            logging.error(f"{handler.__name__}: {e}")
+            return func.HttpResponse("Request deadline exceeded", status_code=504)
+        except (CircuitOpenError, BulkheadFullError) as e:
+            logging.error(f"{handler.__name__}: {e}")
+            return func.HttpResponse(str(e), status_code=503)
+        finally:
+            reset_deadline(token)
+    return wrapper
     
 def get_token() -> str:
     """Fetches an OAuth2 token from the authentication endpoint."""
@@ -58,7 +103,7 @@ def get_token() -> str:
     }
 
     try:
-        response = requests.post(token_url, json=payload, headers=headers)
+        response = http_request("shipserv", "POST", token_url, json=payload, headers=headers, idempotent=True)
         response.raise_for_status()  # Raise an exception for HTTP errors
         token_data = response.json()
         logging.info(f"Token fetched successfully: {token_data}")
@@ -68,6 +113,7 @@ def get_token() -> str:
         return None
 
 @app.route(route="csitofficemate", methods=["GET"])
+@with_deadline
 def csitofficemate(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function processed a request.')
 
@@ -89,6 +135,7 @@ def csitofficemate(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 @app.route(route="shipserv_getDocument", methods=["GET"])
+@with_deadline
 def shipserv_getDocument(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Python HTTP trigger function "getInquiry" processed a request.')
 
@@ -120,7 +167,7 @@ def shipserv_getDocument(req: func.HttpRequest) -> func.HttpResponse:
 
     try:
         # Perform the GET request
-        response = requests.get(api_url, headers=headers)
+        response = http_request("shipserv", "GET", api_url, headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors
         logging.info(f"Response from ShipServ API: {response.status_code} - {response.text}")
         # Transform the response
@@ -147,6 +194,7 @@ def shipserv_getDocument(req: func.HttpRequest) -> func.HttpResponse:
 shipserv_portal = ShipServPortal()  # Create once at module level
 
 @app.route(route="shipserv_getDocuments", methods=["GET"])
+@with_deadline
 def shipserv_getDocuments(req: func.HttpRequest) -> func.HttpResponse:
     doc_type = req.params.get('DocType')
     submitted = req.params.get('submittedDate')
@@ -158,6 +206,7 @@ def shipserv_getDocuments(req: func.HttpRequest) -> func.HttpResponse:
                             mimetype="application/json")
 
 @app.route(route="modifyAndSendDocument", methods=["POST"])
+@with_deadline
 def modifyAndSendDocument(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Processing and modifying document data.')
 
@@ -182,13 +231,20 @@ def modifyAndSendDocument(req: func.HttpRequest) -> func.HttpResponse:
 
         # Replace or add custom fields
         document_data["type"] = custom_fields.get("type", "Quote")
-        document_data["discountCost"] = custom_fields.get("discountCost", 0)
-        document_data["subCost"] = custom_fields.get("subCost", 45)
-        document_data["cost"] = custom_fields.get("cost", 45)
+        # Fehlende Summen aus den Positionen berechnen
+        totals = {} if {"discountCost", "subCost", "cost"} <= custom_fields.keys() else totals_from_line_items(
+            line_items,
+            custom_fields.get("discountPercentage", 0),
+            custom_fields.get("freightCost", 0)
+        ).as_custom_fields()
+        document_data["discountCost"] = custom_fields.get("discountCost", totals.get("discountCost"))
+        document_data["subCost"] = custom_fields.get("subCost", totals.get("subCost"))
+        document_data["cost"] = custom_fields.get("cost", totals.get("cost"))
         document_data["termsAndConditions"] = custom_fields.get("termsAndConditions", document_data.get("termsAndConditions", ""))
         document_data["paymentTerms"] = custom_fields.get("paymentTerms", document_data.get("paymentTerms", ""))
-        document_data["createdDate"] = custom_fields.get("createdDate", datetime.utcnow().isoformat() + "Z")
-        document_data["submittedDate"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        now = now_formats()
+        document_data["createdDate"] = custom_fields.get("createdDate", now.iso_z)
+        document_data["submittedDate"] = now.portal
         document_data["quoteExpiryDate"] = custom_fields.get("quoteExpiryDate", "2025-12-31T23:59:59")
 
         # Fetch the token
@@ -209,7 +265,7 @@ def modifyAndSendDocument(req: func.HttpRequest) -> func.HttpResponse:
         }
 
         # Perform the POST request to send the modified document
-        response = requests.post(api_url, json=document_data, headers=headers)
+        response = http_request("shipserv", "POST", api_url, json=document_data, headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors
 
         # Return the API response
@@ -231,6 +287,7 @@ def modifyAndSendDocument(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 @app.route(route="sendDataToPortal", methods=["POST"])
+@with_deadline
 def sendDataToPortal(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Fetching data from ERP and sending it to the portal.')
 
@@ -247,6 +304,13 @@ def sendDataToPortal(req: func.HttpRequest) -> func.HttpResponse:
                 status_code=400
             )
 
+        # Gecachte Fassung verwerfen: bei refresh immer, sonst nur wenn Collmex eine neuere Änderung meldet
+        if request_body.get("refresh"):
+            dispatcher.invalidate_erp_document(erp_name, document_id, document_type)
+        elif request_body.get("changedOn"):
+            dispatcher.invalidate_erp_document(erp_name, document_id, document_type,
+                                               changed_on=request_body.get("changedOn"))
+
         # Fetch data from the ERP system using the dispatcher
         document_data = dispatcher.fetch_data_from_erp(erp_name, document_id, document_type)
         logging.info(f"Fetched document data: {document_data}") 
@@ -276,6 +340,70 @@ def sendDataToPortal(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+@app.route(route="sendDataToPortalBatch", methods=["POST"])
+@with_deadline
+def sendDataToPortalBatch(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Fetches several documents from the ERP in one batch and sends each of them to the portal.
+
+    Request body:
+        erpName: Name of the ERP integration (e.g. collmex)
+        documentIds: List of ERP document numbers
+        documentType: Document type (e.g. RequestForQuote, PurchaseOrder)
+
+    Returns:
+        JSON with the portal result per document ID
+    """
+    logging.info('Fetching a batch of documents from ERP and sending them to the portal.')
+
+    try:
+        request_body = req.get_json()
+    except ValueError:
+        return func.HttpResponse(
+            "Invalid JSON in the request body.",
+            status_code=400
+        )
+
+    erp_name = request_body.get("erpName")
+    document_ids = request_body.get("documentIds")
+    document_type = request_body.get("documentType")
+
+    if not erp_name or not document_ids or not isinstance(document_ids, list) or not document_type:
+        return func.HttpResponse(
+            "Please provide 'erpName', 'documentIds' (list) and 'documentType' in the request body.",
+            status_code=400
+        )
+
+    documents = dispatcher.fetch_many_from_erp(erp_name, document_ids, document_type)
+
+    results = {}
+    for document_id, document_data in documents.items():
+        if deadline_expired():
+            # Restliche Dokumente nicht mehr senden, bisherige Ergebnisse zurückgeben
+            results[document_id] = {"status": 504, "error": "Deadline exceeded"}
+            continue
+        if not document_data or "error" in document_data:
+            error = document_data.get("error") if document_data else "No data returned"
+            logging.error(f"Failed to fetch document {document_id} from '{erp_name}': {error}")
+            results[document_id] = {"status": 500, "error": error}
+            continue
+
+        try:
+            response = modify_and_send_document_logic(document_data)
+            results[document_id] = {
+                "status": response.status_code,
+                "response": response.get_body().decode("utf-8", errors="replace")
+            }
+        except Exception as e:
+            logging.error(f"Unexpected error sending document {document_id}: {e}")
+            results[document_id] = {"status": 500, "error": str(e)}
+
+    return func.HttpResponse(
+        json.dumps({"results": results}, ensure_ascii=False),
+        mimetype="application/json",
+        status_code=200
+    )
+
 def modify_and_send_document_logic(document_data):
     """
     Logic for modifying and sending the document.
@@ -304,19 +432,25 @@ def modify_and_send_document_logic(document_data):
             # Replace the 'id' field with 'purchaseOrderId'
             doc_SendData["purchaseOrderId"] = doc_SendData.pop("id", None)
 
-        doc_SendData["discountCost"] = document_data["customFields"].get("discountCost", 0)
-        doc_SendData["subCost"] = document_data["customFields"].get("subCost", 45)
-        doc_SendData["cost"] = document_data["customFields"].get("cost", 45)
+        custom_fields = document_data["customFields"]
+        # Fehlende Summen aus den Positionen berechnen
+        totals = {} if {"discountCost", "subCost", "cost"} <= custom_fields.keys() else totals_from_line_items(
+            document_data.get("lineItems", []),
+            custom_fields.get("discountPercentage", 0),
+            custom_fields.get("freightCost", 0)
+        ).as_custom_fields()
+        doc_SendData["discountCost"] = custom_fields.get("discountCost", totals.get("discountCost"))
+        doc_SendData["subCost"] = custom_fields.get("subCost", totals.get("subCost"))
+        doc_SendData["cost"] = custom_fields.get("cost", totals.get("cost"))
         doc_SendData["termsAndConditions"] = document_data["customFields"].get(
             "termsAndConditions", document_data.get("termsAndConditions", "")
         )
         doc_SendData["paymentTerms"] = document_data["customFields"].get(
             "paymentTerms", document_data.get("paymentTerms", "")
         )
-        doc_SendData["createdDate"] = document_data["customFields"].get(
-            "createdDate", datetime.utcnow().isoformat() + "Z"
-        )
-        doc_SendData["submittedDate"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        now = now_formats()  # ein Zeitstempel für createdDate und submittedDate
+        doc_SendData["createdDate"] = document_data["customFields"].get("createdDate", now.iso_z)
+        doc_SendData["submittedDate"] = now.portal
         doc_SendData["quoteExpiryDate"] = document_data["customFields"].get(
             "quoteExpiryDate", "2025-12-31T23:59:59"
         )
@@ -344,7 +478,7 @@ def modify_and_send_document_logic(document_data):
         }
 
         # Perform the POST request to send the modified document
-        response = requests.post(api_url, json=doc_SendData, headers=headers)
+        response = http_request("shipserv", "POST", api_url, json=doc_SendData, headers=headers)
         response.raise_for_status()  # Raise an exception for HTTP errors
 
         # Return the API response
@@ -371,13 +505,14 @@ def mark_document_as_exported(doc_id, token):
         "Content-Type": "application/json"
     }
     try:
-        response = requests.post(url, headers=headers)
+        response = http_request("shipserv", "POST", url, headers=headers, idempotent=True)  # erneutes Markieren ist harmlos
         response.raise_for_status()
         return {"status": "success", "response": response.json()}
     except requests.exceptions.RequestException as e:
         return {"status": "error", "message": str(e)}
 
 @app.route(route="processFirstDocument", methods=["GET"])
+@with_deadline
 def process_first_document(req: func.HttpRequest) -> func.HttpResponse:
     """
     Fetches all documents (via shipserv_getDocuments), takes the first one,
@@ -416,9 +551,20 @@ def process_first_document(req: func.HttpRequest) -> func.HttpResponse:
         # 2) Dokument verarbeiten
         processed_doc_url = f"{base_url}/api/shipserv_getDocument?id={first_doc_id}&erpTargets=collmex,sharepoint"
         azureheaders = {
-            "x-functions-key": f"{funcode_shipserv_getDocument}"
+            "x-functions-key": f"{funcode_shipserv_getDocument}",
+            # Die aufgerufene Route endet mit dieser Deadline, nicht erst nach ihren eigenen 230 s
+            DEADLINE_HEADER: f"{remaining_time():.1f}"
         }
-        processed_doc_response = requests.get(processed_doc_url,headers=azureheaders)
+        # Nicht über http_request: der Aufruf legt ERP-Dokumente an und darf nicht wiederholt werden
+        try:
+            processed_doc_response = requests.get(
+                processed_doc_url, headers=azureheaders,
+                timeout=deadline_timeout(None, "shipserv_getDocument")
+            )
+        except requests.exceptions.Timeout as e:
+            if deadline_expired():
+                raise DeadlineExceeded("shipserv_getDocument completed") from e
+            raise
         logging.info(f"Processed document response: {processed_doc_response.status_code} - {processed_doc_response.text}")
         # Wenn nicht erfolgreich -> abbrechen
         if processed_doc_response.status_code != 200:
@@ -441,16 +587,22 @@ def process_first_document(req: func.HttpRequest) -> func.HttpResponse:
             mimetype="application/json",
             status_code=200
         )
+    except FAST_FAIL_ERRORS:
+        # Antwort 503/504 über with_deadline
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error in process_first_document: {e}")
         return func.HttpResponse("Error occurred while processing.", status_code=500)
 
 @app.route(route="sendDataToPortalGet", methods=["GET"])
+@with_deadline
 def sendDataToPortalGet(req: func.HttpRequest) -> func.HttpResponse:
     """
     Simple GET-based wrapper to call sendDataToPortal logic.
     Usage example (query params):
         /api/sendDataToPortalGet?erpName=collmex&documentId=250782&documentType=Quote
+    Optional: refresh=true bypasses the document cache, changedOn=<ISO timestamp>
+    drops a cached copy older than the given change date.
     """
     erp_name = req.params.get("erpName")
     document_id = req.params.get("documentId")
@@ -467,6 +619,8 @@ def sendDataToPortalGet(req: func.HttpRequest) -> func.HttpResponse:
         "erpName": erp_name,
         "documentId": document_id,
         "documentType": document_type,
+        "refresh": req.params.get("refresh", "").lower() in ("1", "true", "yes"),
+        "changedOn": req.params.get("changedOn"),
         "lineItems": [],
         "customFields": {}
     }
@@ -481,7 +635,35 @@ def sendDataToPortalGet(req: func.HttpRequest) -> func.HttpResponse:
     mock_req = MockRequest(request_body)
     return sendDataToPortal(mock_req)
 
+@app.route(route="integrationStats", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+@with_deadline
+def integration_stats(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Returns runtime statistics of the registered integrations (e.g. cache hit ratios).
+    """
+    return func.HttpResponse(
+        json.dumps(dispatcher.get_integration_stats()),
+        mimetype="application/json",
+        status_code=200
+    )
+
+@app.route(route="ensureSharePointIndexes", methods=["GET", "POST"], auth_level=func.AuthLevel.FUNCTION)
+@with_deadline
+def ensure_sharepoint_indexes(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Checks and creates the indexes of the SharePoint columns used in lookups.
+    Runs as dry run unless called with dryRun=false.
+    """
+    dry_run = req.params.get("dryRun", "true").lower() not in ("0", "false", "no")
+    report = ensure_indexed_columns(dry_run=dry_run)
+    return func.HttpResponse(
+        json.dumps(report),
+        mimetype="application/json",
+        status_code=500 if report.get("error") else 200
+    )
+
 @app.route(route="createOfferOdoo", methods=["POST"])
+@with_deadline
 def create_oddo_offer(req: func.HttpRequest) -> func.HttpResponse:
     """
     Create an offer in Odoo.
@@ -559,7 +741,78 @@ def create_oddo_offer(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+@app.route(route="createOffersOdoo", methods=["POST"])
+@with_deadline
+def create_odoo_offers(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Creates (or updates, for quotations referencing an offer) many offers in Odoo in one call.
+
+    Request body:
+        offers: List of {"data": offer data (object or JSON string), "customer": optional customer};
+                a bare list is accepted as well
+
+    Returns:
+        JSON with one result per offer in input order: offer_id, item_count and
+        offer_number, or the error
+    """
+    try:
+        request_body = req.get_json()
+    except ValueError:
+        return func.HttpResponse(
+            "Invalid JSON in the request body.",
+            status_code=400
+        )
+
+    entries = request_body.get("offers") if isinstance(request_body, dict) else request_body
+    if not entries or not isinstance(entries, list):
+        return func.HttpResponse(
+            "Please provide 'offers' (list) in the request body.",
+            status_code=400
+        )
+    if len(entries) > odoo_bulk_max_offers:
+        return func.HttpResponse(
+            f"Too many offers: {len(entries)} (maximum {odoo_bulk_max_offers} per request).",
+            status_code=400
+        )
+
+    # Einträge prüfen; fehlerhafte bekommen direkt ihr Ergebnis, der Rest geht gesammelt an Odoo
+    results = [None] * len(entries)
+    offers = []
+    positions = []
+    for index, entry in enumerate(entries):
+        data = entry.get("data") if isinstance(entry, dict) else None
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except json.JSONDecodeError as e:
+                results[index] = {"index": index, "success": False, "error": f"Invalid JSON string in 'data' field: {str(e)}"}
+                continue
+        if not isinstance(data, dict) or not data:
+            results[index] = {"index": index, "success": False, "error": "Please provide 'data' for each offer."}
+            continue
+        offers.append((data, entry.get("customer")))
+        positions.append(index)
+
+    try:
+        for index, result in zip(positions, ERPodooIntegration.send_many_to_erp(offers)):
+            results[index] = {"index": index, **result}
+    except Exception as e:
+        logging.error(f"Error creating offers in Odoo: {str(e)}")
+        return func.HttpResponse(
+            f"Error creating offers: {str(e)}",
+            status_code=500
+        )
+
+    created = sum(1 for result in results if result["success"])
+    logging.info(f"createOffersOdoo: {created} of {len(results)} offers sent to Odoo")
+    return func.HttpResponse(
+        json.dumps({"results": results, "succeeded": created, "failed": len(results) - created}),
+        mimetype="application/json",
+        status_code=200
+    )
+
 @app.route(route="getOfferOdoo", methods=["GET"])
+@with_deadline
 def get_odoo_offer(req: func.HttpRequest) -> func.HttpResponse:
     """
     Ruft ein Angebot aus Odoo anhand seiner ID ab.
@@ -615,7 +868,66 @@ def get_odoo_offer(req: func.HttpRequest) -> func.HttpResponse:
             status_code=500
         )
 
+@app.route(route="getOffersOdoo", methods=["GET"])
+@with_deadline
+def get_odoo_offers(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Ruft mehrere Angebote aus Odoo mit drei Abfragen ab.
+    
+    Query-Parameter:
+        ids: Kommagetrennte IDs der Angebote in Odoo
+        
+    Returns:
+        JSON mit "offers" (in der Reihenfolge der IDs) und "notFound"
+    """
+    logging.info('Function "getOffersOdoo" wurde aufgerufen.')
+    
+    try:
+        offer_ids = [int(offer_id) for offer_id in req.params.get('ids', '').split(',') if offer_id.strip()]
+        
+        if not offer_ids:
+            return func.HttpResponse(
+                json.dumps({"error": "Bitte geben Sie die Angebots-IDs als 'ids' Parameter an (kommagetrennt)"}),
+                mimetype="application/json",
+                status_code=400
+            )
+            
+        offers = ERPodooIntegration.get_offers(offer_ids)
+        
+        if offers is None:
+            return func.HttpResponse(
+                json.dumps({"error": "Fehler bei der Abfrage der Angebote"}),
+                mimetype="application/json",
+                status_code=500
+            )
+            
+        found_ids = {offer["id"] for offer in offers}
+        return func.HttpResponse(
+            json.dumps({
+                "offers": offers,
+                "notFound": [offer_id for offer_id in dict.fromkeys(offer_ids) if offer_id not in found_ids]
+            }, ensure_ascii=False),
+            mimetype="application/json",
+            status_code=200
+        )
+        
+    except ValueError as e:
+        logging.error(f"Fehler bei der Parameterverarbeitung: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": f"Ungültiges Anfrageformat: {str(e)}"}),
+            mimetype="application/json",
+            status_code=400
+        )
+    except Exception as e:
+        logging.error(f"Fehler beim Abrufen der Angebote aus Odoo: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({"error": f"Serverfehler: {str(e)}"}),
+            mimetype="application/json", 
+            status_code=500
+        )
+
 @app.route(route="uploadPdsDocument", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@with_deadline
 def upload_pds_document(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP Trigger function to upload a document to a PDS offer.
@@ -715,6 +1027,7 @@ def upload_pds_document(req: func.HttpRequest) -> func.HttpResponse:
         )
 
 @app.route(route="markDocumentAsExported", methods=["POST"])
+@with_deadline
 def mark_document_exported_http(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP trigger to mark a document as exported in ShipServ.
@@ -809,6 +1122,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     )
 
 @app.route(route="shipserv_upload_attachment", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+@with_deadline
 def shipserv_upload_attachment(req: func.HttpRequest) -> func.HttpResponse:
     """
     HTTP-Trigger zum Hochladen von Dateien an die ShipServ API.
@@ -0,0 +1,375 @@
+import csv
+import io
+import re
+
+# Collmex erwartet Semikolon-getrennte Datensätze im Latin-1 Zeichensatz
+COLLMEX_DELIMITER = ";"
+COLLMEX_QUOTECHAR = '"'
+COLLMEX_ENCODING = "iso-8859-1"
+
+# Declarative record layouts for the Collmex import formats.
+# Each entry is (position, field_name, default). Entries without a field name are
+# constants. Positions from "item_start" on are repeated per line item, everything
+# before is the document header that Collmex expects on every item line.
+RECORD_LAYOUTS = {
+    "CMXQTN": {
+        "length": 87,
+        "item_start": 69,
+        "fields": (
+            (0, None, "CMXQTN"),
+            (1, "document_id", ""),
+            (3, None, "0"),
+            (4, "company", ""),
+            (5, "customer_id", ""),
+            (27, None, "0"),
+            (28, "document_date", ""),
+            (30, "payment_terms", ""),
+            (31, "currency", ""),
+            (32, "price_group", ""),
+            (33, None, "0"),
+            (34, None, "0,00"),
+            (36, "header_text", ""),
+            (37, "end_text", ""),
+            (39, None, "0"),
+            (41, None, "1"),
+            (42, None, "0"),
+            (43, None, "0"),
+            (44, None, "0,00"),
+            (46, None, "0 Neu"),
+            (48, None, "0"),
+            (49, None, "0,00"),
+            (50, None, "0,00"),
+            (68, None, "0"),
+            # Positionsdaten
+            (69, "part_code", ""),
+            (70, "description", ""),
+            (71, "unit_of_measure", ""),
+            (72, "quantity", ""),
+            (73, "unit_price", ""),
+            (74, None, "1"),
+            (75, "discount_percentage", "0,00"),
+            (77, None, "0"),
+            (78, None, "0"),
+            (79, None, "0"),
+            (80, None, "0"),
+        ),
+    },
+    "CMXORD-2": {
+        "length": 99,
+        "item_start": 72,
+        "fields": (
+            (0, None, "CMXORD-2"),
+            (1, "document_id", ""),
+            (3, None, "0"),
+            (4, "company", ""),
+            (5, "customer_id", ""),
+            (27, None, "0"),
+            (28, "customer_ref", ""),
+            (29, "document_date", ""),
+            (31, "payment_terms", ""),
+            (32, "currency", ""),
+            (33, "price_group", ""),
+            (34, None, "0"),
+            (35, "discount_percentage", "0,00"),
+            (37, "header_text", ""),
+            (38, "end_text", ""),
+            (40, None, "1"),
+            (41, None, "1"),
+            (42, None, "0"),
+            (43, None, "0 Neu"),
+            (44, None, "1"),
+            (45, None, "0"),
+            (46, None, "0"),
+            (48, None, "0,00"),
+            (52, None, "0"),
+            (53, "freight_cost", "0,00"),
+            (54, None, "0,00"),
+            (71, None, "0"),
+            # Positionsdaten
+            (72, "part_code", ""),
+            (73, "description", ""),
+            (74, "unit_of_measure", ""),
+            (75, "quantity", ""),
+            (76, "unit_price", ""),
+            (78, None, "1"),
+            (79, "item_discount_percentage", "0,00"),
+            (81, None, "0"),
+            (82, None, "0"),
+            (83, None, "0"),
+            (84, None, "0"),
+            (85, None, "0"),
+            (86, None, "0"),
+            (92, None, "0"),
+            (93, None, "0"),
+        ),
+    },
+}
+
+
+def encode_collmex_fields(fields):
+    """
+    Encodes a list of field values as one Collmex CSV segment (without line terminator).
+    Fields containing the delimiter, quotes or line breaks are quoted.
+    """
+    buffer = io.StringIO()
+    # lineterminator "\n" makes the writer quote embedded line breaks
+    writer = csv.writer(buffer, delimiter=COLLMEX_DELIMITER, quotechar=COLLMEX_QUOTECHAR,
+                        lineterminator="\n", quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(fields)
+    return buffer.getvalue()[:-1]
+
+
+class CollmexRecordEncoder:
+    """
+    Encoder for one Collmex record type, compiled from a declarative layout.
+
+    The layout is resolved once into a header template and an item template, so
+    encoding a document only fills the named slots. The header segment is encoded
+    once per document and reused as prefix for every item line.
+    """
+
+    def __init__(self, record_type, layout):
+        self.record_type = record_type
+        length = layout["length"]
+        item_start = layout["item_start"]
+
+        template = [""] * length
+        slots = {}
+        for position, name, default in layout["fields"]:
+            if position >= length:
+                raise ValueError(f"Field position {position} outside of {record_type} record length {length}")
+            template[position] = default
+            if name:
+                slots[name] = position
+
+        self.item_start = item_start
+        self._header_template = template[:item_start]
+        self._item_template = template[item_start:]
+        self._header_slots = {name: pos for name, pos in slots.items() if pos < item_start}
+        self._item_slots = {name: pos - item_start for name, pos in slots.items() if pos >= item_start}
+
+    @property
+    def field_names(self):
+        """All named fields of the record type."""
+        return tuple(self._header_slots) + tuple(self._item_slots)
+
+    def encode_header(self, values):
+        """
+        Encodes the document header segment.
+
+        Args:
+            values: Dictionary of header field names to (already formatted) values
+
+        Returns:
+            The encoded header segment as string
+        """
+        fields = list(self._header_template)
+        for name, value in values.items():
+            position = self._header_slots.get(name)
+            if position is None:
+                raise KeyError(f"Unknown header field '{name}' for record type {self.record_type}")
+            fields[position] = "" if value is None else str(value)
+        return encode_collmex_fields(fields)
+
+    def encode_line(self, header, values):
+        """
+        Encodes one item line using a header segment from encode_header().
+
+        Args:
+            header: The encoded header segment of the document
+            values: Dictionary of item field names to (already formatted) values
+
+        Returns:
+            The complete record line as string (without line terminator)
+        """
+        fields = list(self._item_template)
+        for name, value in values.items():
+            position = self._item_slots.get(name)
+            if position is None:
+                raise KeyError(f"Unknown item field '{name}' for record type {self.record_type}")
+            fields[position] = "" if value is None else str(value)
+        return f"{header}{COLLMEX_DELIMITER}{encode_collmex_fields(fields)}"
+
+
+# Encoder werden einmal pro Satzart beim Import kompiliert
+RECORD_ENCODERS = {
+    record_type: CollmexRecordEncoder(record_type, layout)
+    for record_type, layout in RECORD_LAYOUTS.items()
+}
+
+
+def get_record_encoder(record_type):
+    """Returns the compiled encoder for a Collmex record type."""
+    encoder = RECORD_ENCODERS.get(record_type)
+    if encoder is None:
+        raise ValueError(f"No Collmex record layout defined for {record_type}")
+    return encoder
+
+
+def iter_encoded_body(lines, encoding=COLLMEX_ENCODING):
+    """
+    Encodes Collmex lines lazily for a streamed request body.
+
+    Args:
+        lines: Iterable of record lines without line terminator
+        encoding: Target encoding of the request body
+
+    Yields:
+        Each line as bytes including the line terminator
+    """
+    for line in lines:
+        yield f"{line}\n".encode(encoding, errors="replace")
+
+
+# Dezimalwerte kommen von Collmex mit Komma als Dezimaltrenner
+_DECIMAL_TRANSLATION = str.maketrans(",", ".")
+
+# Collmex meldet die Anzahl verarbeiteter Datensätze in einer MESSAGE-Zeile
+_PROCESSED_PATTERN = re.compile(r"Es wurden (\d+) Datensätze verarbeitet")
+
+# Projected fields that are converted to float while decoding
+DECIMAL_FIELDS = frozenset({
+    "quantity",
+    "unit_price",
+    "discount_percentage",
+    "total_discount_percentage",
+    "freight_cost",
+})
+
+# Projected fields a record must contain to be usable; all others default when the row is shorter
+REQUIRED_FIELDS = frozenset({
+    "document_id",
+    "part_code",
+    "description",
+    "unit_of_measure",
+    "quantity",
+    "unit_price",
+    "discount_percentage",
+})
+
+
+def parse_collmex_decimal(value, default=0.0):
+    """Parses a Collmex decimal string (comma as separator) into a float."""
+    if not value:
+        return default
+    try:
+        return float(value.translate(_DECIMAL_TRANSLATION))
+    except ValueError:
+        return default
+
+
+def iter_response_lines(response):
+    """
+    Streams the lines of a Collmex response without materialising response.text.
+    Line breaks are kept so that csv.reader can join quoted multi-line fields.
+    """
+    if not response.encoding:
+        response.encoding = COLLMEX_ENCODING
+    for line in response.iter_lines(decode_unicode=True):
+        yield f"{line}\n"
+
+
+class _Projection:
+    """Precomputed column projection for one record type."""
+
+    def __init__(self, fields):
+        fields = dict(fields)
+        fields.setdefault("document_id", 1)
+        required = [index for name, index in fields.items() if name in REQUIRED_FIELDS]
+        self.min_length = max(required) + 1 if required else 1
+        self.text_fields = tuple((name, index) for name, index in fields.items() if name not in DECIMAL_FIELDS)
+        self.decimal_fields = tuple((name, index) for name, index in fields.items() if name in DECIMAL_FIELDS)
+
+    def apply(self, row):
+        length = len(row)
+        record = {name: (row[index] if index < length else "") for name, index in self.text_fields}
+        # Alle Dezimalfelder eines Datensatzes in einem Durchgang umwandeln
+        record.update(
+            (name, parse_collmex_decimal(row[index]) if index < length else 0.0)
+            for name, index in self.decimal_fields
+        )
+        return record
+
+
+class CollmexResponse:
+    """Result of decoding a Collmex data_exchange response."""
+
+    def __init__(self):
+        self.records = {}          # record_type -> list of projected records
+        self.messages = []         # dicts with type, code, text and line
+        self.new_object_ids = []   # dicts with id, temporary_id and record_type
+
+    def records_of(self, record_type):
+        """Returns the projected records of one record type."""
+        return self.records.get(record_type, [])
+
+    @property
+    def errors(self):
+        """Messages of type E (error)."""
+        return [message for message in self.messages if message["type"] == "E"]
+
+    @property
+    def processed_count(self):
+        """Number of records Collmex reports as processed, if it reported one."""
+        for message in self.messages:
+            match = _PROCESSED_PATTERN.search(message["text"])
+            if match:
+                return int(match.group(1))
+        return None
+
+
+class CollmexResponseDecoder:
+    """
+    Single-pass decoder for Collmex responses.
+
+    Projections are precomputed per record type from a field index mapping
+    (e.g. DOCUMENT_TYPE_CONFIG[...]["fields"]), so each row is reduced to the
+    needed columns while streaming. MESSAGE and NEW_OBJECT_ID lines are
+    collected in the same pass.
+    """
+
+    def __init__(self, projections):
+        """
+        Args:
+            projections: Dictionary of record type to {field_name: column_index}
+        """
+        self._projections = {
+            record_type: _Projection(fields) for record_type, fields in projections.items()
+        }
+
+    def decode(self, lines):
+        """
+        Decodes Collmex CSV lines.
+
+        Args:
+            lines: Iterable of lines, e.g. iter_response_lines(response)
+
+        Returns:
+            CollmexResponse with projected records, messages and new object IDs
+        """
+        result = CollmexResponse()
+        projections = self._projections
+        reader = csv.reader(lines, delimiter=COLLMEX_DELIMITER, quotechar=COLLMEX_QUOTECHAR)
+
+        for row in reader:
+            if not row:
+                continue
+            record_type = row[0]
+            projection = projections.get(record_type)
+            if projection is not None:
+                if len(row) >= projection.min_length:
+                    result.records.setdefault(record_type, []).append(projection.apply(row))
+            elif record_type == "MESSAGE":
+                result.messages.append({
+                    "type": row[1] if len(row) > 1 else "",
+                    "code": row[2] if len(row) > 2 else "",
+                    "text": row[3] if len(row) > 3 else "",
+                    "line": int(row[4]) if len(row) > 4 and row[4].isdigit() else None,
+                })
+            elif record_type == "NEW_OBJECT_ID":
+                result.new_object_ids.append({
+                    "id": row[1] if len(row) > 1 else "",
+                    "temporary_id": row[2] if len(row) > 2 else "",
+                    "record_type": row[3] if len(row) > 3 else "",
+                })
+        return result
@@ -1,15 +1,32 @@
+import copy
 import logging
 import requests
 import os
-import re
-from datetime import datetime
-import csv
-from io import StringIO
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from integrations.erp_sharepoint import ERPsharepointIntegration
+from integrations.collmex_csv import (
+    CollmexResponseDecoder,
+    encode_collmex_fields,
+    get_record_encoder,
+    iter_encoded_body,
+    iter_response_lines,
+)
+from utils import TTLCache
+from resilience import FAST_FAIL_ERRORS, DeadlineExceeded, deadline_expired, http_request, remaining_time
+from date_engine import now_formats, parse_date, to_collmex_date
+from totals_engine import compute_totals
 
 collmex_login = os.getenv("COLLMEX_LOGIN")
 collmex_password = os.getenv("COLLMEX_PASSWORD")
 collmex_api_url = os.getenv("COLLMEX_API_URL", "https://www.collmex.de/c.cmx?170095,0,data_exchange")
+# Einzelbelege über den Bulk-Sender bündeln (mehrere Belege pro Collmex-Import)
+collmex_bulk_mode = os.getenv("COLLMEX_BULK_MODE", "false").lower() in ("1", "true", "yes")
+# Timeout (Sekunden) des Import-Requests; begrenzt auch das Warten im Bulk-Sender
+collmex_import_timeout = float(os.getenv("COLLMEX_IMPORT_TIMEOUT", "60"))
+# Read-through Cache für abgerufene Belege (Vorschau/"Send to portal" wird oft wiederholt)
+collmex_cache_ttl = float(os.getenv("COLLMEX_CACHE_TTL_SECONDS", "120"))
+collmex_cache_max_entries = int(os.getenv("COLLMEX_CACHE_MAX_ENTRIES", "256"))
 
 # Define field indices for different document types
 DOCUMENT_TYPE_CONFIG = {
@@ -39,10 +56,10 @@ DOCUMENT_TYPE_CONFIG = {
             "unit_of_measure": 74,
             "quantity": 75,
             "unit_price": 76,
-            "discount_percentage": 769,
-            "terms_and_conditions": 35,
-            "total_discount_percentage": 38,
-            "freight_cost": 52  # Added freight cost index
+            "discount_percentage": 79,
+            "terms_and_conditions": 38,
+            "total_discount_percentage": 35,
+            "freight_cost": 53  # Added freight cost index
         }
     },
     "RequestForQuote": {
@@ -63,7 +80,22 @@ DOCUMENT_TYPE_CONFIG = {
     }
 }
 
+# Spaltenprojektion je Dokumenttyp, einmal beim Import vorberechnet
+RESPONSE_DECODERS = {
+    document_type: CollmexResponseDecoder({config["record_type"]: config["fields"]})
+    for document_type, config in DOCUMENT_TYPE_CONFIG.items()
+}
+
+# Import-Antworten enthalten nur MESSAGE- und NEW_OBJECT_ID-Zeilen
+IMPORT_RESPONSE_DECODER = CollmexResponseDecoder({})
+
+# Cache keyed by (document_id, document_type); only successful fetches are stored
+_document_cache = TTLCache(maxsize=collmex_cache_max_entries, ttl=collmex_cache_ttl)
+
 class ERPcollmexIntegration:
+    # Upstream für den Circuit Breaker (siehe resilience)
+    upstream = "collmex"
+
     @staticmethod
     def send_to_erp(data):
         """Legacy-Methode für RequestForQuote, bleibt für Kompatibilität erhalten"""
@@ -172,62 +204,246 @@ class ERPcollmexIntegration:
         """
         logging.info(f"Sending {docType} document to ERP Collmex...")
 
-        # Collmex API URL
-        api_url = collmex_api_url
+        if collmex_bulk_mode:
+            result = get_bulk_sender(docType).send(data)
+            return None if result.get("processedData") is None else result
 
-        # Headers for the request
-        headers = {
-            "Content-Type": "text/csv",  # Collmex expects plain text
-        }
+        try:
+            return ERPcollmexIntegration._send_import_batch([data], docType)[0]
+        except FAST_FAIL_ERRORS:
+            raise
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error sending document to ERP Collmex: {e}")
+            return None
+
+    @staticmethod
+    def send_documents_to_erp(documents, docType="RequestForQuote"):
+        """
+        Sends several documents in one Collmex import (one LOGIN, one request).
+
+        Args:
+            documents: List of document dictionaries
+            docType: The type of the documents (RequestForQuote, PurchaseOrder)
+
+        Returns:
+            List of results in the order of the documents. Each result has the same
+            keys as send_docType_to_erp plus the Collmex messages of that document.
+        """
+        if not documents:
+            return []
+        logging.info(f"Sending {len(documents)} {docType} documents to ERP Collmex in one import...")
 
         try:
-            # Transform data to Collmex format and get processed items
-            csv_data, processed_data = transformDataToCollmex(data, docType=docType)
-            logging.info(f"Data to send: {csv_data}")
-            
-            # Send the POST request to Collmex
-            response = requests.post(api_url, data=csv_data, headers=headers)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-
-            # Log and return the response
-            logging.info(f"Document sent to ERP Collmex successfully: {response.status_code}")
-            logging.info(f"Response got from ERP Collmex: {response.text}")
-            erp_number = None
-            record_count = None
-
-            # Parse the response text
-            for line in response.text.splitlines():
-                if line.startswith("NEW_OBJECT_ID"):
-                    # Extract ERP number (second field)
-                    erp_number = line.split(";")[1]
-                    logging.info(f"Extracted ERP number: {erp_number}")
-                elif line.startswith("MESSAGE"):
-                    # Extract record count (last part of the message)
-                    match = re.search(r"Es wurden (\d+) Datensätze verarbeitet", line)
-                    if match:
-                        record_count = int(match.group(1))
-
-            # Attach the ERP number to the original data object
+            return ERPcollmexIntegration._send_import_batch(documents, docType)
+        except FAST_FAIL_ERRORS:
+            raise
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error sending {len(documents)} documents to ERP Collmex: {e}")
+            return [
+                {"ERPNummer": None, "Recordcount": 0, "processedData": None,
+                 "messages": [], "error": str(e)}
+                for _ in documents
+            ]
+
+    @staticmethod
+    def _send_import_batch(documents, docType):
+        """
+        Streams the records of all documents into one data_exchange request and maps
+        NEW_OBJECT_ID (by temporary document number) and MESSAGE lines (by line
+        number) in the response back to the source documents.
+
+        Collmex reports the line of the import file in MESSAGE. Records with quoted
+        line breaks (e.g. the end text) span several physical lines, so a message is
+        only assigned to one document if the physical line and the record number
+        point to the same document. All other messages (no line, or a line outside
+        or between documents) are attached to every document of the batch, so an
+        error is never dropped.
+
+        Raises:
+            requests.exceptions.RequestException on transport errors
+        """
+        batch = []
+        record_number = 1  # LOGIN ist Datensatz 1 und Zeile 1
+        physical_line = 1
+        for index, data in enumerate(documents):
+            # Neue Belege bekommen eine eigene negative (temporäre) Belegnummer
+            document_id = data.get("Belegnr") or str(-(10000 + index))
+            lines, processed_data = buildCollmexImport(data, docType=docType, document_id=document_id, with_login=False)
+            lines = list(lines)
+            entry = {"data": data, "documentId": str(document_id), "lines": lines,
+                     "processedData": processed_data, "firstRecord": None, "lastRecord": None,
+                     "firstLine": None, "lastLine": None}
+            if lines:
+                entry["firstRecord"] = record_number + 1
+                entry["firstLine"] = physical_line + 1
+                record_number += len(lines)
+                physical_line += sum(line.count("\n") + 1 for line in lines)
+                entry["lastRecord"] = record_number
+                entry["lastLine"] = physical_line
+            batch.append(entry)
+
+        def body():
+            yield encode_collmex_fields(["LOGIN", collmex_login, collmex_password])
+            for entry in batch:
+                yield from entry["lines"]
+
+        response = http_request(
+            "collmex", "POST", collmex_api_url,
+            data=iter_encoded_body(body()),
+            headers={"Content-Type": "text/csv"},  # Collmex expects plain text
+            timeout=collmex_import_timeout
+        )
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        logging.info(f"Documents sent to ERP Collmex successfully: {response.status_code}")
+
+        # NEW_OBJECT_ID and MESSAGE lines are decoded in one pass over the response
+        decoded = IMPORT_RESPONSE_DECODER.decode(iter_response_lines(response))
+        for message in decoded.messages:
+            logging.info(f"Collmex message {message['type']} {message['code']}: {message['text']} (line {message['line']})")
+
+        def owner(line):
+            if line is None:
+                return None
+            by_line = [entry for entry in batch
+                       if entry["firstLine"] is not None and entry["firstLine"] <= line <= entry["lastLine"]]
+            by_record = [entry for entry in batch
+                         if entry["firstRecord"] is not None and entry["firstRecord"] <= line <= entry["lastRecord"]]
+            if len(by_line) == 1 and by_line == by_record:
+                return by_line[0]["documentId"]
+            return None
+
+        message_owners = [owner(message["line"]) for message in decoded.messages]
+        for message, message_owner in zip(decoded.messages, message_owners):
+            if message_owner is None and message["type"] == "E" and len(batch) > 1:
+                logging.warning(f"Collmex error on line {message['line']} cannot be assigned to one document, "
+                                f"attaching it to all {len(batch)} documents")
+
+        new_ids = {entry["temporary_id"]: entry["id"] for entry in decoded.new_object_ids}
+        unmatched_ids = [entry["id"] for entry in decoded.new_object_ids if entry["temporary_id"] not in
+                         {batch_entry["documentId"] for batch_entry in batch}]
+
+        results = []
+        for entry in batch:
+            data = entry["data"]
+            first, last = entry["firstRecord"], entry["lastRecord"]
+            messages = [
+                message for message, message_owner in zip(decoded.messages, message_owners)
+                if message_owner is None or message_owner == entry["documentId"]
+            ]
+
+            erp_number = new_ids.get(entry["documentId"])
+            if erp_number is None and len(batch) == 1 and decoded.new_object_ids:
+                # Einzelbeleg: Collmex liefert die Nummer ggf. ohne temporäre ID
+                erp_number = decoded.new_object_ids[-1]["id"]
+            elif erp_number is None and len(unmatched_ids) == len(batch):
+                erp_number = unmatched_ids[len(results)]
+
+            # Gecachte Fassungen des Belegs sind nach dem Import veraltet
+            for changed_id in {data.get("Belegnr") if isinstance(data, dict) else None, erp_number}:
+                if changed_id:
+                    ERPcollmexIntegration.invalidate_cached_document(changed_id)
+
             if erp_number:
-                # Use a new dictionary to avoid modifying the original if it's immutable
+                logging.info(f"Extracted ERP number: {erp_number}")
+                # Attach the ERP number to the original data object
                 if isinstance(data, dict):
                     data["ERPNummer"] = erp_number
                     logging.info(f"Added ERPNummer {erp_number} to data object")
                 else:
                     logging.warning(f"Could not add ERPNummer to data - not a dictionary")
 
-            # Return the extracted values and processed data
-            return {
+            if len(batch) == 1:
+                record_count = decoded.processed_count
+            else:
+                record_count = (last - first + 1) if first is not None else 0
+
+            result = {
                 "ERPNummer": erp_number,
                 "Recordcount": record_count,
-                "processedData": processed_data
+                "processedData": entry["processedData"],
+                "messages": messages
             }
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error sending document to ERP Collmex: {e}")
-            return None
+            errors = [message for message in messages if message["type"] == "E"]
+            if errors:
+                result["error"] = "; ".join(message["text"] for message in errors)
+            elif first is None:
+                result["error"] = "No line items could be encoded for this document"
+            results.append(result)
+
+        return results
+
+    @staticmethod
+    def invalidate_cached_document(document_id, document_type=None):
+        """
+        Drops cached fetches of a document.
+
+        Args:
+            document_id: The Collmex document number
+            document_type: Only drop this document type; None drops all types
+
+        Returns:
+            Number of removed cache entries
+        """
+        document_id = str(document_id)
+        if document_type:
+            return int(_document_cache.invalidate((document_id, document_type)))
+        return _document_cache.invalidate_where(lambda key: key[0] == document_id)
+
+    @staticmethod
+    def notify_document_changed(document_id, document_type, changed_on):
+        """
+        Invalidates the cached document if Collmex reports a change after it was cached.
+
+        Args:
+            document_id: The Collmex document number
+            document_type: Type of document (RequestForQuote, Quote, PurchaseOrder)
+            changed_on: Change timestamp as datetime or ISO string (naive values are UTC)
+
+        Returns:
+            True if a cached entry was dropped
+        """
+        parsed = parse_date(changed_on)
+        if parsed is None:
+            raise ValueError(f"Invalid change date: {changed_on}")
+        dropped = _document_cache.invalidate_if_older((str(document_id), document_type), parsed.utc)
+        if dropped:
+            logging.info(f"Cached document {document_id} of type {document_type} changed in Collmex, invalidated")
+        return dropped
+
+    @staticmethod
+    def get_stats():
+        """Returns the statistics of the Collmex document cache."""
+        return {"documentCache": _document_cache.stats()}
+
+    @staticmethod
+    def fetch_document(document_id, document_type, use_cache=True):
+        """
+        Fetch an existing document from Collmex ERP, served from the document cache
+        if a fresh copy is available.
+
+        Args:
+            document_id: The ID of the document to fetch
+            document_type: Type of document (RequestForQuote, Quote, PurchaseOrder, etc.)
+            use_cache: False bypasses the cache lookup (the result is cached anyway)
+
+        Returns:
+            Dictionary containing document data, line items, and custom fields
+        """
+        key = (str(document_id), document_type)
+        if use_cache:
+            cached = _document_cache.get(key)
+            if cached is not None:
+                logging.info(f"Serving document {document_id} of type {document_type} from cache")
+                # Aufrufer verändern portalData, daher immer eine Kopie herausgeben
+                return copy.deepcopy(cached)
+
+        result = ERPcollmexIntegration._fetch_document_uncached(document_id, document_type)
+        if isinstance(result, dict) and "error" not in result:
+            _document_cache.put(key, copy.deepcopy(result))
+        return result
 
     @staticmethod
-    def fetch_document(document_id, document_type):
+    def _fetch_document_uncached(document_id, document_type):
         """
         Fetch an existing document from Collmex ERP using configurable field indices.
         
@@ -245,142 +461,23 @@ class ERPcollmexIntegration:
         if not config:
             logging.error(f"No configuration found for document type: {document_type}")
             return {"error": f"Unsupported document type: {document_type}"}
-        
-        # Get the response_type from config (if present) or default to document_type
-        response_type = config.get("response_type", document_type)
-        logging.info(f"Using response_type '{response_type}' for document_type '{document_type}'")
-        
-        # PortalData from SharePoint (for freightCost, termsAndConditions, etc.)
-        portalData = ERPsharepointIntegration.fetch_portal_data_by_erp_number(document_id, document_type)
-        
-        # Add response_type to portalData if it exists
-        if portalData is None:
-            portalData = {}
-        
-        # Set the type in portalData to the response_type from config
-        portalData["type"] = response_type
-        logging.info(f"Set portalData['type'] to '{response_type}'")
-        
-        logging.info(f"PortalData fetched and enriched with type: {portalData}")
-
-        api_url = "https://www.collmex.de/c.cmx?170095,0,data_exchange"
-        request_body = f"LOGIN;{collmex_login};{collmex_password}\n{config['command']};{document_id}"
-        headers = {"Content-Type": "text/csv"}
 
         try:
-            # Robust error handling following Azure Functions best practices
-            response = requests.post(
-                api_url,
-                data=request_body,
-                headers=headers,
-                timeout=30  # Explicit timeout for network resilience
-            )
-            response.raise_for_status()
-            logging.info(f"Fetched document from Collmex: {response.status_code}")
-            
-            # Use a context manager for better resource handling
-            csv_buffer = StringIO(response.text)
-            csv_reader = csv.reader(csv_buffer, delimiter=';', quotechar='"')
-
-            line_items = []
-            item_number = 1  # Start numbering at 1
-            discount_proz_ges = 0.0  # Initialize total discount percentage
-            terms_and_conditions = ""
-            
-            fields = config["fields"]  # Get field indices for this document type
-            
-            for row in csv_reader:
-                if len(row) < max(fields.values()) + 1:  # Ensure row has enough fields
-                    continue
-                    
-                if row[0] != config["record_type"]:  # Check for correct record type
-                    continue
-
-                # Extract values using the field indices from configuration
-                try:
-                    # Parse quantity and unit price, handling comma as decimal separator
-                    quantity = float(row[fields["quantity"]].replace(',', '.')) 
-                    unit_price = float(row[fields["unit_price"]].replace(',', '.'))
-                except (ValueError, IndexError):
-                    quantity, unit_price = 0.0, 0.0
-                    
-                try:
-                    discount_percentage = float(row[fields["discount_percentage"]].replace(',', '.'))
-                except (ValueError, IndexError):
-                    discount_percentage = 0.0
-                    
-                itemDeclined =  quantity <= 0 or unit_price <= 0  
-                # Calculate discount cost with proper rounding to 2 decimal places
-                discount_cost = round(unit_price * (discount_percentage / 100.0), 2)
-                total_cost = quantity * (unit_price - discount_cost)
-                itemDeclinedReasontext = "Not available" if itemDeclined else ""
-                line_items.append({
-                    "number": item_number,
-                    "partCode": row[fields["part_code"]],
-                    "description": row[fields["description"]],
-                    "unitOfMeasure": row[fields["unit_of_measure"]],
-                    "quantity": quantity,
-                    "unitPrice": unit_price,
-                    "discountPercentage": discount_percentage,
-                    "discountCost": discount_cost,
-                    "totalCost": total_cost,
-                    "declined": itemDeclined,
-                    "declinedReasonText": itemDeclinedReasontext
-
-                })
-                
-                # Increment item number for next item
-                item_number += 1
-                
-                # Get total discount percentage and terms & conditions
-                try:
-                    discount_proz_ges = float(row[fields["total_discount_percentage"]].replace(',', '.'))
-                    terms_and_conditions = row[fields["terms_and_conditions"]]
-                except (ValueError, IndexError):
-                    pass
-
-            logging.info(f"Line items fetched: {len(line_items)}")
-            
-            # Calculate totals
-            sub_cost = 0.0
-            for item in line_items:
-                try:
-                    q = item["quantity"]
-                    up = item["unitPrice"]
-                    disc = item["discountCost"]
-                except (KeyError, ValueError):
-                    q, up, disc = 0.0, 0.0, 0.0
-                sub_cost += q * up - disc 
-                logging.info(f"Item: {item['number']}, Subtotal: {q * up - disc}")
-
-            # Get freight cost from portal data or default to 0
-            freight_cost = float(row[fields["freight_cost"]].replace(',', '.'))
-            
-            # Calculate final discount cost with proper rounding
-            discount_cost = round(sub_cost * discount_proz_ges / 100.0, 2)
-            
-            # Total cost calculation
-            cost = sub_cost - discount_cost + freight_cost
-
-            custom_fields = {
-                "type": config["response_type"],
-                "fetchedOn": datetime.utcnow().isoformat() + "Z",
-                "collmexDocumentId": document_id,
-                "discountPercentage": discount_proz_ges,
-                "discountCost": discount_cost,
-                "subCost": sub_cost,
-                "cost": cost,
-                "termsAndConditions": terms_and_conditions if terms_and_conditions else "",
-                "paymentTerms": portalData.get("paymentTerms", "") if portalData else "",
-                "freightCost": freight_cost
-            }
+            decoded = ERPcollmexIntegration._exchange_get(config, document_type, [document_id])
+            records = decoded.records_of(config["record_type"])
+            if not records:
+                messages = "; ".join(message["text"] for message in decoded.messages)
+                logging.error(f"No {config['record_type']} records returned for document {document_id}: {messages}")
+                return {
+                    "error": f"Document not found in Collmex: {messages or 'no records returned'}",
+                    "documentId": document_id,
+                    "documentType": document_type
+                }
+
+            # PortalData from SharePoint (for freightCost, termsAndConditions, etc.)
+            portalData = ERPsharepointIntegration.fetch_portal_data_by_erp_number(document_id, document_type)
+            return ERPcollmexIntegration._build_fetched_document(document_id, document_type, config, records, portalData)
 
-            return {
-                "portalData": portalData,
-                "lineItems": line_items,
-                "customFields": custom_fields
-            }
-            
         except requests.exceptions.RequestException as e:
             # Enhanced error handling with context
             logging.error(f"Error fetching document {document_id} from Collmex: {str(e)}")
@@ -398,201 +495,296 @@ class ERPcollmexIntegration:
                 "documentType": document_type
             }
 
-def transformDataToCollmex(data, docType="RequestForQuote"):
-    """
-    Transform JSON data into Collmex CSV format (semicolon-separated) and return processed line items.
-    
-    Args:
-        data: The JSON data to transform.
-        docType: Type of document (RequestForQuote, PurchaseOrder)
-        
-    Returns:
-        tuple: (csv_string, processed_data)
-            - csv_string: A string in Collmex CSV format
-            - processed_data: Dictionary with document and line items information
-    """
-    try:
-        # Start with the LOGIN line
-        login_line = f"LOGIN;{collmex_login};{collmex_password}"
-        document_id = data.get("Belegnr", "-10000")
-        firma = "1 Hamburg Factorship GmbH"
-        id_kunde = "99998"
-        payment_terms = "0 30 Tage ohne Abzug"
-        currency = "EUR"
-        delivery_terms = "0 Standard"
-        preis_gruppe = "0 Standard"
-        offer_text = "We herewith offer according to Orgalime S2012-conditions."
-        order_text ="We herewith acknowledge your order, based on Orgalime-conditions S2012."
-        end_text = "Time of delivery: \n Terms of delivery: ex works \n Validity: 2 months after offer"
-        customerRef = data.get("referenceNumber", "")
-        documentDate = format_document_date(data.get("submittedDate"))
-        
-        # Convert decimal values from portal data (with period) to Collmex format (with comma)
-        discount_proz = data.get("discountPercentage", 0.0)
-        discount_proz_str = format_decimal_for_collmex(discount_proz)
-        
-        freight_cost = data.get("freightCost", 0.0)
-        freight_cost_str = format_decimal_for_collmex(freight_cost)
+    @staticmethod
+    def fetch_documents(document_ids, document_type, use_cache=True):
+        """
+        Fetch several documents of one type with a single Collmex exchange.
 
-        # Initialize processed data dictionary
-        processed_data = {
-            "documentInfo": {
-                "documentId": document_id,
-                "documentType": docType,
-                "customerRef": customerRef,
-                "documentDate": documentDate,
-                "currency": currency
-            },
-            "lineItems": []
-        }
+        One LOGIN line is followed by one GET command per document; the rows of the
+        response are demultiplexed by document number.
 
-        csv_content = [login_line]
-        logging.info(f"Data: {data}")
-
-        # Create the document header
-        if docType == "RequestForQuote":
-            document_line = (
-                f"CMXQTN;{document_id};;0;{firma};{id_kunde};;;;;;;;;;;;;;;;;;;;;;0;{documentDate};;{payment_terms};{currency};{preis_gruppe}"
-                f";0;0,00;;\"{offer_text}\";\"{end_text}\";;0;;1;0;0;0,00;;0 Neu;;0;0,00;0,00;;;;;;;;;;;;;;;;;;0"
-            )
-        elif docType == "PurchaseOrder":
-            document_line = (
-                f"CMXORD-2;{document_id};;0;{firma};{id_kunde};;;;;;;;;;;;;;;;;;;;;;0;{customerRef};{documentDate};;{payment_terms};{currency};{preis_gruppe}"
-                f";0;{discount_proz_str};;\"{order_text}\";\"{end_text}\";;1;1;0;0 Neu;1;0;0;;0,00;;;;0;{freight_cost_str};0,00;;;;;;;;;;;;;;;;;0"
-            )
-        logging.info(f"Document line: {document_line}")
-        
-        # Add line items for the document
-        line_items = data.get("lineItems", [])
-        if not line_items:
-            logging.warning("No line items found in data")
-            
-        for item in line_items:
-            try:
-                # Process item description and details
-                logging.info(f"Processing item: {item}")
-                raw_description = item.get('description', '')
-                
-                # Convert decimal values from portal data format to Collmex format
-                discount_item_prozent = item.get('discountPercentage', 0.0)
-                discount_item_prozent_str = format_decimal_for_collmex(discount_item_prozent)
-                
-                quantity = item.get('quantity', 0)
-                quantity_str = format_decimal_for_collmex(quantity)
-                
-                unit_price = item.get('unitPrice', 0)
-                unit_price_str = format_decimal_for_collmex(unit_price)
-                
-                description = raw_description.replace('\r\n', '|').replace('\n', '|').replace('\r', '|') if raw_description else ""
-                
-                # Part Identification in die Beschreibung integrieren, falls vorhanden
-                part_ids = item.get('partIdentification', [])
-                part_details = []
-                if part_ids and isinstance(part_ids, list):
-                    for part_id in part_ids:
-                        if not isinstance(part_id, dict):
-                            continue
-                        
-                        part_type = part_id.get('partType', '')
-                        part_code = part_id.get('partCode', '')
-                        
-                        if part_type and part_code:
-                            part_details.append(f"{part_type}: {part_code}")
-                        elif part_code:
-                            part_details.append(f"Part: {part_code}")
-                    
-                    if part_details:
-                        part_text = " | ".join(part_details)
-                        # Zur Beschreibung hinzufügen
-                        description = f"{description} | {part_text}" if description else part_text
-                        logging.info(f"Added part identification: {part_text}")
-                
-                # Equipment-Section in die Beschreibung integrieren, falls vorhanden
-                equip_details = []
-                if 'equipmentSection' in item and item['equipmentSection'] is not None:
-                    equip = item['equipmentSection']
-                    
-                    # Equipment-Details sammeln
-                    if equip.get('name'):
-                        equip_details.append(f"Equipment: {equip.get('name')}")
-                    if equip.get('accountNumber'):
-                        equip_details.append(f"Account: {equip.get('accountNumber')}")
-                    if equip.get('serialNumber'):
-                        equip_details.append(f"Serial: {equip.get('serialNumber')}")
-                    if equip.get('manufacturer'):
-                        equip_details.append(f"Manufacturer: {equip.get('manufacturer')}")
-                    if equip.get('modelNumber'):
-                        equip_details.append(f"Model: {equip.get('modelNumber')}")
-                    if equip.get('departmentType'):
-                        equip_details.append(f"Department: {equip.get('departmentType')}")
-                    
-                    # Equipment-Details zur Beschreibung hinzufügen (mit Pipe als Trennzeichen)
-                    if equip_details:
-                        equipment_text = " | ".join(equip_details)
-                        # Zeilenumbrüche in Equipment-Details ersetzen
-                        equipment_text = equipment_text.replace('\r\n', '|').replace('\n', '|').replace('\r', '|')
-                        
-                        # Zur Beschreibung hinzufügen
-                        description = f"{description} | {equipment_text}" if description else equipment_text
-                
-                # Add comment to description if available
-                comment = item.get('comment')
-                comment_text = ""
-                if comment:
-                    comment_text = comment.replace('\r\n', '|').replace('\n', '|').replace('\r', '|')
-                    description = f"{description} | Comment: {comment_text}" if description else f"Comment: {comment_text}"
-                
-                number = item.get('number', '')
-                logging.info(f"Item number: {number}, Description: {description}")
-                unit_of_measure = item.get('unitOfMeasure', 'PCE')
-                logging.info(f"Unit of measure: {unit_of_measure}")
-                logging.info(f"Quantity: {quantity_str} (original: {quantity})")
-                logging.info(f"Unit price: {unit_price_str} (original: {unit_price})")   
-
-                # Add to processed_data dictionary
-                processed_item = {
-                    "itemId": item.get('id', f"item-{number}"),
-                    "number": number,
-                    "description": raw_description,
-                    "formattedDescription": description,
-                    "unitOfMeasure": unit_of_measure,
-                    "quantity": quantity,  # Store original value in processed data
-                    "unitPrice": unit_price,  # Store original value in processed data
-                    "partDetails": part_details,
-                    "equipmentDetails": equip_details,
-                    "comment": comment_text
+        Args:
+            document_ids: Iterable of Collmex document numbers
+            document_type: Type of document (RequestForQuote, Quote, PurchaseOrder)
+            use_cache: False fetches all documents from Collmex
+
+        Returns:
+            Dictionary keyed by document ID (as string). Each value has the same format
+            as the result of fetch_document, including error entries for misses.
+        """
+        ids = list(dict.fromkeys(str(document_id) for document_id in document_ids))
+        if not ids:
+            return {}
+
+        config = DOCUMENT_TYPE_CONFIG.get(document_type)
+        if not config:
+            logging.error(f"No configuration found for document type: {document_type}")
+            return {document_id: {"error": f"Unsupported document type: {document_type}"} for document_id in ids}
+
+        # Bereits gecachte Belege nicht erneut abfragen
+        results = {}
+        if use_cache:
+            for document_id in ids:
+                cached = _document_cache.get((document_id, document_type))
+                if cached is not None:
+                    results[document_id] = copy.deepcopy(cached)
+        missing = [document_id for document_id in ids if document_id not in results]
+        if not missing:
+            logging.info(f"Serving {len(ids)} documents of type {document_type} from cache")
+            return results
+        logging.info(f"Fetching {len(missing)} documents of type {document_type} from ERP Collmex in one request "
+                     f"({len(results)} served from cache)...")
+        fetched = ERPcollmexIntegration._fetch_documents_uncached(missing, document_type, config)
+        for document_id, document in fetched.items():
+            if "error" not in document:
+                _document_cache.put((document_id, document_type), copy.deepcopy(document))
+        results.update(fetched)
+        return {document_id: results[document_id] for document_id in ids}
+
+    @staticmethod
+    def _fetch_documents_uncached(ids, document_type, config):
+        """Fetches the given document IDs (strings) with one Collmex exchange."""
+        try:
+            decoded = ERPcollmexIntegration._exchange_get(config, document_type, ids)
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error fetching {len(ids)} documents from Collmex: {str(e)}")
+            return {
+                document_id: {
+                    "error": f"Failed to fetch document: {str(e)}",
+                    "documentId": document_id,
+                    "documentType": document_type
                 }
-                processed_data["lineItems"].append(processed_item)
+                for document_id in ids
+            }
 
-                # Format document lines with comma decimal separator
-                if docType == "RequestForQuote":                
-                    item_line = (
-                        f"{document_line};;{number} {description};"
-                        f"{unit_of_measure};{quantity_str};{unit_price_str};1;0,00;;0;0;0;0;;;;;;"
-                    )
-                elif docType == "PurchaseOrder":
-                    item_line = (
-                        f"{document_line};;{number} {description};"
-                        f"{unit_of_measure};{quantity_str};{unit_price_str};;1;{discount_item_prozent_str};;0;0;0;0;0;0;;;;;;0;0;;;;;"
-                    )
-                csv_content.append(item_line)
-            except Exception as item_error:
-                logging.error(f"Error processing item {item.get('id', 'unknown')}: {item_error}")
+        # Zeilen nach Belegnummer aufteilen
+        records_by_id = {}
+        for record in decoded.records_of(config["record_type"]):
+            records_by_id.setdefault(record["document_id"], []).append(record)
+
+        # PortalData aller gefundenen Belege in einem SharePoint-Durchgang
+        portal_data_by_id = ERPsharepointIntegration.fetch_portal_data_by_erp_numbers(
+            [document_id for document_id in ids if records_by_id.get(document_id)], document_type
+        )
+
+        results = {}
+        for document_id in ids:
+            records = records_by_id.get(document_id)
+            if not records:
+                results[document_id] = {
+                    "error": "Document not found in Collmex",
+                    "documentId": document_id,
+                    "documentType": document_type
+                }
                 continue
+            try:
+                results[document_id] = ERPcollmexIntegration._build_fetched_document(
+                    document_id, document_type, config, records, portal_data_by_id.get(document_id)
+                )
+            except Exception as e:
+                logging.exception(f"Unexpected error processing document {document_id}: {str(e)}")
+                results[document_id] = {
+                    "error": f"Document processing failed: {str(e)}",
+                    "documentId": document_id,
+                    "documentType": document_type
+                }
+
+        logging.info(f"Fetched {sum(1 for r in results.values() if 'error' not in r)} of {len(ids)} documents from Collmex")
+        return results
+
+    @staticmethod
+    def _exchange_get(config, document_type, document_ids):
+        """
+        Sends the GET command of a document type for one or more IDs in one request
+        and decodes the streamed response.
+
+        Raises:
+            requests.exceptions.RequestException on transport errors
+        """
+        request_body = "\n".join(
+            [encode_collmex_fields(["LOGIN", collmex_login, collmex_password])]
+            + [encode_collmex_fields([config["command"], document_id]) for document_id in document_ids]
+        )
+        headers = {"Content-Type": "text/csv"}
+
+        # Robust error handling following Azure Functions best practices
+        response = http_request(
+            "collmex", "POST", collmex_api_url,
+            data=request_body,
+            headers=headers,
+            timeout=30,  # Explicit timeout for network resilience
+            stream=True,  # Rows are decoded while they arrive
+            idempotent=True  # reine Abfrage, darf wiederholt werden
+        )
+        response.raise_for_status()
+        logging.info(f"Fetched documents from Collmex: {response.status_code}")
+
+        return RESPONSE_DECODERS[document_type].decode(iter_response_lines(response))
+
+    @staticmethod
+    def _build_fetched_document(document_id, document_type, config, records, portalData):
+        """
+        Builds portalData, lineItems and customFields of a fetched document from its
+        decoded Collmex records.
+        """
+        # Get the response_type from config (if present) or default to document_type
+        response_type = config.get("response_type", document_type)
+
+        # Add response_type to portalData if it exists
+        if portalData is None:
+            portalData = {}
+
+        # Set the type in portalData to the response_type from config
+        portalData["type"] = response_type
+        logging.info(f"Set portalData['type'] to '{response_type}' for document {document_id}")
+
+        # Header fields are repeated on every row, the first record carries them
+        header = records[0]
+        discount_proz_ges = header["total_discount_percentage"]
+        terms_and_conditions = header["terms_and_conditions"]
+
+        # Positions- und Belegsummen spaltenweise in einem Durchgang
+        totals = compute_totals(
+            [record["quantity"] for record in records],
+            [record["unit_price"] for record in records],
+            [record["discount_percentage"] for record in records],
+            discount_percentage=discount_proz_ges,
+            freight_cost=header["freight_cost"]
+        )
+
+        line_items = []
+        for index, record in enumerate(records):
+            declined = totals.declined[index]
+            line_items.append({
+                "number": index + 1,  # Start numbering at 1
+                "partCode": record["part_code"],
+                "description": record["description"],
+                "unitOfMeasure": record["unit_of_measure"],
+                "quantity": record["quantity"],
+                "unitPrice": record["unit_price"],
+                "discountPercentage": record["discount_percentage"],
+                "discountCost": totals.unit_discounts[index],
+                "totalCost": totals.line_totals[index],
+                "declined": declined,
+                "declinedReasonText": "Not available" if declined else ""
+            })
+
+        logging.info(f"Line items fetched: {len(line_items)}, subtotal {totals.sub_cost}, total {totals.cost}")
+
+        custom_fields = {
+            "type": config["response_type"],
+            "fetchedOn": now_formats().iso_z,
+            "collmexDocumentId": document_id,
+            **totals.as_custom_fields(),
+            "termsAndConditions": terms_and_conditions if terms_and_conditions else "",
+            "paymentTerms": portalData.get("paymentTerms", "") if portalData else ""
+        }
+
+        return {
+            "portalData": portalData,
+            "lineItems": line_items,
+            "customFields": custom_fields
+        }
+
+
+class CollmexBulkSender:
+    """
+    Micro-batches documents into shared Collmex imports.
+
+    Documents submitted within max_wait seconds (or until max_documents are queued)
+    are sent in one data_exchange request. submit() returns a Future that resolves
+    to the per-document result of ERPcollmexIntegration.send_documents_to_erp.
+    """
+
+    def __init__(self, docType="RequestForQuote", max_documents=None, max_wait=None):
+        self.docType = docType
+        self.max_documents = max_documents or int(os.getenv("COLLMEX_BULK_MAX_DOCUMENTS", "25"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("COLLMEX_BULK_MAX_WAIT", "0.5"))
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def submit(self, data):
+        """
+        Queues a document for the next import.
+
+        Returns:
+            concurrent.futures.Future with the result of the document
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((data, future))
+            flush_now = len(self._pending) >= self.max_documents
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.max_wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            # Im Hintergrund senden, damit send() auch hier nur begrenzt wartet
+            threading.Thread(target=self.flush, daemon=True).start()
+        return future
+
+    def send(self, data, timeout=None):
+        """
+        Submits a document and waits for its result.
+
+        The wait is bounded (by default max_wait plus the import timeout plus a margin),
+        so a hung Collmex request cannot block the callers indefinitely, and never longer
+        than the request deadline. On timeout an error result is returned; the import may
+        still complete in the background.
+        """
+        if timeout is None:
+            timeout = self.max_wait + collmex_import_timeout + 10
+        remaining = remaining_time()
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining))
+        try:
+            return self.submit(data).result(timeout=timeout)
+        except FutureTimeoutError:
+            if deadline_expired():
+                raise DeadlineExceeded("Collmex bulk import completed")
+            logging.error(f"No result of Collmex bulk import within {timeout:g}s")
+            return {"ERPNummer": None, "Recordcount": 0, "processedData": None, "messages": [],
+                    "error": f"Collmex bulk import did not finish within {timeout:g}s"}
+
+    def flush(self):
+        """Sends all queued documents now."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+
+        try:
+            results = ERPcollmexIntegration.send_documents_to_erp([data for data, _ in pending], self.docType)
+        except Exception as e:
+            logging.error(f"Collmex bulk import of {len(pending)} documents failed: {e}")
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            future.set_result(result)
+
+
+_bulk_senders = {}
+_bulk_senders_lock = threading.Lock()
+
+
+def get_bulk_sender(docType):
+    """Returns the shared bulk sender for a document type."""
+    with _bulk_senders_lock:
+        sender = _bulk_senders.get(docType)
+        if sender is None:
+            sender = _bulk_senders[docType] = CollmexBulkSender(docType)
+        return sender
 
-        # Return joined CSV and processed data
-        return "\n".join(csv_content), processed_data
-    except KeyError as e:
-        logging.error(f"Missing key in data: {e}")
-        raise ValueError(f"Invalid data format: Missing key {e}")
-    except Exception as e:
-        logging.error(f"Error transforming data to Collmex format: {e}")
-        raise
 
 def format_document_date(date_value):
     """
     Formats a date string or datetime object into the YYYYMMDD format required by Collmex.
-    Can handle various date formats.
+    Can handle various date formats (see date_engine.parse_date).
     
     Args:
         date_value: A string date in various formats or a datetime object
@@ -600,54 +792,7 @@ def format_document_date(date_value):
     Returns:
         String formatted date in YYYYMMDD format or today's date if parsing fails
     """
-    # If None is passed, use current datetime
-    if date_value is None:
-        logging.info("No date value provided, using current UTC time")
-        return datetime.utcnow().strftime("%Y%m%d")
-    
-    # If already a datetime object, just format it
-    if isinstance(date_value, datetime):
-        return date_value.strftime("%Y%m%d")
-    
-    # Handle string dates with various formats
-    if isinstance(date_value, str):
-        # Try common date formats
-        date_formats = [
-            # ISO formats
-            "%Y-%m-%dT%H:%M:%S.%fZ",
-            "%Y-%m-%dT%H:%M:%SZ", 
-            "%Y-%m-%dT%H:%M:%S%z",
-            "%Y-%m-%dT%H:%M:%S.%f",
-            "%Y-%m-%dT%H:%M:%S",
-            # Date only formats
-            "%Y-%m-%d",
-            "%d.%m.%Y",
-            "%m/%d/%Y",
-            "%d/%m/%Y",
-            # Already in target format
-            "%Y%m%d"
-        ]
-        
-        # Special handling for ISO format with timezone offset
-        if 'Z' in date_value:
-            try:
-                # Replace Z with UTC timezone indicator
-                date_obj = datetime.fromisoformat(date_value.replace('Z', '+00:00'))
-                return date_obj.strftime("%Y%m%d")
-            except ValueError:
-                pass
-                
-        # Try each format until one works
-        for fmt in date_formats:
-            try:
-                date_obj = datetime.strptime(date_value, fmt)
-                return date_obj.strftime("%Y%m%d")
-            except ValueError:
-                continue
-    
-    # If we couldn't parse the date, log a warning and use current date
-    logging.warning(f"Could not parse date: {date_value}, using current UTC time")
-    return datetime.utcnow().strftime("%Y%m%d")
+    return to_collmex_date(date_value)
 
 def format_decimal_for_collmex(value):
     """
@@ -670,196 +815,226 @@ def format_decimal_for_collmex(value):
             logging.warning(f"Could not parse decimal value: {value}, using 0,00")
             return "0,00"            
        # Format with 2 decimal places and comma as decimal separator
-    return f"{float(value):.2f}".replace('.', ',')    
-        
-def transformDataToCollmex(data, docType="RequestForQuote"):
+    return f"{float(value):.2f}".replace('.', ',')
+
+# Satzart je Dokumenttyp für den Collmex-Import
+IMPORT_RECORD_TYPES = {
+    "RequestForQuote": "CMXQTN",
+    "PurchaseOrder": "CMXORD-2",
+}
+
+# Feste Stammdaten für importierte Belege
+COLLMEX_COMPANY = "1 Hamburg Factorship GmbH"
+COLLMEX_CUSTOMER_ID = "99998"
+COLLMEX_PAYMENT_TERMS = "0 30 Tage ohne Abzug"
+COLLMEX_CURRENCY = "EUR"
+COLLMEX_PRICE_GROUP = "0 Standard"
+COLLMEX_OFFER_TEXT = "We herewith offer according to Orgalime S2012-conditions."
+COLLMEX_ORDER_TEXT = "We herewith acknowledge your order, based on Orgalime-conditions S2012."
+COLLMEX_END_TEXT = "Time of delivery: \n Terms of delivery: ex works \n Validity: 2 months after offer"
+
+
+def _single_line(text):
+    """Replaces line breaks with pipes so that texts stay on one Collmex line."""
+    return text.replace('\r\n', '|').replace('\n', '|').replace('\r', '|')
+
+
+def describe_item(item):
     """
-    Transform JSON data into Collmex CSV format (semicolon-separated) and return processed line items.
-    
+    Builds the Collmex position text of a line item from description,
+    part identification, equipment section and comment.
+
+    Args:
+        item: A line item of the portal document
+
+    Returns:
+        tuple: (description, part_details, equip_details, comment_text)
+    """
+    raw_description = item.get('description', '')
+    description = _single_line(raw_description) if raw_description else ""
+
+    # Part Identification in die Beschreibung integrieren, falls vorhanden
+    part_ids = item.get('partIdentification', [])
+    part_details = []
+    if part_ids and isinstance(part_ids, list):
+        for part_id in part_ids:
+            if not isinstance(part_id, dict):
+                continue
+
+            part_type = part_id.get('partType', '')
+            part_code = part_id.get('partCode', '')
+
+            if part_type and part_code:
+                part_details.append(f"{part_type}: {part_code}")
+            elif part_code:
+                part_details.append(f"Part: {part_code}")
+
+        if part_details:
+            part_text = " | ".join(part_details)
+            description = f"{description} | {part_text}" if description else part_text
+
+    # Equipment-Section in die Beschreibung integrieren, falls vorhanden
+    equip_details = []
+    equip = item.get('equipmentSection')
+    if equip is not None:
+        if equip.get('name'):
+            equip_details.append(f"Equipment: {equip.get('name')}")
+        if equip.get('accountNumber'):
+            equip_details.append(f"Account: {equip.get('accountNumber')}")
+        if equip.get('serialNumber'):
+            equip_details.append(f"Serial: {equip.get('serialNumber')}")
+        if equip.get('manufacturer'):
+            equip_details.append(f"Manufacturer: {equip.get('manufacturer')}")
+        if equip.get('modelNumber'):
+            equip_details.append(f"Model: {equip.get('modelNumber')}")
+        if equip.get('departmentType'):
+            equip_details.append(f"Department: {equip.get('departmentType')}")
+
+        if equip_details:
+            equipment_text = _single_line(" | ".join(equip_details))
+            description = f"{description} | {equipment_text}" if description else equipment_text
+
+    # Add comment to description if available
+    comment = item.get('comment')
+    comment_text = ""
+    if comment:
+        comment_text = _single_line(comment)
+        description = f"{description} | Comment: {comment_text}" if description else f"Comment: {comment_text}"
+
+    return description, part_details, equip_details, comment_text
+
+
+def buildCollmexImport(data, docType="RequestForQuote", document_id=None, with_login=True):
+    """
+    Prepares the Collmex import of a document as a stream of CSV lines.
+
+    The header segment is encoded once; item lines are encoded lazily while the
+    returned generator is consumed, so the request body can be streamed.
+    processed_data["lineItems"] is filled as the lines are produced.
+
     Args:
         data: The JSON data to transform.
         docType: Type of document (RequestForQuote, PurchaseOrder)
-        
+        document_id: Optional (temporary) Collmex document number, defaults to data["Belegnr"]
+        with_login: Whether the stream starts with the LOGIN line
+
     Returns:
-        tuple: (csv_string, processed_data)
-            - csv_string: A string in Collmex CSV format
+        tuple: (lines, processed_data)
+            - lines: Generator of Collmex CSV lines without line terminator
             - processed_data: Dictionary with document and line items information
     """
-    try:
-        # Start with the LOGIN line
-        login_line = f"LOGIN;{collmex_login};{collmex_password}"
+    record_type = IMPORT_RECORD_TYPES.get(docType)
+    if not record_type:
+        raise ValueError(f"Unsupported document type for Collmex import: {docType}")
+    encoder = get_record_encoder(record_type)
+
+    if document_id is None:
         document_id = data.get("Belegnr", "-10000")
-        firma = "1 Hamburg Factorship GmbH"
-        id_kunde = "99998"
-        payment_terms = "0 30 Tage ohne Abzug"
-        currency = "EUR"
-        delivery_terms = "0 Standard"
-        preis_gruppe = "0 Standard"
-        offer_text = "We herewith offer according to Orgalime S2012-conditions."
-        order_text ="We herewith acknowledge your order, based on Orgalime-conditions S2012."
-        end_text = "Time of delivery: \n Terms of delivery: ex works \n Validity: 2 months after offer"
-        customerRef = data.get("referenceNumber", "")
-        documentDate = format_document_date(data.get("submittedDate"))
-        
+    customerRef = data.get("referenceNumber", "")
+    documentDate = format_document_date(data.get("submittedDate"))
+
+    header_values = {
+        "document_id": document_id,
+        "company": COLLMEX_COMPANY,
+        "customer_id": COLLMEX_CUSTOMER_ID,
+        "document_date": documentDate,
+        "payment_terms": COLLMEX_PAYMENT_TERMS,
+        "currency": COLLMEX_CURRENCY,
+        "price_group": COLLMEX_PRICE_GROUP,
+        "end_text": COLLMEX_END_TEXT,
+    }
+    if docType == "PurchaseOrder":
         # Convert decimal values from portal data (with period) to Collmex format (with comma)
-        discount_proz = data.get("discountPercentage", 0.0)
-        discount_proz_str = format_decimal_for_collmex(discount_proz)
-        
-        freight_cost = data.get("freightCost", 0.0)
-        freight_cost_str = format_decimal_for_collmex(freight_cost)
+        header_values.update({
+            "header_text": COLLMEX_ORDER_TEXT,
+            "customer_ref": customerRef,
+            "discount_percentage": format_decimal_for_collmex(data.get("discountPercentage", 0.0)),
+            "freight_cost": format_decimal_for_collmex(data.get("freightCost", 0.0)),
+        })
+    else:
+        header_values["header_text"] = COLLMEX_OFFER_TEXT
+    header = encoder.encode_header(header_values)
 
-        # Initialize processed data dictionary
-        processed_data = {
-            "documentInfo": {
-                "documentId": document_id,
-                "documentType": docType,
-                "customerRef": customerRef,
-                "documentDate": documentDate,
-                "currency": currency
-            },
-            "lineItems": []
-        }
+    processed_data = {
+        "documentInfo": {
+            "documentId": document_id,
+            "documentType": docType,
+            "customerRef": customerRef,
+            "documentDate": documentDate,
+            "currency": COLLMEX_CURRENCY
+        },
+        "lineItems": []
+    }
+
+    line_items = data.get("lineItems") or []
+    if not line_items:
+        logging.warning("No line items found in data")
+
+    def lines():
+        if with_login:
+            yield encode_collmex_fields(["LOGIN", collmex_login, collmex_password])
 
-        csv_content = [login_line]
-        logging.info(f"Data: {data}")
-
-        # Create the document header
-        if docType == "RequestForQuote":
-            document_line = (
-                f"CMXQTN;{document_id};;0;{firma};{id_kunde};;;;;;;;;;;;;;;;;;;;;;0;{documentDate};;{payment_terms};{currency};{preis_gruppe}"
-                f";0;0,00;;\"{offer_text}\";\"{end_text}\";;0;;1;0;0;0,00;;0 Neu;;0;0,00;0,00;;;;;;;;;;;;;;;;;;0"
-            )
-        elif docType == "PurchaseOrder":
-            document_line = (
-                f"CMXORD-2;{document_id};;0;{firma};{id_kunde};;;;;;;;;;;;;;;;;;;;;;0;{customerRef};{documentDate};;{payment_terms};{currency};{preis_gruppe}"
-                f";0;{discount_proz_str};;\"{order_text}\";\"{end_text}\";;1;1;0;0 Neu;1;0;0;;0,00;;;;0;{freight_cost_str};0,00;;;;;;;;;;;;;;;;;0"
-            )
-        logging.info(f"Document line: {document_line}")
-        
-        # Add line items for the document
-        line_items = data.get("lineItems", [])
-        if not line_items:
-            logging.warning("No line items found in data")
-            
         for item in line_items:
             try:
-                # Process item description and details
-                logging.info(f"Processing item: {item}")
-                raw_description = item.get('description', '')
-                
-                # Convert decimal values from portal data format to Collmex format
-                discount_item_prozent = item.get('discountPercentage', 0.0)
-                discount_item_prozent_str = format_decimal_for_collmex(discount_item_prozent)
-                
+                description, part_details, equip_details, comment_text = describe_item(item)
+                number = item.get('number', '')
                 quantity = item.get('quantity', 0)
-                quantity_str = format_decimal_for_collmex(quantity)
-                
                 unit_price = item.get('unitPrice', 0)
-                unit_price_str = format_decimal_for_collmex(unit_price)
-                
-                description = raw_description.replace('\r\n', '|').replace('\n', '|').replace('\r', '|') if raw_description else ""
-                
-                # Part Identification in die Beschreibung integrieren, falls vorhanden
-                part_ids = item.get('partIdentification', [])
-                part_details = []
-                if part_ids and isinstance(part_ids, list):
-                    for part_id in part_ids:
-                        if not isinstance(part_id, dict):
-                            continue
-                        
-                        part_type = part_id.get('partType', '')
-                        part_code = part_id.get('partCode', '')
-                        
-                        if part_type and part_code:
-                            part_details.append(f"{part_type}: {part_code}")
-                        elif part_code:
-                            part_details.append(f"Part: {part_code}")
-                    
-                    if part_details:
-                        part_text = " | ".join(part_details)
-                        # Zur Beschreibung hinzufügen
-                        description = f"{description} | {part_text}" if description else part_text
-                        logging.info(f"Added part identification: {part_text}")
-                
-                # Equipment-Section in die Beschreibung integrieren, falls vorhanden
-                equip_details = []
-                if 'equipmentSection' in item and item['equipmentSection'] is not None:
-                    equip = item['equipmentSection']
-                    
-                    # Equipment-Details sammeln
-                    if equip.get('name'):
-                        equip_details.append(f"Equipment: {equip.get('name')}")
-                    if equip.get('accountNumber'):
-                        equip_details.append(f"Account: {equip.get('accountNumber')}")
-                    if equip.get('serialNumber'):
-                        equip_details.append(f"Serial: {equip.get('serialNumber')}")
-                    if equip.get('manufacturer'):
-                        equip_details.append(f"Manufacturer: {equip.get('manufacturer')}")
-                    if equip.get('modelNumber'):
-                        equip_details.append(f"Model: {equip.get('modelNumber')}")
-                    if equip.get('departmentType'):
-                        equip_details.append(f"Department: {equip.get('departmentType')}")
-                    
-                    # Equipment-Details zur Beschreibung hinzufügen (mit Pipe als Trennzeichen)
-                    if equip_details:
-                        equipment_text = " | ".join(equip_details)
-                        # Zeilenumbrüche in Equipment-Details ersetzen
-                        equipment_text = equipment_text.replace('\r\n', '|').replace('\n', '|').replace('\r', '|')
-                        
-                        # Zur Beschreibung hinzufügen
-                        description = f"{description} | {equipment_text}" if description else equipment_text
-                
-                # Add comment to description if available
-                comment = item.get('comment')
-                comment_text = ""
-                if comment:
-                    comment_text = comment.replace('\r\n', '|').replace('\n', '|').replace('\r', '|')
-                    description = f"{description} | Comment: {comment_text}" if description else f"Comment: {comment_text}"
-                
-                number = item.get('number', '')
-                logging.info(f"Item number: {number}, Description: {description}")
                 unit_of_measure = item.get('unitOfMeasure', 'PCE')
-                logging.info(f"Unit of measure: {unit_of_measure}")
-                logging.info(f"Quantity: {quantity_str} (original: {quantity})")
-                logging.info(f"Unit price: {unit_price_str} (original: {unit_price})")   
-
-                # Add to processed_data dictionary
-                processed_item = {
-                    "itemId": item.get('id', f"item-{number}"),
-                    "number": number,
-                    "description": raw_description,
-                    "formattedDescription": description,
-                    "unitOfMeasure": unit_of_measure,
-                    "quantity": quantity,  # Store original value in processed data
-                    "unitPrice": unit_price,  # Store original value in processed data
-                    "partDetails": part_details,
-                    "equipmentDetails": equip_details,
-                    "comment": comment_text
-                }
-                processed_data["lineItems"].append(processed_item)
 
-                # Format document lines with comma decimal separator
-                if docType=="RequestForQuote":                
-                    item_line = (
-                        f"{document_line};;{number} {description};"
-                        f"{unit_of_measure};{quantity_str};{unit_price_str};1;0,00;;0;0;0;0;;;;;;"
-                    )
-                elif docType=="PurchaseOrder":
-                    item_line = (
-                        f"{document_line};;{number} {description};"
-                        f"{unit_of_measure};{quantity_str};{unit_price_str};;1;{discount_item_prozent_str};;0;0;0;0;0;0;;;;;;0;0;;;;;"
+                item_values = {
+                    "description": f"{number} {description}",
+                    "unit_of_measure": unit_of_measure,
+                    "quantity": format_decimal_for_collmex(quantity),
+                    "unit_price": format_decimal_for_collmex(unit_price),
+                }
+                if docType == "PurchaseOrder":
+                    item_values["item_discount_percentage"] = format_decimal_for_collmex(
+                        item.get('discountPercentage', 0.0)
                     )
-                csv_content.append(item_line)
+                line = encoder.encode_line(header, item_values)
             except Exception as item_error:
                 logging.error(f"Error processing item {item.get('id', 'unknown')}: {item_error}")
                 continue
 
-        # Return joined CSV and processed data
-        return "\n".join(csv_content), processed_data
+            processed_data["lineItems"].append({
+                "itemId": item.get('id', f"item-{number}"),
+                "number": number,
+                "description": item.get('description', ''),
+                "formattedDescription": description,
+                "unitOfMeasure": unit_of_measure,
+                "quantity": quantity,  # Store original value in processed data
+                "unitPrice": unit_price,  # Store original value in processed data
+                "partDetails": part_details,
+                "equipmentDetails": equip_details,
+                "comment": comment_text
+            })
+            yield line
+
+        logging.info(f"Encoded {len(processed_data['lineItems'])} {record_type} lines for document {document_id}")
+
+    return lines(), processed_data
+
+
+def transformDataToCollmex(data, docType="RequestForQuote"):
+    """
+    Transform JSON data into Collmex CSV format (semicolon-separated) and return processed line items.
+    
+    Args:
+        data: The JSON data to transform.
+        docType: Type of document (RequestForQuote, PurchaseOrder)
+        
+    Returns:
+        tuple: (csv_string, processed_data)
+            - csv_string: A string in Collmex CSV format
+            - processed_data: Dictionary with document and line items information
+    """
+    try:
+        lines, processed_data = buildCollmexImport(data, docType=docType)
+        return "\n".join(lines), processed_data
     except KeyError as e:
         logging.error(f"Missing key in data: {e}")
         raise ValueError(f"Invalid data format: Missing key {e}")
     except Exception as e:
         logging.error(f"Error transforming data to Collmex format: {e}")
         raise
-
@@ -2,11 +2,16 @@ import logging
 import requests
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import csv
 from io import StringIO
 from integrations.erp_sharepoint import ERPsharepointIntegration
-import xmlrpc.client
+from resilience import FAST_FAIL_ERRORS, deadline_expired, http_request, in_current_context
+from integrations.line_matcher import LineMatcher
+from integrations.odoo_cache import odoo_default_product_id, partner_index, product_index
+from integrations.odoo_transport import get_transport
 
 
 
@@ -32,8 +37,14 @@ def get_env_config():
     
     return config
 
+# Maximale Anzahl parallel angelegter Angebote in send_many_to_erp
+odoo_bulk_concurrency = int(os.getenv("ODOO_BULK_CONCURRENCY", "4"))
+# Sekunden, für die die user ID nach der Anmeldung wiederverwendet wird (0 = jedes Mal anmelden)
+odoo_uid_cache_seconds = float(os.getenv("ODOO_UID_CACHE_SECONDS", "900"))
+_uid_cache = {}
+
 def authenticate_odoo_xml():
-    """Authenticate to Odoo using XML-RPC."""
+    """Authenticate to Odoo over the configured transport (XML-RPC or JSON-RPC, see ODOO_TRANSPORT)."""
     config = get_env_config()
     
     # Ensure URL has proper protocol
@@ -41,26 +52,106 @@ def authenticate_odoo_xml():
     if not base_url.startswith(('http://', 'https://')):
         base_url = f"https://{base_url}"
     
-    xml_rpc_url = f"{base_url}/xmlrpc/2/common"
-    logging.info(f"Authenticating to Odoo using XML-RPC: {xml_rpc_url}")
+    cache_key = (base_url, config["DB"], config["USER"])
+    cached = _uid_cache.get(cache_key)
+    if cached and time.monotonic() - cached[1] < odoo_uid_cache_seconds:
+        return cached[0]
+
+    transport = get_transport(base_url)
+    logging.info(f"Authenticating to Odoo using {transport.name}: {base_url}")
     
     try:
-        common = xmlrpc.client.ServerProxy(xml_rpc_url)
-        version_info = common.version()
+        version_info = transport.call("common", "version")
         logging.info(f"Connected to Odoo server version: {version_info}")
         
-        uid = common.authenticate(config["DB"], config["USER"], config["PASS"], {})
+        uid = transport.call("common", "authenticate", config["DB"], config["USER"], config["PASS"], {})
         if uid:
             logging.info(f"Authentication successful, user ID: {uid}")
+            _uid_cache[cache_key] = (uid, time.monotonic())
             return uid
         else:
             logging.error("Authentication failed. Check credentials.")
             return None
+    except FAST_FAIL_ERRORS:
+        raise
     except Exception as e:
         logging.error(f"Authentication error: {str(e)}")
         return None
 
+# Angebotsnummern in Referenzen, z. B. "Ref: SO0001" (Muster konfigurierbar, einmal kompiliert)
+OFFER_REFERENCE_PATTERN = re.compile(os.getenv("OFFER_REFERENCE_PATTERNS", r"(SO\d+|CY-S\d+)"))
+# Numerische Referenzen mit üblichem Präfix, z. B. "Quote #1234"
+NUMERIC_REFERENCE_PATTERN = re.compile(r'(?:ref|reference|quote|quotation|offer|#)[:\s]*(\d+)', re.IGNORECASE)
+
+
+def extract_offer_references(reference_no):
+    """Returns the candidate offer numbers in a reference text, offer number patterns first."""
+    references = [match.group(0) for match in OFFER_REFERENCE_PATTERN.finditer(reference_no)]
+    references.extend(NUMERIC_REFERENCE_PATTERN.findall(reference_no))
+    return list(dict.fromkeys(references))
+
+def get_odoo_executor():
+    """
+    Authenticates to Odoo and returns a function calling execute_kw on the object service
+    of the configured transport (see odoo_transport.get_transport).
+
+    Returns:
+        execute(model, method, args, kwargs=None) or None if authentication failed
+    """
+    uid = authenticate_odoo_xml()
+    if not uid:
+        return None
+
+    config = get_env_config()
+    base_url = config["URL"]
+    if not base_url.startswith(('http://', 'https://')):
+        base_url = f"https://{base_url}"
+    transport = get_transport(base_url)
+
+    def execute(model, method, args, kwargs=None):
+        return transport.call("object", "execute_kw", config["DB"], uid, config["PASS"], model, method, args, kwargs or {})
+
+    return execute
+
+def resolve_line_products(execute, items):
+    """
+    Resolves the products of order lines via the product index (see odoo_cache.ProductIndex).
+
+    Args:
+        execute: Authenticated executor (see get_odoo_executor)
+        items: List of (item_number, description) tuples
+
+    Returns:
+        List of product IDs; the default product for all lines if the lookup fails
+    """
+    try:
+        return product_index.resolve_many(execute, items)
+    except Exception as e:
+        logging.error(f"Error resolving products, using default product {odoo_default_product_id}: {str(e)}")
+        return [odoo_default_product_id] * len(items)
+
+def offer_customer(data, customer=None):
+    """Returns the customer of an offer as dict with at least 'name' (override or data['company']), or None."""
+    if not customer:
+        customer = data.get('company')
+    if isinstance(customer, str):
+        # Kunde als Name übergeben
+        customer = {'name': customer}
+    if not isinstance(customer, dict) or not customer.get('name'):
+        return None
+    return customer
+
+def partner_create_vals(customer):
+    """Values for creating a res.partner from offer customer data."""
+    return {
+        'email': customer.get('email') or False,
+        'contact_address': customer.get('street', '') + ', ' + customer.get('city', '') + ' ' + customer.get('postalcode', '') + ' ' + customer.get('country', '')
+    }
+
 class ERPodooIntegration:
+    # Upstream für den Circuit Breaker (siehe resilience)
+    upstream = "odoo"
+
     @staticmethod
     def send_request_for_quote_to_erp(data):
         """
@@ -109,13 +200,14 @@ class ERPodooIntegration:
         return {"type": "PurchaseOrderConfirmation", "result": result}
 
     @staticmethod
-    def send_to_erp(data, customer=None):
+    def send_to_erp(data, customer=None, execute=None):
         """
         Create or update an offer in Odoo.
         
         Args:
             data: Dictionary containing offer data
             customer: Optional customer name override
+            execute: Optional authenticated executor (see get_odoo_executor) to reuse
                 
         Returns:
             Tuple of (offer_id, record_count) or None if error occurs
@@ -129,18 +221,11 @@ class ERPodooIntegration:
             logging.error(f"Expected dictionary for data, got {type(data).__name__}: {data}")
             return 0, 0
         
-        uid = authenticate_odoo_xml()
-        if not uid:
+        execute = execute or get_odoo_executor()
+        if not execute:
             logging.error("Authentication failed. Cannot create offer.")
             return 0, 0
         
-        config = get_env_config()
-        # Create XML-RPC client with allow_none=True
-        models = xmlrpc.client.ServerProxy(
-            f"{config['URL']}/xmlrpc/2/object",
-            allow_none=True  # Enable None values in XML-RPC calls
-        )
-        
         # Extract key information (with safe defaults)
         document_type = data.get('documentType', '')
         reference_no = data.get('referencNo', '')
@@ -150,58 +235,30 @@ class ERPodooIntegration:
         if document_type == 'Quotation' and reference_no:
             logging.info(f"Processing quotation with reference: {reference_no}")
             
-            # Try to extract an offer number from the reference
             # Common patterns: "Ref: SO0001", "Quote #SO0001", "Your Ref: SO0001", etc.
-            potential_refs = []
-            
-            # Look for Odoo sale order references (typically start with SO)
-            # Get patterns from configuration to avoid hardcoding
-            reference_patterns = os.getenv("OFFER_REFERENCE_PATTERNS", "(SO\\d+|CY-S\\d+)").split('|')
-            combined_pattern = f"({'|'.join(reference_patterns)})"
-            so_matches = re.findall(combined_pattern, reference_no)
-            potential_refs.extend(so_matches)
-            
-            # Look for numeric references with common prefixes
-            num_pattern = r'(?:ref|reference|quote|quotation|offer|#)[:\s]*(\d+)'
-            num_matches = re.findall(num_pattern, reference_no, re.IGNORECASE)
-            potential_refs.extend(num_matches)
-            
-            # If we found potential references, try to find the corresponding offer
-            for ref in potential_refs:
-                logging.info(f"Checking for existing offer with reference: {ref}")
-                offer = ERPodooIntegration.find_offer_by_number(ref)
+            potential_refs = extract_offer_references(reference_no)
+            if potential_refs:
+                # Alle Kandidaten in einer Abfrage prüfen
+                offer = ERPodooIntegration.find_offer_by_references(potential_refs, execute)
                 if offer:
                     existing_offer_id = offer['id']
-                    logging.info(f"Found existing offer: {existing_offer_id}")
-                    break
+                    logging.info(f"Found existing offer: {existing_offer_id} ({offer['name']})")
         
         # If we found an existing offer, update it instead of creating a new one
         if existing_offer_id:
-            return ERPodooIntegration.update_existing_offer(existing_offer_id, data)
+            return ERPodooIntegration.update_existing_offer(existing_offer_id, data, execute)
         
         # Continue with regular offer creation process if no existing offer found
+        customer = offer_customer(data, customer)
         if not customer:
-            if data:
-                customer = data.get('company')
-                customername = customer['name']
-                if not customer:
-                    logging.error("No customer name provided in data.")
-                    return None
-            else:
-                logging.error("No customer name provided.")
-                return None
+            logging.error("No customer name provided.")
+            return None
+        customername = customer['name']
         
-        # Find or create customer
-        customer_ids = models.execute_kw(config["DB"], uid, config["PASS"], 
-                                         'res.partner', 'search', 
-                                         [[('name', 'like', customername)]])
-        if not customer_ids:    
-            customer_id = models.execute_kw(config["DB"], uid, config["PASS"], 
-                                            'res.partner', 'create', [{'name': customername, 'email':customer['email'], 'contact_address': customer.get('street', '') + ', ' + customer.get('city', '') + ' ' + customer.get('postalcode', '')+ ' ' + customer.get('country', '')}])
-            logging.info(f"Customer '{customer}' created with ID: {customer_id}")   
-        else:
-            customer_id = customer_ids[0]
-            logging.info(f"Customer '{customer}' already exists with ID: {customer_id}")
+        # Find or create customer (exact/normalised match in the local partner index)
+        customer_id = partner_index.resolve(execute, customername, customer.get('email'),
+                                            create_vals=partner_create_vals(customer))
+        logging.info(f"Customer '{customername}' resolved to ID: {customer_id}")
 
         # Prepare sale order values with defaults for None values
         vals = {
@@ -253,7 +310,11 @@ class ERPodooIntegration:
                 
             # Add products from the data with defaults for None values
             if 'items' in data and isinstance(data['items'], list):
-                for product in data['items']:
+                # Produkte aller Positionen auf einmal aus dem Produktindex auflösen
+                product_ids = resolve_line_products(execute, [
+                    (product.get('ItemNumber', ''), product.get('Description', '')) for product in data['items']
+                ])
+                for product, product_id in zip(data['items'], product_ids):
                     # Handle null values with defaults
                     quantity = product.get('Quantity') or 1.0
                     unit_price = product.get('UnitPrice') or 0.0
@@ -277,7 +338,7 @@ class ERPodooIntegration:
                         full_description += f"\n\n{spec_info}"
                     
                     line = (0, 0, {
-                        'product_id': 3,  # Default product ID
+                        'product_id': product_id,
                         'product_uom_qty': float(quantity) if quantity else 1.0,
                         'name': full_description,
                         'price_unit': float(unit_price) if unit_price else 0.0
@@ -287,111 +348,159 @@ class ERPodooIntegration:
 
         try:
             # Create the sales order
-            offer_id = models.execute_kw(config["DB"], uid, config["PASS"], 
-                                         'sale.order', 'create', [vals])
+            offer_id = execute('sale.order', 'create', [vals])
             logging.info(f"Offer created with ID: {offer_id}")
             # Fetch the new offer to get its number (name)
-            offer_data = models.execute_kw(config["DB"], uid, config["PASS"], 
-                                           'sale.order', 'read', 
-                                           [offer_id], 
-                                           {'fields': ['name']})
+            offer_data = execute('sale.order', 'read', [offer_id], {'fields': ['name']})
             offer_number = offer_data[0]['name'] if offer_data and 'name' in offer_data[0] else ""
             return offer_id, record_count, offer_number
            
+        except FAST_FAIL_ERRORS:
+            raise
         except Exception as e:
             logging.error(f"Error creating offer in Odoo: {str(e)}")
             # Return explicit tuple to avoid None value issues
             return 0, 0
 
     @staticmethod
-    def update_existing_offer(offer_id, data):
+    def send_many_to_erp(offers, concurrency=None):
+        """
+        Creates or updates many offers with one authenticated client.
+
+        The partners and line products of all new offers are resolved up front (see
+        PartnerIndex.resolve_many and ProductIndex.resolve_many), so the parallel workers
+        only hit the local indexes and never create the same partner or product twice. Offers are then sent with at most
+        `concurrency` parallel send_to_erp calls.
+
+        Args:
+            offers: List of (data, customer) tuples
+            concurrency: Maximum number of parallel offers (default ODOO_BULK_CONCURRENCY)
+
+        Returns:
+            List with one result per offer, in input order: {"success": True, "offer_id",
+            "item_count", "offer_number"} or {"success": False, "error"}
+        """
+        if not offers:
+            return []
+        execute = get_odoo_executor()
+        if not execute:
+            logging.error("Authentication failed. Cannot create offers.")
+            return [{"success": False, "error": "Odoo authentication failed"} for _ in offers]
+
+        # Quotations mit Referenz aktualisieren meist ein bestehendes Angebot und brauchen keinen Partner
+        partners = []
+        products = []
+        for data, customer in offers:
+            if not isinstance(data, dict) or (data.get('documentType') == 'Quotation' and data.get('referencNo')):
+                continue
+            customer = offer_customer(data, customer)
+            if customer:
+                partners.append((customer['name'], customer.get('email'), partner_create_vals(customer)))
+            if isinstance(data.get('items'), list):
+                products.extend((product.get('ItemNumber', ''), product.get('Description', ''))
+                                for product in data['items'] if isinstance(product, dict))
+        if partners:
+            try:
+                partner_index.resolve_many(execute, partners)
+            except Exception as e:
+                # Einzelne Aufrufe lösen die Partner dann selbst auf
+                logging.error(f"Error resolving partners in bulk: {str(e)}")
+        if products:
+            # Produkte aller Angebote vorab in einem Durchgang anlegen, die Worker finden sie dann lokal
+            resolve_line_products(execute, products)
+
+        def send(offer):
+            data, customer = offer
+            if deadline_expired():
+                return {"success": False, "error": "Request deadline exceeded"}
+            try:
+                result = ERPodooIntegration.send_to_erp(data, customer, execute)
+            except Exception as e:
+                logging.error(f"Error sending offer to Odoo: {str(e)}")
+                return {"success": False, "error": str(e)}
+            if not result or len(result) < 3 or not result[0]:
+                # None: kein Kunde angegeben oder Aktualisierung des bestehenden Angebots fehlgeschlagen
+                error = "No customer name provided or offer update failed" if result is None else "Odoo integration error"
+                return {"success": False, "error": error}
+            offer_id, count, offer_number = result
+            return {"success": True, "offer_id": offer_id, "item_count": count, "offer_number": offer_number}
+
+        workers = max(1, min(concurrency or odoo_bulk_concurrency, len(offers)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Jeder Auftrag läuft im Kontext des Aufrufers, damit die Deadline gilt
+            futures = [pool.submit(in_current_context(send), offer) for offer in offers]
+            results = [future.result() for future in futures]
+        logging.info(f"Bulk offer creation: {sum(1 for result in results if result['success'])} of {len(offers)} offers sent with {workers} workers")
+        return results
+
+    @staticmethod
+    def get_stats():
+        """Returns the statistics of the local Odoo indexes."""
+        return {"partnerIndex": partner_index.stats(), "productIndex": product_index.stats()}
+
+    @staticmethod
+    def update_existing_offer(offer_id, data, execute=None):
         """
         Update an existing offer with new price information.
+
+        All changes are sent in one sale.order write: matched lines as (1, id, vals)
+        and unmatched items as (0, 0, vals) commands in order_line, together with the
+        note. The update therefore takes a constant number of RPCs (offer read, line
+        search_read, order write) regardless of the number of items.
         
         Args:
             offer_id: The ID of the existing offer to update
             data: The new quotation data with prices
+            execute: Optional authenticated executor (see get_odoo_executor) to reuse
                 
         Returns:
-            Tuple of (offer_id, updated_count) or None if error occurs
+            Tuple of (offer_id, updated_count, offer_number) or None if error occurs
         """
-        uid = authenticate_odoo_xml()
-        if not uid:
+        execute = execute or get_odoo_executor()
+        if not execute:
             logging.error("Authentication failed. Cannot update offer.")
             return None
-        
-        config = get_env_config()
-        models = xmlrpc.client.ServerProxy(
-            f"{config['URL']}/xmlrpc/2/object",
-            allow_none=True
-        )
-        offer_data = models.execute_kw(config["DB"], uid, config["PASS"], 
-                                           'sale.order', 'read', 
-                                           [offer_id], 
-                                           {'fields': ['name']})
-        offer_number = offer_data[0]['name'] if offer_data and 'name' in offer_data[0] else ""
+
+        offer_id = int(offer_id)
         try:
+            offer_data = execute('sale.order', 'read', [[offer_id]], {'fields': ['name', 'note']})
+            offer = offer_data[0] if offer_data else {}
+            offer_number = offer.get('name', "")
+
             # Get existing offer lines
-            line_ids = models.execute_kw(config["DB"], uid, config["PASS"],
-                'sale.order.line', 'search',
-                [[('order_id', '=', int(offer_id))]]
-            )
-            
-            existing_lines = models.execute_kw(config["DB"], uid, config["PASS"],
-                'sale.order.line', 'read',
-                [line_ids],
+            existing_lines = execute('sale.order.line', 'search_read',
+                [[('order_id', '=', offer_id)]],
                 {'fields': ['product_id', 'name', 'product_uom_qty', 'price_unit', 'sequence']}
             )
             
-            # Create a mapping of names to line IDs for easier matching
-            line_map = {line['name'].strip(): line['id'] for line in existing_lines}
-            line_sequence_map = {line['sequence']: line['id'] for line in existing_lines if 'sequence' in line}
-            
-            # Track how many lines we update
-            updated_count = 0
+            # Änderungen sammeln und in einem einzigen write senden
+            price_updates = {}
+            new_lines = []
             
             # Process new items from the quotation
             if 'items' in data and isinstance(data['items'], list):
+                priced_items = []
                 for item in data['items']:
+                    if item.get('UnitPrice') is None:
+                        logging.warning(f"Skipping item {item.get('ItemNumber', '')} - no price provided")
+                        continue
+                    priced_items.append(item)
+
+                # Zuordnung über Indizes der Zeilennamen, jede Zeile höchstens einem Artikel
+                matches = LineMatcher(existing_lines).match(priced_items)
+                confidences = []
+
+                for item, match in zip(priced_items, matches):
                     item_number = item.get('ItemNumber', '')
                     description = item.get('Description', '')
-                    position = item.get('Position', 0)
                     unit_price = item.get('UnitPrice')
                     
-                    if unit_price is None:
-                        logging.warning(f"Skipping item {item_number} - no price provided")
-                        continue
-                    
-                    # Try to match by various criteria
-                    matched_line_id = None
-                    
-                    # 1. Match by full name (ItemNumber + Description)
-                    full_name = f"{item_number} {description}".strip()
-                    if full_name in line_map:
-                        matched_line_id = line_map[full_name]
-                    
-                    # 2. Match by position/sequence
-                    elif position and position in line_sequence_map:
-                        matched_line_id = line_sequence_map[position]
-                    
-                    # 3. Match by description only
-                    elif description in line_map:
-                        matched_line_id = line_map[description]
-                    
-                    # 4. Match by item number only
-                    elif item_number and any(item_number in key for key in line_map):
-                        matching_keys = [key for key in line_map if item_number in key]
-                        if matching_keys:
-                            matched_line_id = line_map[matching_keys[0]]
-                    
                     # If we found a matching line, update its price
-                    if matched_line_id:
-                        models.execute_kw(config["DB"], uid, config["PASS"],
-                            'sale.order.line', 'write',
-                            [[matched_line_id], {'price_unit': float(unit_price)}]
-                        )
-                        updated_count += 1
-                        logging.info(f"Updated price for item {item_number} {description} to {unit_price}")
+                    if match:
+                        price_updates[match.line_id] = float(unit_price)
+                        confidences.append(match.confidence)
+                        logging.info(f"Updating price for item {item_number} {description} to {unit_price} "
+                                     f"(line {match.line_id}, {match.method}, confidence {match.confidence})")
                     else:
                         logging.info(f"No matching line found for {item_number} {description}. Adding as new line.")
                         
@@ -411,54 +520,49 @@ class ERPodooIntegration:
                         if spec_info:
                             full_description += f"\n\n{spec_info}"
                         
-                        # Add the new line to the existing offer
-                        # Format: (0, 0, vals) for create operation in one2many fields
-                        new_line = {
-                            'order_id': int(offer_id),
-                            'product_id': 3,  # Default product ID
+                        new_lines.append({
+                            'product_id': (item_number, description),  # wird unten aufgelöst
                             'product_uom_qty': float(item.get('Quantity') or 1.0),
                             'name': full_description,
                             'price_unit': float(unit_price)
-                        }
-                        
-                        try:
-                            new_line_id = models.execute_kw(config["DB"], uid, config["PASS"],
-                                'sale.order.line', 'create', [new_line]
-                            )
-                            updated_count += 1
-                            logging.info(f"Added new line with ID {new_line_id} for item {item_number} {description}")
-                        except Exception as line_err:
-                            logging.error(f"Failed to add new line for {item_number}: {str(line_err)}")
+                        })
+
+                if confidences:
+                    logging.info(f"Matched {len(confidences)} of {len(priced_items)} items to {len(existing_lines)} lines "
+                                 f"in offer {offer_id}, lowest confidence {min(confidences)}, "
+                                 f"average {sum(confidences) / len(confidences):.3f}")
+
+            if new_lines:
+                # Produkte der neuen Zeilen auf einmal aus dem Produktindex auflösen
+                product_ids = resolve_line_products(execute, [vals['product_id'] for vals in new_lines])
+                for vals, product_id in zip(new_lines, product_ids):
+                    vals['product_id'] = product_id
+
+            # Format: (1, id, vals) ändert eine Zeile, (0, 0, vals) legt eine neue an
+            commands = [(1, line_id, {'price_unit': price}) for line_id, price in price_updates.items()]
+            commands.extend((0, 0, vals) for vals in new_lines)
+            updated_count = len(commands)
             
-            # Update the offer status if we made changes
+            # Update the offer if we made changes
             if updated_count > 0:
                 # Add a note about the price update
-                existing_note = models.execute_kw(config["DB"], uid, config["PASS"],
-                    'sale.order', 'read',
-                    [int(offer_id)],
-                    {'fields': ['note']}
-                )[0].get('note', '')
-                
+                existing_note = offer.get('note') or ''
                 update_note = f"{existing_note}\n\nPrices updated on {datetime.now().strftime('%Y-%m-%d')} from quotation reference: {data.get('documentNo', 'Unknown')}"
+
+                execute('sale.order', 'write', [[offer_id], {'order_line': commands, 'note': update_note}])
+                # execute('sale.order', 'action_confirm', [[offer_id]])
                 
-                models.execute_kw(config["DB"], uid, config["PASS"],
-                    'sale.order', 'write',
-                    [[int(offer_id)], {'note': update_note}]
-                )
-                # models.execute_kw(config["DB"], uid, config["PASS"],
-                #     'sale.order', 'action_confirm',
-                #     [[int(offer_id)]]
-                #     )
-                
-                logging.info(f"Updated {updated_count} items in offer {offer_id}")
+                logging.info(f"Updated {len(price_updates)} and added {len(new_lines)} items in offer {offer_id}")
             else:
                 logging.warning(f"No items were updated in offer {offer_id}")
             
-            return int(offer_id), updated_count, offer_number
+            return offer_id, updated_count, offer_number
         
+        except FAST_FAIL_ERRORS:
+            raise
         except Exception as e:
             logging.error(f"Error updating existing offer: {str(e)}")
-            return 0, 0
+            return None
 
     @staticmethod
     def fetch_document(document_id, document_type):
@@ -478,7 +582,7 @@ class ERPodooIntegration:
         headers = {"Content-Type": "text/csv"}
 
         try:
-            response = requests.post(api_url, data=request_body, headers=headers)
+            response = http_request("collmex", "POST", api_url, data=request_body, headers=headers, idempotent=True)
             response.raise_for_status()
             logging.info(f"Fetched document from Collmex: {response.status_code}")
             logging.info(f"Response text:\n{response.text}")
@@ -578,86 +682,137 @@ class ERPodooIntegration:
         Returns:
             Ein Dictionary mit den Angebotsdaten oder None bei Fehlern
         """
-        uid = authenticate_odoo_xml()
-        if not uid:
-            logging.error("Authentication failed. Cannot fetch offer.")
+        offers = ERPodooIntegration.get_offers([offer_id])
+        if not offers:
+            logging.error(f"No offer found with ID: {offer_id}")
             return None
-        
-        config = get_env_config()
-        models = xmlrpc.client.ServerProxy(f"{config['URL']}/xmlrpc/2/object")
-        
+        result = offers[0]
+        result["id"] = offer_id
+        logging.info(f"Successfully retrieved offer {offer_id} with {len(result['items'])} line items")
+        return result
+
+    @staticmethod
+    def get_offers(offer_ids, execute=None):
+        """
+        Ruft mehrere Angebote (sale.order) mit drei Abfragen ab: Angebote, alle Zeilen
+        über order_id und alle Kunden. Die Zeilen werden im Speicher zugeordnet.
+
+        Args:
+            offer_ids: IDs der Angebote in Odoo
+            execute: Optional authenticated executor (see get_odoo_executor) to reuse
+
+        Returns:
+            Liste der Angebote in der Reihenfolge der IDs (nicht gefundene fehlen) oder None bei Fehlern
+        """
+        ids = list(dict.fromkeys(int(offer_id) for offer_id in offer_ids))
+        if not ids:
+            return []
+        execute = execute or get_odoo_executor()
+        if not execute:
+            logging.error("Authentication failed. Cannot fetch offers.")
+            return None
+
         try:
-            # Angebotsdaten abrufen
-            offer_data = models.execute_kw(config["DB"], uid, config["PASS"], 
-                'sale.order', 'read', 
-                [int(offer_id)], 
+            # search_read statt read, damit fehlende IDs nicht die ganze Abfrage scheitern lassen
+            offers = execute('sale.order', 'search_read',
+                [[('id', 'in', ids)]],
                 {'fields': ['name', 'date_order', 'partner_id', 'client_order_ref', 'note', 'amount_total', 'state']}
             )
-            
-            if not offer_data:
-                logging.error(f"No offer found with ID: {offer_id}")
-                return None
-                
-            offer = offer_data[0]
-            
-            # Angebotszeilen abrufen
-            line_ids = models.execute_kw(config["DB"], uid, config["PASS"],
-                'sale.order.line', 'search',
-                [[('order_id', '=', int(offer_id))]]
-            )
-            
-            offer_lines = models.execute_kw(config["DB"], uid, config["PASS"],
-                'sale.order.line', 'read',
-                [line_ids],
-                {'fields': ['product_id', 'name', 'product_uom_qty', 'price_unit', 'price_subtotal']}
+            offer_lines = execute('sale.order.line', 'search_read',
+                [[('order_id', 'in', ids)]],
+                {'fields': ['order_id', 'product_id', 'name', 'product_uom_qty', 'price_unit', 'price_subtotal'],
+                 'order': 'order_id, sequence, id'}
             )
-            
-            # Kundendaten abrufen
-            customer_id = offer['partner_id'][0]
-            customer_data = models.execute_kw(config["DB"], uid, config["PASS"],
-                'res.partner', 'read',
-                [customer_id],
+            partner_ids = list({offer['partner_id'][0] for offer in offers if offer.get('partner_id')})
+            customers = execute('res.partner', 'read',
+                [partner_ids],
                 {'fields': ['name', 'street', 'city', 'zip', 'email', 'phone']}
-            )
-            
+            ) if partner_ids else []
+        except Exception as e:
+            logging.error(f"Error fetching offers from Odoo: {str(e)}")
+            return None
+
+        customers_by_id = {customer['id']: customer for customer in customers}
+        lines_by_offer = {}
+        for line in offer_lines:
+            lines_by_offer.setdefault(line['order_id'][0], []).append(line)
+
+        results = {}
+        for offer in offers:
+            customer = customers_by_id.get(offer['partner_id'][0] if offer.get('partner_id') else None, {})
             # Strukturiertes Ergebnis zusammenstellen
-            result = {
-                "id": offer_id,
+            results[offer['id']] = {
+                "id": offer['id'],
                 "reference": offer['name'],
                 "status": offer['state'],
                 "documentDate": offer['date_order'],
                 "documentNo": offer.get('client_order_ref', ''),
                 "note": offer.get('note', ''),
                 "totalAmount": offer['amount_total'],
-                "company": customer_data[0]['name'],
+                "company": customer.get('name', ''),
                 "customerDetails": {
-                    "name": customer_data[0]['name'],
-                    "street": customer_data[0].get('street', ''),
-                    "city": customer_data[0].get('city', ''),
-                    "zip": customer_data[0].get('zip', ''),
-                    "email": customer_data[0].get('email', ''),
-                    "phone": customer_data[0].get('phone', '')
+                    "name": customer.get('name', ''),
+                    "street": customer.get('street', ''),
+                    "city": customer.get('city', ''),
+                    "zip": customer.get('zip', ''),
+                    "email": customer.get('email', ''),
+                    "phone": customer.get('phone', '')
                 },
-                "items": []
+                # Produktzeilen hinzufügen
+                "items": [
+                    {
+                        "ItemNumber": line['product_id'][0] if line.get('product_id') else None,
+                        "Description": line['name'],
+                        "Quantity": line['product_uom_qty'],
+                        "UnitPrice": line['price_unit'],
+                        "TotalPrice": line['price_subtotal']
+                    }
+                    for line in lines_by_offer.get(offer['id'], [])
+                ]
             }
-            
-            # Produktzeilen hinzufügen
-            for line in offer_lines:
-                result["items"].append({
-                    "ItemNumber": line['product_id'][0],
-                    "Description": line['name'],
-                    "Quantity": line['product_uom_qty'],
-                    "UnitPrice": line['price_unit'],
-                    "TotalPrice": line['price_subtotal']
-                })
-                
-            logging.info(f"Successfully retrieved offer {offer_id} with {len(result['items'])} line items")
-            return result
-            
+
+        return [results[offer_id] for offer_id in ids if offer_id in results]
+
+    @staticmethod
+    def find_offer_by_references(references, execute=None):
+        """
+        Sucht das Angebot (sale.order) zu mehreren möglichen Angebotsnummern mit einer Abfrage.
+
+        Args:
+            references: Kandidaten für die Angebotsnummer (Feld 'name'), in absteigender Priorität
+            execute: Optional authenticated executor (see get_odoo_executor) to reuse
+
+        Returns:
+            Dictionary mit 'id' und 'name' des Angebots zum ersten passenden Kandidaten oder None
+        """
+        references = [str(reference) for reference in dict.fromkeys(references) if reference]
+        if not references:
+            return None
+        execute = execute or get_odoo_executor()
+        if not execute:
+            logging.error("Authentication failed. Cannot search for offer.")
+            return None
+
+        try:
+            offers = execute('sale.order', 'search_read',
+                [[('name', 'in', references)]],
+                {'fields': ['name'], 'order': 'id'}
+            )
         except Exception as e:
-            logging.error(f"Error fetching offer from Odoo: {str(e)}")
+            logging.error(f"Error searching for offers by number in Odoo: {str(e)}")
             return None
 
+        offers_by_name = {}
+        for offer in offers:
+            offers_by_name.setdefault(offer['name'], offer)
+        for reference in references:
+            if reference in offers_by_name:
+                offer = offers_by_name[reference]
+                logging.info(f"Found offer with ID: {offer['id']} for number: {reference}")
+                return {"id": offer['id'], "name": offer['name']}
+        logging.info(f"No offer found with numbers: {', '.join(references)}")
+        return None
+
     @staticmethod
     def find_offer_by_number(offer_number):
         """
@@ -669,34 +824,8 @@ class ERPodooIntegration:
         Returns:
             Ein Dictionary mit den Angebotsdaten oder None bei Fehlern/nicht gefunden
         """
-        uid = authenticate_odoo_xml()
-        if not uid:
-            logging.error("Authentication failed. Cannot search for offer.")
-            return None
-        
-        config = get_env_config()
-        models = xmlrpc.client.ServerProxy(f"{config['URL']}/xmlrpc/2/object")
-        
-        try:
-            # Nach Angebot mit der angegebenen Nummer suchen
-            offer_ids = models.execute_kw(config["DB"], uid, config["PASS"], 
-                'sale.order', 'search', 
-                [[('name', '=', offer_number)]], 
-                {'limit': 1}
-            )
-            
-            if not offer_ids:
-                logging.info(f"No offer found with number: {offer_number}")
-                return None
-                
-            # Den ersten gefundenen Datensatz verwenden
-            offer_id = offer_ids[0]
-            logging.info(f"Found offer with ID: {offer_id} for number: {offer_number}")
-            
-            # Die vorhandene get_offer-Funktion verwenden, um die Daten abzurufen
-            return ERPodooIntegration.get_offer(offer_id)
-            
-        except Exception as e:
-            logging.error(f"Error searching for offer by number in Odoo: {str(e)}")
+        offer = ERPodooIntegration.find_offer_by_references([offer_number])
+        if not offer:
             return None
-
+        # Die vorhandene get_offer-Funktion verwenden, um die Daten abzurufen
+        return ERPodooIntegration.get_offer(offer['id'])
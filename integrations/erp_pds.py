@@ -8,8 +8,12 @@ import requests
 import mimetypes
 import azure.functions as func
 from typing import Optional, Dict, Any, Union
+from resilience import FAST_FAIL_ERRORS, http_request
 
 class ERPpdsIntegration:
+    # Upstream für den Circuit Breaker (siehe resilience)
+    upstream = "pds"
+
     @staticmethod
     def send_to_erp(data):
         logging.info("Sending document to ERP PDS...")
@@ -20,10 +24,12 @@ class ERPpdsIntegration:
             "Authorization": f"Bearer {os.getenv('ERP_A_TOKEN')}"
         }
         try:
-            response = requests.post(api_url, json=data, headers=headers)
+            response = http_request("pds", "POST", api_url, json=data, headers=headers)
             response.raise_for_status()
             logging.info(f"Document sent to ERP Collmex successfully: {response.status_code}")
             return response.json()
+        except FAST_FAIL_ERRORS:
+            raise
         except requests.exceptions.RequestException as e:
             logging.error(f"Error sending document to ERP A: {e}")
             return None
@@ -43,9 +49,11 @@ class ERPpdsIntegration:
             "Authorization": f"Bearer {os.getenv('ERP_PDS_TOKEN')}"
         }
         try:
-            response = requests.get(api_url, headers=headers)
+            response = http_request("pds", "GET", api_url, headers=headers)
             response.raise_for_status()
             return response.json()
+        except FAST_FAIL_ERRORS:
+            raise
         except requests.exceptions.RequestException as e:
             logging.error(f"Error fetching document from ERP PDS: {e}")
             return None
@@ -143,8 +151,8 @@ class ERPpdsIntegration:
             
             # Send the request
             logging.info(f"Sending document upload request to PDS API: {upload_endpoint}")
-            response = requests.post(
-                upload_endpoint,
+            response = http_request(
+                "pds", "POST", upload_endpoint,
                 headers=headers,
                 data=data,
                 files=files
@@ -166,6 +174,8 @@ class ERPpdsIntegration:
                 "response": result
             }
             
+        except FAST_FAIL_ERRORS:
+            raise
         except requests.exceptions.RequestException as e:
             error_msg = f"Error uploading document to PDS API: {str(e)}"
             logging.error(error_msg)
@@ -2,9 +2,44 @@ import logging
 import requests
 import os
 import json
+import threading
+import time
 from io import StringIO
 import csv
 from datetime import datetime
+from date_engine import to_sharepoint_date
+from resilience import FAST_FAIL_ERRORS, http_request
+from integrations.graph_throttle import (THROTTLE_STATUS_CODES, get_limiter, graph_max_retries, graph_request,
+                                         limiter_stats, parse_retry_after)
+from integrations.portal_blob_store import canonical_portal_json, load_portal_json, portal_blob_store, store_portal_json
+from integrations.sharepoint_mirror import ANFRAGEN_KEY_FIELDS, MirrorUnavailable, SharePointListMirror
+
+SHAREPOINT_HOSTNAME = "factorship.sharepoint.com"
+SHAREPOINT_SITE_NAME = "AngeboteundAuftrge"
+# Lookups in 'Anfragen' über den lokalen Spiegel statt über Graph-Filter
+sharepoint_mirror_enabled = os.getenv("SHAREPOINT_MIRROR_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Graph-Token und Site-/Listen-IDs werden prozessweit wiederverwendet
+_graph_token = {"value": None, "expires": 0.0}
+_graph_token_lock = threading.Lock()
+_graph_id_cache = {}
+
+# Suchfeld und JSON-Spalte der Portaldaten je Dokumenttyp
+PORTAL_DATA_FIELDS = {
+    "RequestForQuote": ("ERPNr", "PortalDataJson"),
+    "PurchaseOrder": ("ERPOrderNummer", "PortalDataJsonOrder"),
+}
+
+# Graph erlaubt höchstens 20 Anfragen pro $batch
+GRAPH_BATCH_SIZE = 20
+# ERP-Nummern pro OR-Filter (URL-Länge)
+GRAPH_FILTER_CHUNK_SIZE = 15
+
+# Spalten, nach denen per $filter gesucht wird; ohne Index scheitern die Filter ab 5000 Einträgen
+REQUIRED_INDEXED_COLUMNS = {
+    "Anfragen": ("ERPNr", "ERPOrderNummer", "RFQID", "POID", "QuoteID"),
+    "Anfragepos": ("AnfrageID",),
+}
 
 def get_sharepoint_access_token():
     """
@@ -26,10 +61,12 @@ def get_sharepoint_access_token():
     }
 
     try:
-        response = requests.post(token_url, data=payload)
+        response = http_request("graph", "POST", token_url, data=payload, idempotent=True)
         response.raise_for_status()
         token_data = response.json()
         return token_data.get("access_token")
+    except FAST_FAIL_ERRORS:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching SharePoint access token: {e}")
         return None
@@ -37,8 +74,13 @@ def get_sharepoint_access_token():
 def get_graph_access_token():
     """
     Fetch the Microsoft Graph access token using OAuth 2.0.
+    The token is cached until shortly before it expires.
     :return: The access token as a string.
     """
+    with _graph_token_lock:
+        if _graph_token["value"] and time.time() < _graph_token["expires"]:
+            return _graph_token["value"]
+
     tenant_id = os.getenv("AZURE_TENANT_ID")
     client_id = os.getenv("AZURE_CLIENT_ID")
     client_secret = os.getenv("AZURE_CLIENT_SECRET")
@@ -54,10 +96,18 @@ def get_graph_access_token():
     }
 
     try:
-        response = requests.post(token_url, data=payload)
+        response = http_request("graph", "POST", token_url, data=payload, idempotent=True)
         response.raise_for_status()
         token_data = response.json()
-        return token_data.get("access_token")
+        access_token = token_data.get("access_token")
+        if access_token:
+            with _graph_token_lock:
+                _graph_token["value"] = access_token
+                # 5 Minuten vor Ablauf erneuern
+                _graph_token["expires"] = time.time() + int(token_data.get("expires_in", 3599)) - 300
+        return access_token
+    except FAST_FAIL_ERRORS:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching Microsoft Graph access token: {e}")
         return None
@@ -70,16 +120,24 @@ def get_site_id(access_token, hostname, site_name):
     :param site_name: The name of the site (e.g., AngeboteundAuftrge).
     :return: The site ID as a string.
     """
+    cached = _graph_id_cache.get(("site", hostname, site_name))
+    if cached:
+        return cached
     url = f"https://graph.microsoft.com/v1.0/sites/{hostname}:/sites/{site_name}"
     headers = {
         "Authorization": f"Bearer {access_token}"
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = graph_request("GET", url, headers=headers)
         response.raise_for_status()
         site_data = response.json()
-        return site_data.get("id")
+        site_id = site_data.get("id")
+        if site_id:
+            _graph_id_cache[("site", hostname, site_name)] = site_id
+        return site_id
+    except FAST_FAIL_ERRORS:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching site ID: {e}")
         return None
@@ -92,19 +150,25 @@ def get_list_id(access_token, site_id, list_name):
     :param list_name: The name of the list (e.g., Anfragen).
     :return: The list ID as a string.
     """
+    cached = _graph_id_cache.get(("list", site_id, list_name))
+    if cached:
+        return cached
     url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists"
     headers = {
         "Authorization": f"Bearer {access_token}"
     }
 
     try:
-        response = requests.get(url, headers=headers)
+        response = graph_request("GET", url, headers=headers)
         response.raise_for_status()
         lists = response.json().get("value", [])
+        # Alle Listen der Site merken, die Antwort enthält sie ohnehin
         for lst in lists:
-            if lst.get("name") == list_name:
-                return lst.get("id")
-        return None
+            if lst.get("name") and lst.get("id"):
+                _graph_id_cache[("list", site_id, lst["name"])] = lst["id"]
+        return _graph_id_cache.get(("list", site_id, list_name))
+    except FAST_FAIL_ERRORS:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error fetching list ID: {e}")
         return None
@@ -128,7 +192,7 @@ def create_list_item(access_token, site_id, list_id, item_data):
     }
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = graph_request("POST", url, json=payload, headers=headers)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -139,10 +203,232 @@ def create_list_item(access_token, site_id, list_id, item_data):
             f"Response content: {response.text}"
         )
         return None
+    except FAST_FAIL_ERRORS:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"RequestException creating list item: {e}")
         return None
+
+def query_list_items(access_token, site_id, list_id, filter_field, value, select_fields):
+    """
+    Query list items by one field and return only the item ID and the requested fields.
+    :param filter_field: The field to filter by (should be indexed, see ensure_indexed_columns).
+    :param value: The value the field must equal.
+    :param select_fields: Field names to return ($select); large JSON columns only when needed.
+    :return: List of items with "id" and "fields".
+    :raises requests.exceptions.RequestException: On HTTP errors.
+    """
+    url = (
+        f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{list_id}/items"
+        f"?$select=id&$expand=fields($select={','.join(select_fields)})"
+        f"&$filter=fields/{filter_field} eq '{value}'"
+    )
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    response = graph_request("GET", url, headers=headers)
+    response.raise_for_status()
+    return response.json().get("value", [])
+
+def get_list_item_fields(access_token, site_id, list_id, item_id, select_fields):
+    """
+    Load selected fields of one list item, e.g. a large JSON column after a lookup.
+    :return: Dictionary of the requested fields.
+    :raises requests.exceptions.RequestException: On HTTP errors.
+    """
+    url = (
+        f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{list_id}/items/{item_id}/fields"
+        f"?$select={','.join(select_fields)}"
+    )
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    response = graph_request("GET", url, headers=headers)
+    response.raise_for_status()
+    return response.json()
+
+def query_list_items_in(access_token, site_id, list_id, filter_field, values, select_fields):
+    """
+    Query list items whose field equals one of the values, using OR-filters in chunks
+    and following @odata.nextLink.
+    :return: List of items with "id" and "fields".
+    :raises requests.exceptions.RequestException: On HTTP errors.
+    """
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    select = ",".join(dict.fromkeys([filter_field] + list(select_fields)))
+    items = []
+    values = list(values)
+    for start in range(0, len(values), GRAPH_FILTER_CHUNK_SIZE):
+        condition = " or ".join(
+            f"fields/{filter_field} eq '{value}'" for value in values[start:start + GRAPH_FILTER_CHUNK_SIZE]
+        )
+        url = (
+            f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{list_id}/items"
+            f"?$select=id&$expand=fields($select={select})&$filter={condition}"
+        )
+        while url:
+            response = graph_request("GET", url, headers=headers)
+            response.raise_for_status()
+            page = response.json()
+            items.extend(page.get("value", []))
+            url = page.get("@odata.nextLink")
+    return items
+
+def graph_batch(access_token, sub_requests):
+    """
+    Send Graph sub-requests via $batch (in chunks of GRAPH_BATCH_SIZE).
+    Throttled sub-requests (429/503) are sent again after their Retry-After.
+    :param sub_requests: List of dicts with "id", "method" and relative "url".
+    :return: Dictionary of sub-request id to response dict ("status", "body").
+    :raises requests.exceptions.RequestException: On HTTP errors of the batch request itself.
+    """
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    responses = {}
+    if not sub_requests:
+        return responses
+    # Die Unteranfragen gehen an die Site, daher deren Limiter statt dem der $batch-URL
+    limiter = get_limiter(sub_requests[0].get("url", ""))
+    for start in range(0, len(sub_requests), GRAPH_BATCH_SIZE):
+        pending = sub_requests[start:start + GRAPH_BATCH_SIZE]
+        attempt = 0
+        while pending:
+            response = graph_request(
+                "POST",
+                "https://graph.microsoft.com/v1.0/$batch",
+                limiter=limiter,
+                headers=headers,
+                json={"requests": pending},
+                timeout=60
+            )
+            response.raise_for_status()
+            throttled, retry_after = [], 0.0
+            for sub_response in response.json().get("responses", []):
+                responses[sub_response.get("id")] = sub_response
+                if sub_response.get("status") in THROTTLE_STATUS_CODES:
+                    throttled.append(sub_response.get("id"))
+                    retry_after = max(retry_after, parse_retry_after(
+                        (sub_response.get("headers") or {}).get("Retry-After"), attempt + 1))
+            if not throttled or attempt >= graph_max_retries:
+                break
+            attempt += 1
+            limiter.on_throttle(retry_after)
+            pending = [sub_request for sub_request in pending if sub_request.get("id") in throttled]
+    return responses
+
+def _anfragen_graph_context():
+    """Returns (access_token, site_id, list_id) of the list 'Anfragen' or None."""
+    access_token = get_graph_access_token()
+    if not access_token:
+        return None
+    site_id = get_site_id(access_token, SHAREPOINT_HOSTNAME, SHAREPOINT_SITE_NAME)
+    if not site_id:
+        return None
+    list_id = get_list_id(access_token, site_id, "Anfragen")
+    if not list_id:
+        return None
+    return access_token, site_id, list_id
+
+# Der Spiegel hält nur die Schlüsselfelder; PortalDataJson(Order) wird bei Bedarf nachgeladen
+anfragen_mirror = SharePointListMirror("Anfragen", ANFRAGEN_KEY_FIELDS, _anfragen_graph_context,
+                                       select_fields=ANFRAGEN_KEY_FIELDS)
+
+def find_anfrage_in_mirror(field, value):
+    """
+    Looks up an item of 'Anfragen' in the local mirror.
+
+    Returns:
+        Dictionary with "id" and "fields" or None if no item matches
+
+    Raises:
+        MirrorUnavailable if the mirror is disabled, cannot serve the field or was never synchronised
+    """
+    if not sharepoint_mirror_enabled:
+        raise MirrorUnavailable("SharePoint mirror disabled")
+    if field not in ANFRAGEN_KEY_FIELDS:
+        raise MirrorUnavailable(f"Field '{field}' is not mirrored")
+    return anfragen_mirror.find(field, value)
+
+def update_anfrage_in_mirror(item_id, fields):
+    """Write-through of created or patched 'Anfragen' items into the mirror."""
+    if sharepoint_mirror_enabled and item_id:
+        anfragen_mirror.apply_update(item_id, fields)
     
+def ensure_indexed_columns(dry_run=False, required_columns=None):
+    """
+    Checks the column definitions of the SharePoint lists and indexes the columns
+    used in $filter queries (see REQUIRED_INDEXED_COLUMNS).
+
+    Args:
+        dry_run: Only report, do not change column definitions
+        required_columns: Dictionary of list name to column names (defaults to REQUIRED_INDEXED_COLUMNS)
+
+    Returns:
+        Dictionary with the state per list and the queries that would still run non-indexed
+    """
+    required_columns = required_columns or REQUIRED_INDEXED_COLUMNS
+    report = {"dryRun": dry_run, "lists": {}, "nonIndexedQueries": []}
+
+    access_token = get_graph_access_token()
+    if not access_token:
+        report["error"] = "Failed to fetch Microsoft Graph access token."
+        return report
+    site_id = get_site_id(access_token, SHAREPOINT_HOSTNAME, SHAREPOINT_SITE_NAME)
+    if not site_id:
+        report["error"] = "Failed to fetch site ID."
+        return report
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+    for list_name, column_names in required_columns.items():
+        state = {"indexed": [], "created": [], "wouldIndex": [], "missing": [], "notIndexable": [], "failed": []}
+        report["lists"][list_name] = state
+        list_id = get_list_id(access_token, site_id, list_name)
+        if not list_id:
+            state["error"] = f"List '{list_name}' not found"
+            report["nonIndexedQueries"].extend(f"{list_name}.{column}" for column in column_names)
+            continue
+
+        columns_url = f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{list_id}/columns"
+        try:
+            response = graph_request("GET", columns_url, headers=headers)
+            response.raise_for_status()
+            columns = {column.get("name"): column for column in response.json().get("value", [])}
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error reading columns of '{list_name}': {e}")
+            state["error"] = str(e)
+            report["nonIndexedQueries"].extend(f"{list_name}.{column}" for column in column_names)
+            continue
+
+        for column_name in column_names:
+            column = columns.get(column_name)
+            if column is None:
+                state["missing"].append(column_name)
+            elif column.get("indexed"):
+                state["indexed"].append(column_name)
+                continue
+            elif (column.get("text") or {}).get("allowMultipleLines"):
+                # Mehrzeilige Textspalten kann SharePoint nicht indizieren
+                state["notIndexable"].append(column_name)
+            elif dry_run:
+                state["wouldIndex"].append(column_name)
+            else:
+                try:
+                    patch = graph_request(
+                        "PATCH",
+                        f"{columns_url}/{column['id']}",
+                        headers={**headers, "Content-Type": "application/json"},
+                        json={"indexed": True},
+                        timeout=30
+                    )
+                    patch.raise_for_status()
+                    state["created"].append(column_name)
+                    logging.info(f"Created index on '{list_name}.{column_name}'")
+                    continue
+                except requests.exceptions.RequestException as e:
+                    # z. B. Limit von 20 indizierten Spalten pro Liste erreicht
+                    logging.error(f"Error indexing '{list_name}.{column_name}': {e}")
+                    state["failed"].append({"column": column_name, "error": str(e)})
+            report["nonIndexedQueries"].append(f"{list_name}.{column_name}")
+
+    if report["nonIndexedQueries"]:
+        logging.warning(f"SharePoint queries still non-indexed: {', '.join(report['nonIndexedQueries'])}")
+    return report
+
 def link_documents_in_sharepoint(data, source_document_type, target_document_type, 
                                 source_id_field, target_id_field, filter_field, update_field):
     """
@@ -199,22 +485,15 @@ def link_documents_in_sharepoint(data, source_document_type, target_document_typ
             logging.error("Failed to fetch list ID for 'Anfragen'")
             return {"type": source_document_type, "result": result, "linkStatus": "list_error"}
         
-        # Search for the target item in the SharePoint list
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Accept": "application/json",
-            "Prefer": "HonorNonIndexedQueriesWarningMayFailRandomly"
-        }
-        
-        filter_url = (
-            f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{anfragen_list_id}/items"
-            f"?expand=fields&$filter=fields/{filter_field} eq '{target_document_id}'"
-        )
-        
-        response = requests.get(filter_url, headers=headers)
-        response.raise_for_status()
-        
-        items = response.json().get("value", [])
+        # Search for the target item, first in the local mirror, then in the SharePoint list
+        try:
+            mirrored_item = find_anfrage_in_mirror(filter_field, target_document_id)
+            items = [mirrored_item] if mirrored_item else []
+        except MirrorUnavailable as e:
+            logging.info(f"Mirror not available ({e}), querying SharePoint for {filter_field}={target_document_id}")
+            # Nur ID und ERPNr laden, nicht die großen PortalDataJson-Spalten
+            items = query_list_items(access_token, site_id, anfragen_list_id,
+                                     filter_field, target_document_id, ["ERPNr"])
         
         if not items:
             logging.warning(f"No {target_document_type} found with {filter_field}={target_document_id}")
@@ -243,7 +522,7 @@ def link_documents_in_sharepoint(data, source_document_type, target_document_typ
         elif target_document_type == "PurchaseOrder":
             update_data["requestedDeliveryDate"] = data.get("requestedDeliveryDate", "")
             update_data["ERPOrderNummer"] = erp_number
-            update_data["PortalDataJsonOrder"] = json.dumps(data)
+            update_data["PortalDataJsonOrder"] = store_portal_json(canonical_portal_json(data))
             update_data["POID"] = source_document_id
             logging.info(f"Adding ERPNr '{erp_number}' to field 'ERPOrderNummer' for PurchaseOrder")
         
@@ -255,8 +534,9 @@ def link_documents_in_sharepoint(data, source_document_type, target_document_typ
         # Log the update data for troubleshooting
         logging.info(f"Updating SharePoint item {target_item_id} with data: {json.dumps(update_data)}")
         
-        update_response = requests.patch(update_url, headers=update_headers, json=update_data)
+        update_response = graph_request("PATCH", update_url, headers=update_headers, json=update_data)
         update_response.raise_for_status()
+        update_anfrage_in_mirror(target_item_id, update_data)
         
         logging.info(f"Successfully linked {source_document_type} {source_document_id} to {target_document_type} {target_document_id}")
         return {
@@ -275,9 +555,28 @@ def link_documents_in_sharepoint(data, source_document_type, target_document_typ
         logging.error(f"Error linking {source_document_type} to {target_document_type}: {str(e)}")
         return {"type": source_document_type, "result": result, "linkStatus": "error", "error": str(e)}
 
+def _create_line_item(access_token, site_id, list_id, line_item_data):
+    """create_list_item for positions: the header item exists already, so fast failures count as failed position."""
+    try:
+        return create_list_item(access_token, site_id, list_id, line_item_data)
+    except FAST_FAIL_ERRORS as e:
+        logging.error(f"Line item {line_item_data.get('Position')} not created: {e}")
+        return None
+
 class ERPsharepointIntegration:
+    # Upstream für den Circuit Breaker (siehe resilience)
+    upstream = "graph"
+
     @staticmethod
     def send_to_erp(data):
+        """
+        Creates the 'Anfragen' header item and one 'Anfragepos' item per line item.
+
+        Line items that cannot be created are retried once after all other positions.
+        If some still fail, the header item is kept and the result has status
+        "partial" with "headerItemId" and "failedPositions"; these positions must be
+        added to that header item, sending the document again would duplicate the header.
+        """
         access_token = get_graph_access_token()
         if not access_token:
             return {"status": "error", "message": "Failed to fetch Microsoft Graph access token."}
@@ -301,7 +600,7 @@ class ERPsharepointIntegration:
         # Create header item
         header_data = {
             "Title": data["referenceNumber"],  # Titel des Angebots
-            "DokumentDatum": data["createdDate"][:10],  # Erstellungsdatum
+            "DokumentDatum": to_sharepoint_date(data.get("createdDate")),  # Erstellungsdatum
             "Dokumentnr": data["referenceNumber"],  # Dokumentnummer
             "Referenznr": data["subject"],  # Referenznummer
             "Kunde": data["buyer"]["name"],  # Name des Lieferanten
@@ -325,7 +624,7 @@ class ERPsharepointIntegration:
             #"termsAndConditions": data["termsAndConditions"],  # Bedingungen
             #"buyerContact": data["buyerContact"],  # Kontakt des Käufers
             #"portal": "shipserv",
-            "PortalDataJson": json.dumps(data),  # JSON-Daten des Portals
+            "PortalDataJson": store_portal_json(canonical_portal_json(data)),  # JSON-Daten des Portals (oder Blob-Verweis)
             "ERPNr": ERPNumber  # ERP-Nummer
         }
 
@@ -336,8 +635,10 @@ class ERPsharepointIntegration:
 
         # Get the ID of the created header item
         header_item_id = header_response.get("id")
+        update_anfrage_in_mirror(header_item_id, {**header_data, **header_response.get("fields", {})})
 
         # Create line items
+        failed_items = []
         for item in data.get("lineItems", []):
             equipment_section = item.get("equipmentSection", {})
     
@@ -358,8 +659,19 @@ class ERPsharepointIntegration:
                 "AnfrageID": int(header_item_id)
             }
             logging.info(f"Creating line item with data: {json.dumps(line_item_data, indent=2)}")
-            create_list_item(access_token, site_id, line_items_list_id, line_item_data)
-
+            if not _create_line_item(access_token, site_id, line_items_list_id, line_item_data):
+                # Auch nach den Wiederholungen bei Drosselung nicht angelegt
+                failed_items.append((item["number"], line_item_data))
+
+        # Nur die fehlgeschlagenen Positionen noch einmal anlegen, nie den Kopf
+        failed_positions = [
+            position for position, line_item_data in failed_items
+            if not _create_line_item(access_token, site_id, line_items_list_id, line_item_data)
+        ]
+        if failed_positions:
+            logging.error(f"Failed to create line items {failed_positions} for header item {header_item_id}")
+            return {"status": "partial", "message": "Header created, but some line items failed.",
+                    "headerItemId": header_item_id, "failedPositions": failed_positions}
         return {"status": "success", "message": "Data sent to SharePoint successfully."}
 
 
@@ -513,61 +825,148 @@ class ERPsharepointIntegration:
         Sucht in der SharePoint-Liste 'Anfragen' den Eintrag mit ERPNr = document_id
         und gibt das Feld 'PortalDataJson' zurück (als dict).
         """
-        if documentType == "RequestForQuote":
-            lookForERPnr = "ERPNr"
-            portalDataSource="PortalDataJson"
-        elif documentType == "PurchaseOrder":
-            lookForERPnr = "ERPOrderNummer"
-            portalDataSource="PortalDataJsonOrder"
-        access_token = get_graph_access_token()
-        if not access_token:
-            logging.error("Failed to fetch Microsoft Graph access token.")
-            return None
-
-        hostname = "factorship.sharepoint.com"
-        site_name = "AngeboteundAuftrge"
-        site_id = get_site_id(access_token, hostname, site_name)
-        if not site_id:
-            logging.error("Failed to fetch site ID.")
+        lookForERPnr, portalDataSource = PORTAL_DATA_FIELDS.get(documentType, (None, None))
+        if not lookForERPnr:
+            logging.warning(f"No portal data stored in SharePoint for document type {documentType}")
             return None
+        # Lokaler Spiegel zuerst, Graph-Filter nur als Fallback
+        item_id = None
+        try:
+            item = find_anfrage_in_mirror(lookForERPnr, document_id)
+            if not item:
+                logging.info(f"No items found with {lookForERPnr} = {document_id} in mirror.")
+                return None
+            item_id = item["id"]
+        except MirrorUnavailable as e:
+            logging.info(f"Mirror not available ({e}), querying SharePoint")
 
-        anfragen_list_id = get_list_id(access_token, site_id, "Anfragen")
-        if not anfragen_list_id:
-            logging.error("Failed to fetch list ID for 'Anfragen'.")
+        context = _anfragen_graph_context()
+        if not context:
+            logging.error("Failed to fetch Graph access token, site ID or list ID for 'Anfragen'.")
             return None
+        access_token, site_id, anfragen_list_id = context
         logging.info(f"List ID for 'Anfragen': {anfragen_list_id} Dokumentid: {document_id}")
-        # Suche Einträge in der Liste, bei denen fields/ERPNr = 'document_id'
-        query_url = (
-            f"https://graph.microsoft.com/v1.0/sites/{site_id}/lists/{anfragen_list_id}/items"
-            f"?expand=fields&$filter=fields/{lookForERPnr} eq '{document_id}'"
-        )
-        logging.info(f"Query URL: {query_url}")
-        headers = {"Authorization": f"Bearer {access_token}"}
 
         try:
-            response = requests.get(query_url, headers=headers)
-            response.raise_for_status()
-            items = response.json().get("value", [])
+            if item_id is not None:
+                # Die große JSON-Spalte erst hier und nur für diesen Eintrag laden
+                fields = get_list_item_fields(access_token, site_id, anfragen_list_id, item_id, [portalDataSource])
+            else:
+                # Suche Einträge in der Liste, bei denen fields/ERPNr = 'document_id'
+                items = query_list_items(access_token, site_id, anfragen_list_id,
+                                         lookForERPnr, document_id, [portalDataSource])
+                if not items:
+                    logging.info(f"No items found with ERPNr = {document_id}.")
+                    return None
+                # Nimm z.B. das erste gefundene Element
+                fields = items[0].get("fields", {})
+            return ERPsharepointIntegration._parse_portal_data(fields.get(portalDataSource, None), document_id)
 
-            if not items:
-                logging.info(f"No items found with ERPNr = {document_id}.")
-                return None
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error while querying SharePoint: {e}")
+            return None
 
-            # Nimm z.B. das erste gefundene Element
-            fields = items[0].get("fields", {})
-            portal_data_json = fields.get(portalDataSource, None)
-            if not portal_data_json:
-                logging.info(f"No 'PortalDataJson' found for item with ERPNr={document_id}")
-                return None
+    @staticmethod
+    def fetch_portal_data_by_erp_numbers(document_ids, documentType):
+        """
+        Batch variant of fetch_portal_data_by_erp_number for many ERP numbers.
 
-            try:
-                # JSON in ein Python-Dict parsen und zurückgeben
-                return json.loads(portal_data_json)
-            except json.JSONDecodeError:
-                # Falls das Feld kein gültiges JSON enthält, gib den Roh-String zurück
-                return portal_data_json
+        Item IDs are resolved in the mirror (or with chunked OR-filters if the mirror
+        is not available) and the JSON columns are loaded with $batch sub-requests.
 
+        Returns:
+            Dictionary keyed by ERP number (as string) with the portal data, None for misses
+        """
+        ids = list(dict.fromkeys(str(document_id) for document_id in document_ids))
+        results = {document_id: None for document_id in ids}
+        lookForERPnr, portalDataSource = PORTAL_DATA_FIELDS.get(documentType, (None, None))
+        if not ids or not lookForERPnr:
+            if ids:
+                logging.warning(f"No portal data stored in SharePoint for document type {documentType}")
+            return results
+
+        item_ids = {}
+        try:
+            for document_id in ids:
+                item = find_anfrage_in_mirror(lookForERPnr, document_id)
+                if item:
+                    item_ids[document_id] = item["id"]
+            mirrored = True
+        except MirrorUnavailable as e:
+            logging.info(f"Mirror not available ({e}), querying SharePoint for {len(ids)} ERP numbers")
+            mirrored = False
+
+        context = _anfragen_graph_context()
+        if not context:
+            logging.error("Failed to fetch Graph access token, site ID or list ID for 'Anfragen'.")
+            return results
+        access_token, site_id, anfragen_list_id = context
+
+        try:
+            if mirrored:
+                sub_requests = [
+                    {
+                        "id": document_id,
+                        "method": "GET",
+                        "url": f"/sites/{site_id}/lists/{anfragen_list_id}/items/{item_id}/fields"
+                               f"?$select={portalDataSource}"
+                    }
+                    for document_id, item_id in item_ids.items()
+                ]
+                for document_id, sub_response in graph_batch(access_token, sub_requests).items():
+                    if sub_response.get("status") == 200:
+                        results[document_id] = ERPsharepointIntegration._parse_portal_data(
+                            (sub_response.get("body") or {}).get(portalDataSource), document_id
+                        )
+                    else:
+                        logging.error(f"Error loading portal data for ERPNr={document_id}: "
+                                      f"status {sub_response.get('status')}")
+            else:
+                items = query_list_items_in(access_token, site_id, anfragen_list_id,
+                                            lookForERPnr, ids, [portalDataSource])
+                for item in sorted(items, key=lambda entry: int(entry.get("id", 0)), reverse=True):
+                    fields = item.get("fields", {})
+                    # Bei mehreren Treffern gewinnt wie bisher das älteste Element (zuletzt geschrieben)
+                    document_id = str(fields.get(lookForERPnr))
+                    if document_id in results:
+                        results[document_id] = ERPsharepointIntegration._parse_portal_data(
+                            fields.get(portalDataSource), document_id
+                        )
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error while querying SharePoint: {e}")
+            logging.error(f"Error while querying SharePoint for {len(ids)} ERP numbers: {e}")
+
+        found = sum(1 for value in results.values() if value is not None)
+        logging.info(f"Fetched portal data for {found} of {len(ids)} ERP numbers")
+        return results
+
+    @staticmethod
+    def _parse_portal_data(portal_data_json, document_id):
+        """Parses the content of a PortalDataJson field."""
+        if not portal_data_json:
+            logging.info(f"No 'PortalDataJson' found for item with ERPNr={document_id}")
+            return None
+
+        try:
+            # Blob-Verweise transparent auflösen
+            portal_data_json = load_portal_json(portal_data_json)
+        except Exception as e:
+            logging.error(f"Error loading portal data blob for ERPNr={document_id}: {e}")
             return None
 
+        try:
+            # JSON in ein Python-Dict parsen und zurückgeben
+            return json.loads(portal_data_json)
+        except json.JSONDecodeError:
+            # Falls das Feld kein gültiges JSON enthält, gib den Roh-String zurück
+            return portal_data_json
+
+    @staticmethod
+    def get_stats():
+        """Returns the statistics of the 'Anfragen' mirror, the blob store and the Graph rate limiters."""
+        return {
+            "anfragenMirror": anfragen_mirror.stats(),
+            "mirrorEnabled": sharepoint_mirror_enabled,
+            "portalBlobStore": portal_blob_store.stats(),
+            "graphRateLimiters": limiter_stats()
+        }
+
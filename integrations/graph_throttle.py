@@ -0,0 +1,179 @@
+import logging
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from resilience import DeadlineExceeded, RetryPolicy, http_request, remaining_time
+
+# Startwert und Grenzen der Anfragerate (Anfragen pro Sekunde) je Tenant/Site
+graph_rate_initial = float(os.getenv("GRAPH_RATE_LIMIT", "10"))
+graph_rate_min = float(os.getenv("GRAPH_RATE_MIN", "0.5"))
+graph_rate_max = float(os.getenv("GRAPH_RATE_MAX", "50"))
+# Additive Erhöhung (Anfragen pro Sekunde) je Sekunde ohne Drosselung
+graph_rate_increase = float(os.getenv("GRAPH_RATE_INCREASE", "1"))
+graph_max_retries = int(os.getenv("GRAPH_MAX_RETRIES", "6"))
+
+THROTTLE_STATUS_CODES = (429, 503)
+# Rundungsfehler beim Auffüllen des Buckets tolerieren
+_TOKEN_EPSILON = 1e-9
+_SITE_PATTERN = re.compile(r"/sites/([^/?]+)")
+# 429/503 behandelt die Schleife in graph_request über den Limiter, die Retry-Policy nur Serverfehler
+graph_retry_policy = RetryPolicy(retryable_status_codes=(500, 502, 504))
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to throttling (AIMD).
+
+    Each throttle response halves the rate and blocks all callers for the
+    Retry-After period; successful (2xx) requests raise the rate again additively.
+    """
+
+    def __init__(self, name, rate=None, min_rate=None, max_rate=None, increase=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.name = name
+        self.rate = rate or graph_rate_initial
+        self.min_rate = min_rate or graph_rate_min
+        self.max_rate = max_rate or graph_rate_max
+        self.increase = increase if increase is not None else graph_rate_increase
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self.requests = 0
+        self.throttle_events = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self):
+        """
+        Blocks until the next request may be sent.
+
+        Raises:
+            DeadlineExceeded if the wait (e.g. a Retry-After pause set by another
+            request) would end after the request deadline
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                if now >= self._blocked_until:
+                    burst = max(1.0, self.rate)
+                    self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1.0 - _TOKEN_EPSILON:
+                        self._tokens = max(0.0, self._tokens - 1.0)
+                        self.requests += 1
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    wait = self._blocked_until - now
+                remaining = remaining_time()
+                if remaining is not None and wait >= remaining:
+                    raise DeadlineExceeded(f"Graph request ({self.name}), throttled for {wait:.1f}s")
+                self.wait_seconds += wait
+            self._sleep(wait)
+
+    def on_success(self):
+        """Additive increase: about `increase` requests per second more per second of traffic."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after):
+        """Multiplicative decrease and a pause of retry_after seconds for all callers."""
+        with self._lock:
+            self.throttle_events += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+            self._tokens = 0.0
+            self._updated = self._blocked_until
+        logging.warning(f"Graph throttled ({self.name}), waiting {retry_after:.1f}s, rate now {self.rate:.2f}/s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "minRate": self.min_rate,
+                "maxRate": self.max_rate,
+                "requests": self.requests,
+                "throttleEvents": self.throttle_events,
+                "waitSeconds": round(self.wait_seconds, 2)
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url):
+    """Returns the limiter for the tenant and SharePoint site addressed by a Graph URL."""
+    match = _SITE_PATTERN.search(url)
+    key = f"{os.getenv('AZURE_TENANT_ID', '')}/{match.group(1) if match else 'graph'}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveRateLimiter(key)
+        return limiter
+
+
+def limiter_stats():
+    """Statistics of all limiters keyed by tenant/site."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key: limiter.stats() for key, limiter in limiters.items()}
+
+
+def parse_retry_after(value, attempt):
+    """Seconds to wait from a Retry-After header (seconds or HTTP date); exponential default."""
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return min(60.0, 2.0 ** attempt)
+
+
+def graph_request(method, url, limiter=None, **kwargs):
+    """
+    Sends a Graph request through the rate limiter of its tenant/site.
+    Throttled requests (429/503) are retried after Retry-After, so writes are not lost.
+
+    Args:
+        method: HTTP method
+        url: Graph URL
+        limiter: Limiter to use instead of the one derived from the URL (e.g. for $batch)
+        **kwargs: Passed to requests.request (through the "graph" circuit breaker)
+
+    Returns:
+        The requests.Response of the last attempt (callers check the status as before)
+
+    Raises:
+        requests.exceptions.RequestException on transport errors
+        (resilience.CircuitOpenError while the Graph circuit is open)
+    """
+    limiter = limiter or get_limiter(url)
+    kwargs.setdefault("timeout", 30)
+    attempt = 0
+    while True:
+        limiter.acquire()
+        response = http_request("graph", method, url, retry_policy=graph_retry_policy, **kwargs)
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            # Nur erfolgreiche Antworten erhöhen die Rate, Fehler lassen sie unverändert
+            if 200 <= response.status_code < 300:
+                limiter.on_success()
+            return response
+        if attempt >= graph_max_retries:
+            logging.error(f"Graph request {method} {url} still throttled after {attempt} retries")
+            return response
+        attempt += 1
+        retry_after = parse_retry_after(response.headers.get("Retry-After"), attempt)
+        limiter.on_throttle(retry_after)
+        remaining = remaining_time()
+        if remaining is not None and retry_after >= remaining:
+            # Warten würde die Deadline überschreiten: gedrosselte Antwort zurückgeben
+            logging.error(f"Graph request {method} {url} throttled, Retry-After {retry_after:g}s exceeds the deadline")
+            return response
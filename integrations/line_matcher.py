@@ -0,0 +1,215 @@
+from collections import defaultdict
+from typing import NamedTuple
+
+from integrations.odoo_cache import normalize_name
+
+# Konfidenz je Zuordnungsart; höhere Werte werden bei der Zuordnung zuerst vergeben
+SCORE_FULL_NAME = 1.0
+SCORE_POSITION = 0.9
+SCORE_DESCRIPTION = 0.85
+SCORE_ITEM_NUMBER_TOKEN = 0.75
+SCORE_ITEM_NUMBER_SUBSTRING = 0.6
+# Ähnlichkeit der Wörter (Jaccard), ab der eine Zeile ohne sonstigen Treffer zugeordnet wird
+MIN_TOKEN_SIMILARITY = 0.5
+# Nur die seltensten Wörter eines Artikels erzeugen Kandidaten, häufige ("part", "pcs") nicht
+CANDIDATE_TOKENS = 3
+# Wörter in mehr als diesem Anteil der Zeilen (mindestens MIN_COMMON_TOKEN_LINES) gelten als häufig
+COMMON_TOKEN_SHARE = 0.05
+MIN_COMMON_TOKEN_LINES = 8
+NGRAM_SIZE = 3
+
+
+class LineMatch(NamedTuple):
+    """Assignment of a quotation item to an existing order line."""
+    item_index: int     # index of the item in the matched list
+    line_id: int        # ID of the sale.order.line
+    confidence: float   # 0..1, see the SCORE_* constants
+    method: str         # full_name, position, description, item_number, tokens
+
+
+def _compact(text):
+    return normalize_name(text).replace(" ", "")
+
+
+def _ngrams(compact, size=NGRAM_SIZE):
+    if len(compact) <= size:
+        return {compact} if compact else set()
+    return {compact[start:start + size] for start in range(len(compact) - size + 1)}
+
+
+class LineMatcher:
+    """
+    Matches quotation items to the existing lines of one offer.
+
+    Exact-name, sequence, token and character n-gram indexes are built once over the
+    line names, so each item only scores the lines sharing its rarest tokens or all
+    n-grams of its item number instead of scanning every line. Assignments are
+    one-to-one: candidate pairs are taken by descending confidence and a line is
+    never assigned to two items.
+    """
+
+    def __init__(self, lines):
+        """
+        Args:
+            lines: sale.order.line records with 'id', 'name' and optionally 'sequence'
+        """
+        self.lines = list(lines)
+        self._by_name = {}
+        self._by_sequence = {}
+        self._tokens = []
+        self._compact = []
+        self._token_index = defaultdict(set)
+        self._gram_index = None
+        for index, line in enumerate(self.lines):
+            name = (line.get('name') or '').strip()
+            normalized = normalize_name(name)
+            if normalized:
+                self._by_name.setdefault(name, index)
+                self._by_name.setdefault(normalized, index)
+            if line.get('sequence'):
+                self._by_sequence.setdefault(line['sequence'], index)
+            tokens = set(normalized.split())
+            self._tokens.append(tokens)
+            for token in tokens:
+                self._token_index[token].add(index)
+            self._compact.append(normalized.replace(" ", ""))
+        self._common_token_lines = max(MIN_COMMON_TOKEN_LINES, int(len(self.lines) * COMMON_TOKEN_SHARE))
+
+    def _grams(self):
+        # Erst bei der ersten unscharfen Suche aufbauen; meist treffen alle Artikel exakt
+        if self._gram_index is None:
+            self._gram_index = defaultdict(set)
+            for index, compact in enumerate(self._compact):
+                # Trigramme und Bigramme (für zweistellige Artikelnummern)
+                for gram in _ngrams(compact) | _ngrams(compact, 2):
+                    self._gram_index[gram].add(index)
+        return self._gram_index
+
+    def _item_number_candidates(self, item_number):
+        compact = _compact(item_number)
+        number_tokens = normalize_name(item_number).split()
+        # Meist steht die Nummer als eigene Wörter im Namen: Schnittmenge der Wortlisten
+        if number_tokens:
+            postings = sorted((self._token_index.get(token, set()) for token in number_tokens), key=len)
+            candidates = set.intersection(*postings)
+            if candidates or len(compact) < 2:
+                # Einstellige Nummern nur als eigenes Wort
+                return compact, candidates
+        if not compact:
+            return compact, set()
+        # Sonst als Teilstring: Zeilen, die alle n-Gramme der Nummer enthalten
+        grams = _ngrams(compact) if len(compact) >= NGRAM_SIZE else {compact}
+        gram_index = self._grams()
+        postings = sorted((gram_index.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return compact, candidates
+
+    def _name_lookup(self, name):
+        if not name:
+            return None
+        index = self._by_name.get(name)
+        if index is None:
+            index = self._by_name.get(normalize_name(name))
+        return index
+
+    def candidates(self, item):
+        """
+        Scores the lines an item could update.
+
+        Returns:
+            Dictionary of line index to (confidence, method), best method per line
+        """
+        item_number = str(item.get('ItemNumber') or '').strip()
+        description = str(item.get('Description') or '').strip()
+        position = item.get('Position')
+        scored = {}
+
+        def offer(index, score, method):
+            if index not in scored or scored[index][0] < score:
+                scored[index] = (score, method)
+
+        # 1. Match by full name (ItemNumber + Description), auch normalisiert
+        full_name = f"{item_number} {description}".strip()
+        index = self._name_lookup(full_name)
+        if index is not None:
+            offer(index, SCORE_FULL_NAME, "full_name")
+
+        # 2. Match by position/sequence
+        if position and position in self._by_sequence:
+            offer(self._by_sequence[position], SCORE_POSITION, "position")
+
+        # 3. Match by description only
+        index = self._name_lookup(description)
+        if index is not None:
+            offer(index, SCORE_DESCRIPTION, "description")
+
+        if scored:
+            # Exakte Treffer gefunden, unscharfe Suche nicht nötig
+            return scored
+
+        item_tokens = set(normalize_name(full_name).split())
+
+        # 4. Match by item number: Kandidaten über die n-Gramme, dann als Wort oder Teilstring prüfen
+        if item_number:
+            compact, candidates = self._item_number_candidates(item_number)
+            number_tokens = set(normalize_name(item_number).split())
+            for index in candidates:
+                if compact not in self._compact[index]:
+                    continue
+                overlap = self._similarity(item_tokens, self._tokens[index])
+                if number_tokens and number_tokens <= self._tokens[index]:
+                    offer(index, SCORE_ITEM_NUMBER_TOKEN + 0.1 * overlap, "item_number")
+                else:
+                    offer(index, SCORE_ITEM_NUMBER_SUBSTRING + 0.1 * overlap, "item_number")
+
+        # 5. Ähnliche Wörter, Kandidaten nur über die seltensten Wörter des Artikels
+        if item_tokens:
+            rare_tokens = sorted(
+                (token for token in item_tokens
+                 if 0 < len(self._token_index.get(token, ())) <= self._common_token_lines),
+                key=lambda token: len(self._token_index[token])
+            )
+            candidates = set()
+            for token in rare_tokens[:CANDIDATE_TOKENS]:
+                candidates |= self._token_index[token]
+            for index in candidates:
+                similarity = self._similarity(item_tokens, self._tokens[index])
+                if similarity >= MIN_TOKEN_SIMILARITY:
+                    offer(index, 0.5 * similarity, "tokens")
+
+        return scored
+
+    @staticmethod
+    def _similarity(left, right):
+        if not left or not right:
+            return 0.0
+        return len(left & right) / len(left | right)
+
+    def match(self, items):
+        """
+        Assigns items to lines one-to-one by descending confidence.
+
+        Args:
+            items: Quotation items with ItemNumber, Description and Position
+
+        Returns:
+            List with a LineMatch or None (no line left for the item) per item
+        """
+        pairs = []
+        for item_index, item in enumerate(items):
+            for line_index, (score, method) in self.candidates(item).items():
+                pairs.append((-score, item_index, line_index, method))
+        pairs.sort()
+
+        matches = [None] * len(items)
+        used_lines = set()
+        for negative_score, item_index, line_index, method in pairs:
+            if matches[item_index] is not None or line_index in used_lines:
+                continue
+            used_lines.add(line_index)
+            matches[item_index] = LineMatch(item_index, self.lines[line_index]['id'], round(-negative_score, 3), method)
+        return matches
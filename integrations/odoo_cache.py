@@ -0,0 +1,366 @@
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+# Sekunden, nach denen ein Index vor der nächsten Abfrage inkrementell aktualisiert wird
+odoo_index_refresh_seconds = float(os.getenv("ODOO_INDEX_REFRESH_SECONDS", "300"))
+# Produkt für Positionen ohne Artikelnummer und ohne passendes Produkt
+odoo_default_product_id = int(os.getenv("ODOO_DEFAULT_PRODUCT_ID", "3"))
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(value):
+    """Normalises a name for matching: accents removed, casefolded, punctuation collapsed to single spaces."""
+    if not value:
+        return ""
+    value = str(value)
+    if value.isascii():
+        value = value.lower()
+    else:
+        value = unicodedata.normalize("NFKD", value)
+        value = "".join(char for char in value if not unicodedata.combining(char)).casefold()
+    return " ".join(filter(None, _NON_ALNUM.split(value)))
+
+
+def _escape_like(value):
+    """Escapes the wildcards of =ilike so the server search stays an exact match."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class OdooRecordIndex:
+    """
+    In-memory index of Odoo records, bulk-loaded once with search_read and refreshed
+    incrementally by write_date.
+
+    Subclasses define the model, the loaded fields and the lookup keys of a record.
+    All lookups take an execute(model, method, args, kwargs=None) function (see
+    erp_odoo.get_odoo_executor), so the index does not own an Odoo connection.
+    """
+
+    model = None
+    fields = ()
+
+    def __init__(self, refresh_seconds=None, clock=time.monotonic):
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else odoo_index_refresh_seconds
+        self._clock = clock
+        self._lock = threading.RLock()
+        # Suche nach lokalen Fehltreffern und Anlage serialisieren, sonst legen parallele
+        # Aufrufe denselben Datensatz doppelt an
+        self._create_lock = threading.Lock()
+        self._records = {}      # id -> record
+        self._record_keys = {}  # id -> keys of the record
+        self._index = {}        # key -> set of ids
+        self._max_write_date = None
+        self._last_refresh = None
+        self.refreshes = 0
+        self.hits = 0
+        self.misses = 0
+        self.server_lookups = 0
+        self.creates = 0
+
+    def keys(self, record):
+        """Returns the lookup keys of a record as (kind, value) tuples."""
+        raise NotImplementedError
+
+    def _domain(self):
+        return []
+
+    # Laden und Aktualisieren
+
+    def _add(self, record):
+        record_id = record["id"]
+        for key in self._record_keys.pop(record_id, ()):
+            ids = self._index.get(key)
+            if ids:
+                ids.discard(record_id)
+                if not ids:
+                    del self._index[key]
+        keys = tuple(key for key in self.keys(record) if key[1])
+        self._records[record_id] = record
+        self._record_keys[record_id] = keys
+        for key in keys:
+            self._index.setdefault(key, set()).add(record_id)
+        write_date = record.get("write_date")
+        if write_date and (self._max_write_date is None or write_date > self._max_write_date):
+            self._max_write_date = write_date
+
+    def refresh(self, execute, force=False):
+        """
+        Loads all records on the first call, afterwards only records changed since the
+        newest known write_date (at most every refresh_seconds unless forced).
+
+        Returns:
+            Number of loaded records
+        """
+        with self._lock:
+            now = self._clock()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_seconds:
+                return 0
+            domain = list(self._domain())
+            if self._max_write_date:
+                # >= statt >, damit Änderungen in derselben Sekunde nicht verloren gehen
+                domain.append(('write_date', '>=', self._max_write_date))
+            records = execute(self.model, 'search_read', [domain],
+                              {'fields': list(self.fields) + ['write_date'], 'order': 'id'})
+            for record in records:
+                self._add(record)
+            self._last_refresh = now
+            self.refreshes += 1
+            logging.info(f"Odoo index {self.model}: {len(records)} records loaded, {len(self._records)} total")
+            return len(records)
+
+    def _lookup(self, *keys):
+        """Returns the oldest record id for the first key that matches, or None."""
+        for key in keys:
+            ids = self._index.get(key)
+            if ids:
+                return min(ids)
+        return None
+
+    def remember(self, record):
+        """Adds a record created or found outside the bulk load."""
+        with self._lock:
+            self._add(record)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "records": len(self._records),
+                "refreshes": self.refreshes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "serverLookups": self.server_lookups,
+                "creates": self.creates,
+            }
+
+
+class PartnerIndex(OdooRecordIndex):
+    """res.partner by exact name, normalised name and (unique) e-mail address."""
+
+    model = 'res.partner'
+    fields = ('id', 'name', 'email')
+
+    def keys(self, record):
+        name = record.get("name") or ""
+        email = record.get("email") or ""
+        return (
+            ("name", name.strip()),
+            ("normalized", normalize_name(name)),
+            ("email", email.strip().casefold()),
+        )
+
+    def find(self, name, email=None):
+        """Resolves a partner locally: exact name, normalised name, then an e-mail used by one partner only."""
+        with self._lock:
+            partner_id = self._lookup(("name", (name or "").strip()), ("normalized", normalize_name(name)))
+            if partner_id is None and email:
+                ids = self._index.get(("email", email.strip().casefold()))
+                if ids and len(ids) == 1:
+                    partner_id = next(iter(ids))
+            return partner_id
+
+    def resolve(self, execute, name, email=None, create_vals=None):
+        """
+        Returns the ID of the partner with this name, searching Odoo only on a local miss.
+
+        Args:
+            execute: execute(model, method, args, kwargs=None) of an authenticated Odoo client
+            name: Partner name
+            email: Optional e-mail used if the name does not match
+            create_vals: Values to create the partner with if it does not exist (None: do not create)
+
+        Returns:
+            Partner ID or None
+        """
+        if not name:
+            return None
+        self.refresh(execute)
+        partner_id = self.find(name, email)
+        with self._lock:
+            if partner_id is not None:
+                self.hits += 1
+                return partner_id
+            self.misses += 1
+
+        with self._create_lock:
+            # Inzwischen von einem parallelen Aufruf angelegt?
+            partner_id = self.find(name, email)
+            if partner_id is not None:
+                return partner_id
+            with self._lock:
+                self.server_lookups += 1
+
+            # Evtl. erst nach dem letzten Abgleich angelegt: exakte Suche ohne Groß-/Kleinschreibung
+            found = execute(self.model, 'search_read', [[('name', '=ilike', _escape_like(name.strip()))]],
+                            {'fields': list(self.fields) + ['write_date'], 'limit': 1, 'order': 'id'})
+            if found:
+                self.remember(found[0])
+                return found[0]["id"]
+
+            if create_vals is None:
+                return None
+            vals = {'name': name, **create_vals}
+            partner_id = execute(self.model, 'create', [vals])
+            with self._lock:
+                self.creates += 1
+            self.remember({"id": partner_id, "name": vals["name"], "email": vals.get("email") or ""})
+        logging.info(f"Partner '{name}' created with ID: {partner_id}")
+        return partner_id
+
+
+    def resolve_many(self, execute, partners):
+        """
+        Resolves many partners with at most two additional RPCs for all local misses:
+        one search_read with the names OR-ed together and one batch create.
+
+        Args:
+            execute: execute(model, method, args, kwargs=None) of an authenticated Odoo client
+            partners: List of (name, email, create_vals) tuples; create_vals None: do not create
+
+        Returns:
+            List of partner IDs (None if unknown and not created) in the order of partners
+        """
+        self.refresh(execute)
+        partner_ids = [self.find(name, email) if name else None for name, email, _ in partners]
+
+        missing = {}
+        for (name, email, create_vals), partner_id in zip(partners, partner_ids):
+            if partner_id is None and name:
+                missing.setdefault(name.strip().casefold(), (name.strip(), create_vals))
+        with self._lock:
+            self.hits += sum(1 for partner_id in partner_ids if partner_id is not None)
+            self.misses += len(missing)
+
+        if missing:
+            with self._create_lock:
+                self._create_missing_partners(execute, missing)
+
+        return [
+            partner_id if partner_id is not None or not name else self.find(name, email)
+            for (name, email, _), partner_id in zip(partners, partner_ids)
+        ]
+
+    def _create_missing_partners(self, execute, missing):
+        # Unter _create_lock: inzwischen von parallelen Aufrufen angelegte Partner überspringen
+        for key, (name, _) in list(missing.items()):
+            if self.find(name) is not None:
+                del missing[key]
+        if not missing:
+            return
+        with self._lock:
+            self.server_lookups += 1
+        names = [name for name, _ in missing.values()]
+        domain = ['|'] * (len(names) - 1) + [('name', '=ilike', _escape_like(name)) for name in names]
+        found = execute(self.model, 'search_read', [domain],
+                        {'fields': list(self.fields) + ['write_date'], 'order': 'id'})
+        for record in found:
+            self.remember(record)
+            missing.pop((record.get("name") or "").strip().casefold(), None)
+
+        vals_list = [{'name': name, **create_vals} for name, create_vals in missing.values() if create_vals is not None]
+        if vals_list:
+            created_ids = execute(self.model, 'create', [vals_list])
+            if not isinstance(created_ids, list):
+                created_ids = [created_ids]
+            with self._lock:
+                self.creates += len(created_ids)
+            for partner_id, vals in zip(created_ids, vals_list):
+                self.remember({"id": partner_id, "name": vals["name"], "email": vals.get("email") or ""})
+            logging.info(f"Created {len(created_ids)} partners in one batch")
+
+
+partner_index = PartnerIndex()
+
+
+class ProductIndex(OdooRecordIndex):
+    """product.product by default_code (ItemNumber) and normalised name."""
+
+    model = 'product.product'
+    fields = ('id', 'name', 'default_code')
+
+    @staticmethod
+    def _code(value):
+        return str(value).strip().casefold() if value not in (None, False) else ""
+
+    def keys(self, record):
+        return (
+            ("code", self._code(record.get("default_code"))),
+            ("normalized", normalize_name(record.get("name"))),
+        )
+
+    def find(self, item_number, name=None):
+        """Resolves a product locally: by item number if given, otherwise by normalised name."""
+        with self._lock:
+            if self._code(item_number):
+                return self._lookup(("code", self._code(item_number)))
+            return self._lookup(("normalized", normalize_name(name)))
+
+    def resolve_many(self, execute, items, create_missing=True):
+        """
+        Resolves the products of many lines with at most two additional RPCs for all misses:
+        one search_read for item numbers created since the last refresh and one batch create.
+
+        Args:
+            execute: execute(model, method, args, kwargs=None) of an authenticated Odoo client
+            items: List of (item_number, description) tuples
+            create_missing: Create products for unknown item numbers
+
+        Returns:
+            List of product IDs in the order of items; lines without item number and
+            without a product of the same name get odoo_default_product_id
+        """
+        self.refresh(execute)
+        product_ids = [self.find(item_number, name) for item_number, name in items]
+
+        missing = {}
+        for (item_number, name), product_id in zip(items, product_ids):
+            if product_id is None and self._code(item_number):
+                missing.setdefault(self._code(item_number), (str(item_number).strip(), name))
+        with self._lock:
+            self.hits += sum(1 for product_id in product_ids if product_id is not None)
+            self.misses += len(missing)
+
+        if missing:
+            with self._create_lock:
+                self._create_missing_products(execute, missing, create_missing)
+
+        return [
+            product_id if product_id is not None else (self.find(item_number, name) or odoo_default_product_id)
+            for (item_number, name), product_id in zip(items, product_ids)
+        ]
+
+
+    def _create_missing_products(self, execute, missing, create_missing):
+        # Unter _create_lock: inzwischen von parallelen Angeboten angelegte Nummern überspringen
+        for key, (code, _) in list(missing.items()):
+            if self.find(code) is not None:
+                del missing[key]
+        if not missing:
+            return
+        with self._lock:
+            self.server_lookups += 1
+        found = execute(self.model, 'search_read', [[('default_code', 'in', [code for code, _ in missing.values()])]],
+                        {'fields': list(self.fields) + ['write_date'], 'order': 'id'})
+        for record in found:
+            self.remember(record)
+            missing.pop(self._code(record.get("default_code")), None)
+
+        if missing and create_missing:
+            vals_list = [{'name': name or code, 'default_code': code} for code, name in missing.values()]
+            created_ids = execute(self.model, 'create', [vals_list])
+            if not isinstance(created_ids, list):
+                created_ids = [created_ids]
+            with self._lock:
+                self.creates += len(created_ids)
+            for product_id, vals in zip(created_ids, vals_list):
+                self.remember({"id": product_id, **vals})
+            logging.info(f"Created {len(created_ids)} products in one batch")
+
+
+product_index = ProductIndex()
@@ -0,0 +1,215 @@
+import gzip
+import itertools
+import json
+import logging
+import os
+import socket
+import threading
+import xmlrpc.client
+import requests
+from requests.adapters import HTTPAdapter
+from resilience import (
+    DeadlineExceeded, deadline_expired, deadline_timeout, default_retry_policy, get_breaker, get_bulkhead,
+    is_failure_exception, is_retryable_error
+)
+
+# Transport zu Odoo: "xmlrpc" (Standard) oder "jsonrpc"
+odoo_transport_name = os.getenv("ODOO_TRANSPORT", "xmlrpc").strip().lower()
+# Anfragen ab dieser Größe (Bytes) gzip-komprimiert senden; 0 = aus. Der Server bzw. ein
+# vorgeschalteter Proxy muss Content-Encoding: gzip im Request akzeptieren.
+odoo_gzip_threshold = int(os.getenv("ODOO_GZIP_THRESHOLD", "0"))
+odoo_rpc_timeout = float(os.getenv("ODOO_RPC_TIMEOUT", "120"))
+odoo_pool_size = int(os.getenv("ODOO_POOL_SIZE", "10"))
+
+TRANSPORTS = ("xmlrpc", "jsonrpc")
+# execute_kw-Methoden ohne Seiteneffekte, die nach Verbindungsfehlern wiederholt werden dürfen
+READ_METHODS = ("read", "search", "search_read", "search_count", "fields_get", "name_search", "read_group")
+
+
+def is_transport_failure(error):
+    """Connection errors and 5xx count against the Odoo circuit; faults mean Odoo answered."""
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return error.errcode >= 500
+    return is_failure_exception(error)
+
+
+def is_retryable_transport_error(error, idempotent):
+    """Like resilience.is_retryable_error, plus the socket and protocol errors of xmlrpc.client."""
+    if isinstance(error, requests.exceptions.RequestException):
+        return is_retryable_error(error, idempotent)
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return idempotent and error.errcode in (502, 503, 504)
+    if isinstance(error, (ConnectionRefusedError, socket.gaierror)):
+        # Verbindung kam nicht zustande, die Anfrage wurde nicht gesendet
+        return True
+    return idempotent and isinstance(error, OSError)
+
+
+def is_idempotent_call(service, method, args):
+    if service == "common":
+        return True
+    return method == "execute_kw" and len(args) > 4 and args[4] in READ_METHODS
+
+
+def call_odoo(function, service, method, *args):
+    """Runs one transport call through the Odoo bulkhead, circuit breaker and the retry policy."""
+    return default_retry_policy.call(
+        get_bulkhead("odoo").call, get_breaker("odoo").call, function, service, method, *args,
+        is_failure=is_transport_failure,
+        idempotent=is_idempotent_call(service, method, args),
+        retryable_error=is_retryable_transport_error,
+        description=f"odoo {service}.{args[4] if len(args) > 4 else method}"
+    )
+
+
+class _KeepAliveMixin:
+    """Keeps the HTTP/1.1 connection of a ServerProxy open and applies a socket timeout."""
+
+    def __init__(self, timeout=None, gzip_threshold=0, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        # xmlrpc.client komprimiert Anfragen ab encode_threshold Bytes, None = nie
+        self.encode_threshold = gzip_threshold or None
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+    def set_timeout(self, timeout):
+        """Applies a new socket timeout, also to the open keep-alive connection."""
+        self.timeout = timeout
+        connection = self._connection[1]
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+
+
+class KeepAliveTransport(_KeepAliveMixin, xmlrpc.client.Transport):
+    pass
+
+
+class KeepAliveSafeTransport(_KeepAliveMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class XmlRpcTransport:
+    """
+    XML-RPC to /xmlrpc/2/<service> with one persistent connection per thread and
+    service (ServerProxy is not thread-safe) and gzip for large request bodies.
+    """
+
+    name = "xmlrpc"
+
+    def __init__(self, url, timeout=None, gzip_threshold=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout if timeout is not None else odoo_rpc_timeout
+        self.gzip_threshold = gzip_threshold if gzip_threshold is not None else odoo_gzip_threshold
+        self._local = threading.local()
+
+    def _proxy(self, service):
+        proxies = getattr(self._local, "proxies", None)
+        if proxies is None:
+            proxies = self._local.proxies = {}
+        proxy = proxies.get(service)
+        if proxy is None:
+            transport_class = KeepAliveSafeTransport if self.url.startswith("https://") else KeepAliveTransport
+            proxy = proxies[service] = xmlrpc.client.ServerProxy(
+                f"{self.url}/xmlrpc/2/{service}",
+                transport=transport_class(timeout=self.timeout, gzip_threshold=self.gzip_threshold),
+                allow_none=True  # Enable None values in XML-RPC calls
+            )
+        return proxy
+
+    def call(self, service, method, *args):
+        return call_odoo(self._call, service, method, *args)
+
+    def _call(self, service, method, *args):
+        # Socket-Timeout auf die verbleibende Zeit der Deadline begrenzen
+        timeout = deadline_timeout(self.timeout, f"odoo {service}.{method}")
+        proxy = self._proxy(service)
+        proxy("transport").set_timeout(timeout[1] if isinstance(timeout, tuple) else timeout)
+        try:
+            return getattr(proxy, method)(*args)
+        except (OSError, xmlrpc.client.ProtocolError) as e:
+            # Verbindung verwerfen, der nächste Aufruf baut sie neu auf
+            self._local.proxies.pop(service, None)
+            if isinstance(e, TimeoutError) and deadline_expired():
+                raise DeadlineExceeded(f"odoo {service}.{method} completed") from e
+            raise
+
+
+class JsonRpcTransport:
+    """
+    JSON-RPC to /jsonrpc over a pooled requests.Session (keep-alive, gzip responses).
+    Server errors are raised as xmlrpc.client.Fault, as with the XML-RPC transport.
+    """
+
+    name = "jsonrpc"
+
+    def __init__(self, url, timeout=None, gzip_threshold=None, pool_size=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout if timeout is not None else odoo_rpc_timeout
+        self.gzip_threshold = gzip_threshold if gzip_threshold is not None else odoo_gzip_threshold
+        self.session = requests.Session()
+        pool_size = pool_size or odoo_pool_size
+        self.session.mount(self.url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self._ids = itertools.count(1)
+
+    def call(self, service, method, *args):
+        return call_odoo(self._call, service, method, *args)
+
+    def _call(self, service, method, *args):
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "call",
+            "id": next(self._ids),
+            "params": {"service": service, "method": method, "args": list(args)}
+        }
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.gzip_threshold and len(body) >= self.gzip_threshold:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        timeout = deadline_timeout(self.timeout, f"odoo {service}.{method}")
+        try:
+            response = self.session.post(f"{self.url}/jsonrpc", data=body, headers=headers, timeout=timeout)
+        except requests.exceptions.Timeout as e:
+            if deadline_expired():
+                raise DeadlineExceeded(f"odoo {service}.{method} completed") from e
+            raise
+        response.raise_for_status()
+        result = response.json()
+        if result.get("error"):
+            error = result["error"]
+            data = error.get("data") or {}
+            raise xmlrpc.client.Fault(error.get("code", 0), data.get("message") or error.get("message", "Odoo error"))
+        return result.get("result")
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(url, name=None):
+    """
+    Returns the shared transport for an Odoo URL, so connections are reused across
+    executors and function invocations.
+
+    Args:
+        url: Odoo base URL
+        name: "xmlrpc" or "jsonrpc" (default: ODOO_TRANSPORT)
+    """
+    name = (name or odoo_transport_name).strip().lower()
+    if name not in TRANSPORTS:
+        logging.warning(f"Unknown ODOO_TRANSPORT '{name}', using xmlrpc")
+        name = "xmlrpc"
+    key = (name, url.rstrip("/"))
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport_class = JsonRpcTransport if name == "jsonrpc" else XmlRpcTransport
+            transport = _transports[key] = transport_class(url)
+        return transport
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    from azure.core.exceptions import ResourceExistsError
+    from azure.storage.blob import BlobServiceClient, ContentSettings
+except ImportError:  # azure-storage-blob wird nur im Blob-Modus benötigt
+    BlobServiceClient = None
+
+# "inline" speichert das JSON wie bisher in der Listenspalte, "blob" nur einen Verweis
+portal_data_storage = os.getenv("PORTAL_DATA_STORAGE", "inline").lower()
+portal_data_connection_string = os.getenv("PORTAL_DATA_BLOB_CONNECTION_STRING", os.getenv("AzureWebJobsStorage", ""))
+portal_data_container = os.getenv("PORTAL_DATA_BLOB_CONTAINER", "portaldata")
+
+POINTER_PREFIX = "blob:sha256:"
+
+
+class PortalBlobStore:
+    """
+    Content-addressed store for portal JSON payloads.
+
+    Payloads are gzip-compressed and stored once per SHA-256 hash, the list field
+    only holds the pointer "blob:sha256:<hex>". As the content of a pointer never
+    changes, downloaded payloads are kept in a small LRU cache.
+    """
+
+    def __init__(self, connection_string, container, cache_size=32, known_hashes_size=4096):
+        self.connection_string = connection_string
+        self.container = container
+        self.cache_size = cache_size
+        self.known_hashes_size = known_hashes_size
+        self._container_client = None
+        # Zuletzt gesehene Hashes; ein vergessener Hash kostet nur einen Upload-Versuch
+        self._known_hashes = OrderedDict()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.deduplicated = 0
+        self.downloads = 0
+        self.cache_hits = 0
+        self.bytes_raw = 0
+        self.bytes_stored = 0
+
+    def _container(self):
+        if self._container_client is None:
+            if BlobServiceClient is None:
+                raise RuntimeError("azure-storage-blob is not installed")
+            if not self.connection_string:
+                raise RuntimeError("No blob storage connection string configured")
+            service = BlobServiceClient.from_connection_string(self.connection_string)
+            container_client = service.get_container_client(self.container)
+            try:
+                container_client.create_container()
+            except ResourceExistsError:
+                pass
+            self._container_client = container_client
+        return self._container_client
+
+    def put(self, payload):
+        """
+        Stores a JSON string and returns its pointer.
+
+        Raises:
+            RuntimeError or azure.core.exceptions.AzureError if the blob cannot be written
+        """
+        raw = payload.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        pointer = f"{POINTER_PREFIX}{digest}"
+        with self._lock:
+            if digest in self._known_hashes:
+                self._known_hashes.move_to_end(digest)
+                self.deduplicated += 1
+                return pointer
+
+        compressed = gzip.compress(raw)
+        blob = self._container().get_blob_client(f"{digest}.json.gz")
+        try:
+            blob.upload_blob(
+                compressed,
+                overwrite=False,
+                content_settings=ContentSettings(content_type="application/gzip")
+            )
+            with self._lock:
+                self.uploads += 1
+                self.bytes_raw += len(raw)
+                self.bytes_stored += len(compressed)
+        except ResourceExistsError:
+            # Gleicher Inhalt wurde schon gespeichert
+            with self._lock:
+                self.deduplicated += 1
+        self._remember(digest, payload)
+        return pointer
+
+    def get(self, pointer):
+        """
+        Loads the JSON string of a pointer.
+
+        Raises:
+            ValueError if the content does not match the hash of the pointer
+        """
+        digest = pointer[len(POINTER_PREFIX):]
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                self.cache_hits += 1
+                return cached
+
+        compressed = self._container().get_blob_client(f"{digest}.json.gz").download_blob().readall()
+        raw = gzip.decompress(compressed)
+        if hashlib.sha256(raw).hexdigest() != digest:
+            raise ValueError(f"Content of portal data blob {digest} does not match its hash")
+        payload = raw.decode("utf-8")
+        with self._lock:
+            self.downloads += 1
+        self._remember(digest, payload)
+        return payload
+
+    def _remember(self, digest, payload):
+        with self._lock:
+            self._known_hashes[digest] = True
+            self._known_hashes.move_to_end(digest)
+            while len(self._known_hashes) > self.known_hashes_size:
+                self._known_hashes.popitem(last=False)
+            self._cache[digest] = payload
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        """Returns upload, deduplication and compression counters."""
+        with self._lock:
+            return {
+                "mode": portal_data_storage,
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "downloads": self.downloads,
+                "cacheHits": self.cache_hits,
+                "bytesRaw": self.bytes_raw,
+                "bytesStored": self.bytes_stored
+            }
+
+
+portal_blob_store = PortalBlobStore(portal_data_connection_string, portal_data_container)
+
+
+def canonical_portal_json(data):
+    """
+    Serialises portal data with sorted keys, so identical documents give the same
+    payload (and blob hash) regardless of the key order they arrived in.
+    """
+    return json.dumps(data, sort_keys=True)
+
+
+def store_portal_json(payload):
+    """
+    Returns the value to write into a PortalDataJson field: the JSON itself
+    (inline mode) or a blob pointer (blob mode). Falls back to inline if the
+    blob cannot be written, so no portal data is lost.
+    """
+    if portal_data_storage != "blob":
+        return payload
+    try:
+        return portal_blob_store.put(payload)
+    except Exception as e:
+        logging.error(f"Error storing portal data in blob storage, storing inline: {e}")
+        return payload
+
+
+def load_portal_json(field_value):
+    """
+    Resolves the value of a PortalDataJson field to the JSON string.
+    Inline values are returned unchanged, pointers are loaded from blob storage.
+    """
+    if isinstance(field_value, str) and field_value.startswith(POINTER_PREFIX):
+        return portal_blob_store.get(field_value)
+    return field_value
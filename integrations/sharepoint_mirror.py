@@ -0,0 +1,324 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import requests
+from integrations.graph_throttle import graph_request
+
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Felder der Liste 'Anfragen', über die Belege gesucht werden
+ANFRAGEN_KEY_FIELDS = ("ERPNr", "ERPOrderNummer", "RFQID", "POID", "QuoteID")
+
+
+class MirrorUnavailable(Exception):
+    """Raised when the mirror cannot answer lookups (never synchronised or disabled)."""
+
+
+class SharePointListMirror:
+    """
+    Local mirror of a SharePoint list for lookups by key fields.
+
+    Items are kept in memory with one dictionary index per key field and persisted
+    in SQLite, so a warm or restarted instance only needs the Graph delta since the
+    stored delta link. Writes done by this app are applied write-through.
+    """
+
+    def __init__(self, list_name, key_fields, context_provider, select_fields=None, path=None, max_age=None,
+                 min_resync=None):
+        """
+        Args:
+            list_name: Name of the SharePoint list (e.g. Anfragen)
+            key_fields: Field names that get an index
+            context_provider: Callable returning (access_token, site_id, list_id) or None
+            select_fields: Fields kept in the mirror ($select of the delta query); None keeps all
+            path: SQLite file; defaults to SHAREPOINT_MIRROR_DIR or the temp directory
+            max_age: Seconds after which a lookup triggers a delta sync
+            min_resync: Minimum seconds between syncs triggered by lookup misses
+        """
+        self.list_name = list_name
+        self.key_fields = tuple(key_fields)
+        self.select_fields = tuple(dict.fromkeys(self.key_fields + tuple(select_fields))) if select_fields else None
+        self._context_provider = context_provider
+        directory = os.getenv("SHAREPOINT_MIRROR_DIR", tempfile.gettempdir())
+        self.path = path or os.path.join(directory, f"sharepoint_mirror_{list_name}.sqlite")
+        self.max_age = max_age if max_age is not None else float(os.getenv("SHAREPOINT_MIRROR_MAX_AGE", "30"))
+        self.min_resync = min_resync if min_resync is not None else float(os.getenv("SHAREPOINT_MIRROR_MIN_RESYNC", "2"))
+
+        self._lock = threading.RLock()
+        # Nur ein Abgleich gleichzeitig; die Graph-Abfragen laufen ohne _lock
+        self._sync_lock = threading.Lock()
+        self._db = None
+        self._items = {}  # item id -> fields
+        self._indexes = {field: {} for field in self.key_fields}  # field -> value -> set of item ids
+        self._delta_link = None
+        self._loaded = False
+        self._last_sync = None
+        self.syncs = 0
+        self.hits = 0
+        self.misses = 0
+        self.sync_errors = 0
+
+    # Persistenz
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        columns = ", ".join(f'"{field}" TEXT' for field in self.key_fields)
+        db.execute(f"CREATE TABLE IF NOT EXISTS items (id TEXT PRIMARY KEY, {columns}, fields TEXT NOT NULL)")
+        for field in self.key_fields:
+            db.execute(f'CREATE INDEX IF NOT EXISTS "idx_items_{field}" ON items ("{field}")')
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        db.commit()
+        self._db = db
+        return db
+
+    def _load(self):
+        """Loads the persisted mirror into memory (once per process)."""
+        if self._loaded:
+            return
+        db = self._connect()
+        for item_id, fields_json in db.execute("SELECT id, fields FROM items"):
+            self._index(item_id, json.loads(fields_json))
+        row = db.execute("SELECT value FROM meta WHERE key = 'delta_link'").fetchone()
+        self._delta_link = row[0] if row else None
+        self._loaded = True
+        selection = db.execute("SELECT value FROM meta WHERE key = 'select_fields'").fetchone()
+        if (selection[0] if selection else None) != self._selection_key():
+            # Andere Feldauswahl als beim Speichern: Spiegel neu aufbauen
+            self._reset()
+            with db:
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('select_fields', ?)",
+                           (self._selection_key(),))
+        logging.info(f"Loaded {len(self._items)} '{self.list_name}' items from mirror {self.path}")
+
+    def _selection_key(self):
+        return ",".join(self.select_fields) if self.select_fields else "*"
+
+    def _delta_url(self, site_id, list_id):
+        expand = f"fields($select={','.join(self.select_fields)})" if self.select_fields else "fields"
+        return f"{GRAPH_BASE_URL}/sites/{site_id}/lists/{list_id}/items/delta?$expand={expand}"
+
+    def _persist(self, changed, deleted, delta_link=None):
+        db = self._connect()
+        placeholders = ", ".join("?" for _ in self.key_fields)
+        columns = ", ".join(f'"{field}"' for field in self.key_fields)
+        with db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO items (id, {columns}, fields) VALUES (?, {placeholders}, ?)",
+                [
+                    (item_id, *(self._key(fields.get(field)) for field in self.key_fields), json.dumps(fields))
+                    for item_id, fields in changed
+                ]
+            )
+            db.executemany("DELETE FROM items WHERE id = ?", [(item_id,) for item_id in deleted])
+            if delta_link is not None:
+                db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('delta_link', ?)", (delta_link,))
+
+    # Indizes im Speicher
+
+    @staticmethod
+    def _key(value):
+        return None if value is None or value == "" else str(value)
+
+    def _unindex(self, item_id):
+        fields = self._items.pop(item_id, None)
+        if fields is None:
+            return
+        for field in self.key_fields:
+            key = self._key(fields.get(field))
+            ids = self._indexes[field].get(key)
+            if ids:
+                ids.discard(item_id)
+                if not ids:
+                    del self._indexes[field][key]
+
+    def _index(self, item_id, fields):
+        self._unindex(item_id)
+        self._items[item_id] = fields
+        for field in self.key_fields:
+            key = self._key(fields.get(field))
+            if key is not None:
+                self._indexes[field].setdefault(key, set()).add(item_id)
+
+    # Synchronisation
+
+    def sync(self):
+        """
+        Applies the Graph delta since the last sync (full load on the first run).
+
+        The delta pages are fetched without holding the mirror lock, so lookups keep
+        being answered from the current state; the lock is only taken to apply them.
+
+        Returns:
+            Number of changed or deleted items
+        """
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self):
+        with self._lock:
+            self._load()
+            start_link = self._delta_link
+        context = self._context_provider()
+        if not context:
+            raise MirrorUnavailable(f"No Graph context for list '{self.list_name}'")
+        access_token, site_id, list_id = context
+        headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+
+        url = start_link or self._delta_url(site_id, list_id)
+        delta_link = None
+        changed, deleted = {}, set()
+        full_reload = False
+        while url:
+            response = graph_request("GET", url, headers=headers)
+            if response.status_code == 410 and start_link and not full_reload:
+                # Delta-Token abgelaufen: komplett neu laden
+                logging.warning(f"Delta link for '{self.list_name}' expired, resynchronising")
+                full_reload = True
+                url = self._delta_url(site_id, list_id)
+                changed, deleted = {}, set()
+                continue
+            response.raise_for_status()
+            page = response.json()
+            for item in page.get("value", []):
+                item_id = str(item.get("id"))
+                if "deleted" in item:
+                    changed.pop(item_id, None)
+                    deleted.add(item_id)
+                else:
+                    deleted.discard(item_id)
+                    changed[item_id] = item.get("fields", {})
+            url = page.get("@odata.nextLink")
+            delta_link = page.get("@odata.deltaLink")
+
+        with self._lock:
+            if full_reload:
+                self._reset()
+            for item_id in deleted:
+                self._unindex(item_id)
+            for item_id, fields in changed.items():
+                self._index(item_id, fields)
+            self._persist(changed.items(), deleted, delta_link)
+            self._delta_link = delta_link
+            self._last_sync = time.monotonic()
+            self.syncs += 1
+        if changed or deleted:
+            logging.info(f"Mirror '{self.list_name}': {len(changed)} changed, {len(deleted)} deleted items")
+        return len(changed) + len(deleted)
+
+    def _reset(self):
+        self._items.clear()
+        for index in self._indexes.values():
+            index.clear()
+        self._delta_link = None
+        with self._connect() as db:
+            db.execute("DELETE FROM items")
+            db.execute("DELETE FROM meta WHERE key = 'delta_link'")
+
+    def _is_older(self, seconds):
+        return self._last_sync is None or time.monotonic() - self._last_sync >= seconds
+
+    def _sync_if_older(self, seconds):
+        """
+        Syncs if the last sync is older than seconds. While another thread syncs, the
+        current state is used instead of waiting; only the first sync is waited for.
+
+        Returns:
+            True if the mirror was synchronised (by this or another thread) just now
+        """
+        if not self._is_older(seconds):
+            return False
+        if not self._sync_lock.acquire(blocking=self._last_sync is None):
+            return False
+        try:
+            if not self._is_older(seconds):
+                # Inzwischen von einem anderen Aufruf abgeglichen
+                return True
+            self._sync()
+            return True
+        except (requests.exceptions.RequestException, ValueError, sqlite3.Error, MirrorUnavailable) as e:
+            with self._lock:
+                self.sync_errors += 1
+            logging.error(f"Error synchronising mirror of '{self.list_name}': {e}")
+            if self._last_sync is None:
+                raise MirrorUnavailable(str(e)) from e
+            return False
+        finally:
+            self._sync_lock.release()
+
+    # Abfragen und Schreibzugriffe
+
+    def find(self, field, value):
+        """
+        Looks up the first item whose key field equals value.
+
+        Returns:
+            Dictionary with "id" and "fields" or None if no item matches
+
+        Raises:
+            MirrorUnavailable if the mirror could never be synchronised
+        """
+        if field not in self._indexes:
+            raise ValueError(f"Field '{field}' is not indexed in mirror of '{self.list_name}'")
+        key = self._key(value)
+        # Abgleich außerhalb von _lock, Treffer warten nicht auf laufende Graph-Abfragen
+        self._sync_if_older(self.max_age)
+        item = self._lookup(field, key)
+        if item is None and self._sync_if_older(self.min_resync):
+            # Eintrag evtl. gerade von einer anderen Instanz angelegt
+            item = self._lookup(field, key)
+        with self._lock:
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return item
+
+    def _lookup(self, field, key):
+        with self._lock:
+            ids = self._indexes[field].get(key)
+            if not ids:
+                return None
+            # Wie die Graph-Abfrage: das älteste passende Element
+            item_id = min(ids, key=lambda candidate: (len(candidate), candidate))
+            return {"id": item_id, "fields": dict(self._items[item_id])}
+
+    def apply_update(self, item_id, fields):
+        """
+        Write-through for items created or patched by this app.
+
+        Args:
+            item_id: SharePoint item ID
+            fields: Field values written to SharePoint (merged into the mirrored item)
+        """
+        item_id = str(item_id)
+        with self._lock:
+            try:
+                self._load()
+                merged = dict(self._items.get(item_id, {}))
+                if self.select_fields:
+                    fields = {name: value for name, value in fields.items() if name in self.select_fields}
+                merged.update(fields)
+                self._index(item_id, merged)
+                self._persist([(item_id, merged)], ())
+            except sqlite3.Error as e:
+                logging.error(f"Error writing item {item_id} to mirror of '{self.list_name}': {e}")
+
+    def stats(self):
+        """Returns size, sync and hit counters of the mirror."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "syncs": self.syncs,
+                "syncErrors": self.sync_errors,
+                "secondsSinceSync": None if self._last_sync is None else round(time.monotonic() - self._last_sync, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
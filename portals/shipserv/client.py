@@ -6,7 +6,7 @@ import json
 import base64
 from typing import Dict, List, Optional, Any, Tuple, Union
 from portals.base_portal import BasePortal
-import time
+from resilience import http_request
 
 class ShipServPortal(BasePortal):
     """
@@ -54,7 +54,7 @@ class ShipServPortal(BasePortal):
         headers = {"Content-Type": "application/json"}
         
         try:
-            response = requests.post(token_url, json=payload, headers=headers)
+            response = http_request("shipserv", "POST", token_url, json=payload, headers=headers, idempotent=True)
             response.raise_for_status()
             token_data = response.json()
             self._token = token_data.get("access_token")
@@ -97,7 +97,7 @@ class ShipServPortal(BasePortal):
         }
         
         try:
-            response = requests.get(api_url, headers=headers)
+            response = http_request("shipserv", "GET", api_url, headers=headers)
             response.raise_for_status()
             documents = response.json()
             return documents.get('content', [])
@@ -127,7 +127,7 @@ class ShipServPortal(BasePortal):
         }
         
         try:
-            response = requests.get(api_url, headers=headers)
+            response = http_request("shipserv", "GET", api_url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -173,7 +173,7 @@ class ShipServPortal(BasePortal):
         }
         
         try:
-            response = requests.post(url, headers=headers)
+            response = http_request("shipserv", "POST", url, headers=headers, idempotent=True)  # erneutes Markieren ist harmlos
             response.raise_for_status()
             return {"status": "success", "response": response.json()}
         except requests.exceptions.RequestException as e:
@@ -243,7 +243,7 @@ class ShipServPortal(BasePortal):
                     logging.info(f"Downloading attachment: {result['name']} | Correlation ID: {correlation_id}")
                     
                     # Use stream=True for better memory management with large files
-                    response = requests.get(api_url, headers=headers, stream=True, timeout=60)
+                    response = http_request("shipserv", "GET", api_url, headers=headers, stream=True, timeout=60)
                     response.raise_for_status()
                     
                     # Read content and encode as Base64 for safe transport
@@ -318,21 +318,11 @@ class ShipServPortal(BasePortal):
         correlation_id = f"upload-{os.path.basename(file_path_or_name)}-{tnid}"
         logging.info(f"Starting attachment upload | File: {file_path_or_name} | TNID: {tnid} | Correlation ID: {correlation_id}")
         
-        # Get authentication token with retry logic
-        retry_count = 0
-        max_retries = 3
-        token = None
-        
-        while retry_count < max_retries and not token:
-            token = self._token or self._get_token()
-            if not token:
-                retry_count += 1
-                if retry_count < max_retries:
-                    logging.warning(f"Token acquisition failed, retrying ({retry_count}/{max_retries}) | Correlation ID: {correlation_id}")
-                    time.sleep(1)  # Wait before retry
+        # Get authentication token (transient failures are retried by the retry policy in http_request)
+        token = self._token or self._get_token()
         
         if not token:
-            logging.error(f"Failed to authenticate with ShipServ API after {max_retries} attempts | Correlation ID: {correlation_id}")
+            logging.error(f"Failed to authenticate with ShipServ API | Correlation ID: {correlation_id}")
             return {"status": "error", "message": "Authentication failed", "correlation_id": correlation_id}
         
         # Prepare request URL and headers
@@ -368,7 +358,7 @@ class ShipServPortal(BasePortal):
             
             # Set up timeout and send request
             logging.info(f"Uploading file to {api_url} | Size: {len(file_content)} bytes | Correlation ID: {correlation_id}")
-            response = requests.post(api_url, headers=headers, files=files, timeout=120)  # Longer timeout for large files
+            response = http_request("shipserv", "POST", api_url, headers=headers, files=files, timeout=120)  # Longer timeout for large files
             
             # Log response code immediately
             logging.info(f"Upload response status: {response.status_code} | Correlation ID: {correlation_id}")
@@ -0,0 +1,746 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# Upstreams mit eigenem Circuit Breaker
+UPSTREAMS = ("shipserv", "collmex", "graph", "odoo", "pds")
+
+# Aufeinanderfolgende Fehler, nach denen der Breaker öffnet
+circuit_failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Sekunden, die der Breaker offen bleibt, bevor Probeaufrufe erlaubt sind
+circuit_reset_seconds = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Gleichzeitige Probeaufrufe im Zustand half-open
+circuit_half_open_probes = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+# Timeout für Aufrufe ohne eigenen Timeout, damit nichts unbegrenzt hängt
+upstream_default_timeout = float(os.getenv("UPSTREAM_DEFAULT_TIMEOUT", "60"))
+
+# Zeitbudget je Funktionsaufruf (unter dem Ausführungslimit von 230 s der HTTP-Trigger)
+function_deadline_seconds = float(os.getenv("FUNCTION_DEADLINE_SECONDS", "230"))
+# Obergrenze für den Verbindungsaufbau, der Rest des Budgets bleibt für die Antwort
+deadline_connect_timeout = float(os.getenv("DEADLINE_CONNECT_TIMEOUT", "10"))
+
+# Gleichzeitige Aufrufe je Upstream; BULKHEAD_<UPSTREAM>_LIMIT (z. B. BULKHEAD_ODOO_LIMIT) überschreibt
+BULKHEAD_LIMITS = {"shipserv": 8, "collmex": 4, "graph": 8, "odoo": 8, "pds": 4}
+bulkhead_default_limit = int(os.getenv("BULKHEAD_DEFAULT_LIMIT", "8"))
+# Sekunden, die ein Aufruf auf einen freien Platz wartet, bevor er abgewiesen wird
+bulkhead_queue_timeout = float(os.getenv("BULKHEAD_QUEUE_TIMEOUT", "10"))
+# Limit an die Latenz anpassen, zwischen BULKHEAD_MIN_LIMIT und dem konfigurierten Limit
+bulkhead_adaptive = os.getenv("BULKHEAD_ADAPTIVE", "false").lower() in ("1", "true", "yes")
+bulkhead_min_limit = int(os.getenv("BULKHEAD_MIN_LIMIT", "2"))
+# Geglättete Latenz über diesem Vielfachen der Grundlatenz gilt als Überlast
+bulkhead_latency_tolerance = float(os.getenv("BULKHEAD_LATENCY_TOLERANCE", "2"))
+
+# Versuche je Aufruf (1 = keine Wiederholung) und Grenzen der Wartezeit (full jitter)
+retry_max_attempts = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+retry_base_delay = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+retry_max_delay = float(os.getenv("RETRY_MAX_DELAY", "10"))
+# Retry-Budget: Wiederholungen je Zeitfenster höchstens RATIO * Aufrufe + MIN_PER_SECOND * Fenster
+retry_budget_ratio = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+retry_budget_min_per_second = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "0.5"))
+retry_budget_window = float(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+
+# Antworten, nach denen ein erneuter Versuch sinnvoll ist
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+# Bei diesen Codes hat der Server die Anfrage nicht verarbeitet, daher auch für POST
+REJECTED_STATUS_CODES = (425, 429)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, upstream, retry_in):
+        self.upstream = upstream
+        self.retry_in = retry_in
+        super().__init__(f"Circuit for {upstream} is open, next probe in {retry_in:.1f}s")
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised instead of starting an outbound call after the request deadline has passed."""
+
+    def __init__(self, what="call"):
+        super().__init__(f"Deadline exceeded before {what}")
+
+
+class BulkheadFullError(requests.exceptions.RequestException):
+    """Raised when no concurrency slot of an upstream became free within the queue timeout."""
+
+    def __init__(self, upstream, limit, waited):
+        self.upstream = upstream
+        self.limit = limit
+        self.waited = waited
+        super().__init__(f"Bulkhead for {upstream} is full ({limit} concurrent calls), waited {waited:.1f}s")
+
+
+# Schnelle Abbrüche ohne Kontakt zum Upstream; Integrationen geben sie an den Dispatcher weiter,
+# statt sie wie Transportfehler zu protokollieren und None zurückzugeben
+FAST_FAIL_ERRORS = (CircuitOpenError, BulkheadFullError, DeadlineExceeded)
+
+
+class Deadline:
+    """Point in time (monotonic clock) by which the current function invocation must finish."""
+
+    def __init__(self, seconds, clock=time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return self.expires_at - self._clock()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+def set_deadline(seconds=None):
+    """
+    Starts the deadline of the current request (FUNCTION_DEADLINE_SECONDS by default); an
+    enclosing, earlier deadline is kept.
+
+    Returns:
+        Token for reset_deadline
+    """
+    deadline = Deadline(function_deadline_seconds if seconds is None else seconds)
+    current = _deadline.get()
+    if current is not None and current.expires_at < deadline.expires_at:
+        deadline = current
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining_time():
+    """Seconds left of the current deadline, None without deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def deadline_expired():
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def check_deadline(what="call"):
+    """Raises DeadlineExceeded if the current deadline has passed."""
+    if deadline_expired():
+        raise DeadlineExceeded(what)
+
+
+def deadline_timeout(timeout=None, what="call"):
+    """
+    Clips a requests timeout (seconds or (connect, read)) to the remaining deadline.
+
+    Returns:
+        (connect, read) timeout, or the timeout unchanged without deadline
+
+    Raises:
+        DeadlineExceeded if nothing is left
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded(what)
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    read = remaining if read is None else min(read, remaining)
+    connect = min(connect or deadline_connect_timeout, deadline_connect_timeout, read)
+    return connect, read
+
+
+def in_current_context(function):
+    """Binds function to a copy of the caller's context, so the deadline reaches worker threads."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def is_failure_status(status_code):
+    """Server errors count against the circuit; 4xx means the upstream is up and answering."""
+    return status_code >= 500
+
+
+def is_failure_exception(error):
+    """Transport errors count against the circuit, application errors (e.g. XML-RPC faults) do not."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded, BulkheadFullError)):
+        return False
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or is_failure_status(error.response.status_code)
+    return isinstance(error, (requests.exceptions.RequestException, OSError))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream.
+
+    closed: calls pass; failure_threshold consecutive failures open the circuit.
+    open: calls fail fast with CircuitOpenError for reset_seconds.
+    half_open: up to half_open_probes calls pass as probes; a successful probe closes
+    the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None, half_open_probes=None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold or circuit_failure_threshold
+        self.reset_seconds = reset_seconds if reset_seconds is not None else circuit_reset_seconds
+        self.half_open_probes = half_open_probes or circuit_half_open_probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejections = 0
+        self.opened = 0
+
+    def _current_state(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def is_available(self):
+        """True if a call would currently be let through (without reserving a probe)."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_probes)
+
+    def before_call(self):
+        """Admits a call or raises CircuitOpenError; in half_open the call is a probe."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_probes):
+                if state == HALF_OPEN:
+                    self._probes += 1
+                self.calls += 1
+                return
+            self.rejections += 1
+            retry_in = max(0.0, self._opened_at + self.reset_seconds - self._clock())
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logging.info(f"Circuit {self.name} closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                    logging.warning(f"Circuit {self.name} opened after {self._failures} consecutive failures")
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probes = 0
+
+    def release(self):
+        """Ends an admitted call whose outcome says nothing about the upstream (frees a probe slot)."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def call(self, function, *args, is_failure=is_failure_exception, **kwargs):
+        """Calls function through the breaker; exceptions are recorded per is_failure and re-raised."""
+        self.before_call()
+        try:
+            result = function(*args, **kwargs)
+        except DeadlineExceeded:
+            # Nicht gesendet, sagt nichts über den Upstream
+            self.release()
+            raise
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutiveFailures": self._failures,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejections": self.rejections,
+                "opened": self.opened
+            }
+
+
+_breakers = {name: CircuitBreaker(name) for name in UPSTREAMS}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream):
+    """Returns the circuit breaker of an upstream (created on first use for unknown names)."""
+    with _breakers_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = _breakers[upstream] = CircuitBreaker(upstream)
+        return breaker
+
+
+def is_available(upstream):
+    return get_breaker(upstream).is_available()
+
+
+def retry_stats():
+    return retry_budget.stats()
+
+
+def breaker_stats():
+    """State and counters of all circuit breakers."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+def bulkhead_limit(upstream):
+    """Configured concurrency limit of an upstream (BULKHEAD_<UPSTREAM>_LIMIT or BULKHEAD_LIMITS)."""
+    value = os.getenv(f"BULKHEAD_{upstream.upper()}_LIMIT")
+    if value:
+        return int(value)
+    return BULKHEAD_LIMITS.get(upstream, bulkhead_default_limit)
+
+
+class Bulkhead:
+    """
+    Limits the concurrent calls to one upstream, so a slow upstream cannot occupy all
+    worker threads of the function host and starve the calls to the others.
+
+    Callers wait up to queue_timeout (never past the request deadline) for a free slot
+    and are rejected with BulkheadFullError after that. With adaptive=True the limit
+    follows the observed latency between min_limit and the configured limit (AIMD):
+    while the smoothed latency exceeds latency_tolerance times the baseline (lowest
+    recent) latency, the limit is cut by a quarter at most once per latency interval;
+    a round of `limit` fast calls raises it by one.
+    """
+
+    def __init__(self, upstream, limit=None, queue_timeout=None, adaptive=None, min_limit=None,
+                 latency_tolerance=None):
+        self.upstream = upstream
+        self.max_limit = max(1, limit or bulkhead_limit(upstream))
+        self.limit = self.max_limit
+        self.queue_timeout = queue_timeout if queue_timeout is not None else bulkhead_queue_timeout
+        self.adaptive = bulkhead_adaptive if adaptive is None else adaptive
+        self.min_limit = max(1, min(min_limit or bulkhead_min_limit, self.max_limit))
+        self.latency_tolerance = latency_tolerance or bulkhead_latency_tolerance
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._latency = None
+        self._baseline = None
+        self._fast_calls = 0
+        self._last_decrease = 0.0
+        self.calls = 0
+        self.queued = 0
+        self.rejections = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self, timeout=None):
+        """
+        Takes a slot, waiting for one if all are in use.
+
+        Raises:
+            BulkheadFullError if no slot became free within the queue timeout,
+            DeadlineExceeded if the request deadline ended first
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        remaining = remaining_time()
+        deadline_bound = remaining is not None and remaining < timeout
+        if deadline_bound:
+            timeout = max(0.0, remaining)
+        with self._condition:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                self.calls += 1
+                return
+            start = time.monotonic()
+            self._waiting += 1
+            self.queued += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self._in_flight < self.limit, timeout)
+            finally:
+                self._waiting -= 1
+            waited = time.monotonic() - start
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if admitted:
+                self._in_flight += 1
+                self.calls += 1
+                return
+            if not deadline_bound:
+                self.rejections += 1
+            limit = self.limit
+        if deadline_bound:
+            raise DeadlineExceeded(f"{self.upstream} call (all {limit} slots busy)")
+        logging.warning(f"Bulkhead for {self.upstream} full ({limit} concurrent calls), rejected after {waited:.1f}s")
+        raise BulkheadFullError(self.upstream, limit, waited)
+
+    def release(self, latency=None):
+        """Frees a slot; latency (seconds) of a completed call feeds the latency metrics and the adaptive limit."""
+        with self._condition:
+            self._in_flight -= 1
+            previous = self.limit
+            if latency is not None:
+                self._observe(latency)
+                if self.adaptive:
+                    self._adapt()
+            self._condition.notify(max(1, self.limit - self._in_flight))
+            limit = self.limit
+        if limit != previous:
+            logging.info(f"Bulkhead for {self.upstream}: limit {previous} -> {limit} "
+                         f"(latency {self._latency * 1000:.0f} ms, baseline {self._baseline * 1000:.0f} ms)")
+
+    def _observe(self, latency):
+        # Geglättete Latenz und Grundlatenz; die Grundlatenz folgt dauerhaft höheren Werten langsam
+        self._latency = latency if self._latency is None else self._latency + 0.2 * (latency - self._latency)
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            self._baseline += 0.01 * (latency - self._baseline)
+
+    def _adapt(self):
+        if self._latency > self.latency_tolerance * self._baseline:
+            self._fast_calls = 0
+            now = time.monotonic()
+            # Höchstens eine Senkung je Latenzintervall, sonst fällt das Limit bei einem Schub
+            # langsamer Antworten sofort auf das Minimum
+            if now - self._last_decrease >= self._latency:
+                self.limit = max(self.min_limit, int(self.limit * 0.75))
+                self._last_decrease = now
+        else:
+            self._fast_calls += 1
+            if self._fast_calls >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._fast_calls = 0
+
+    def call(self, function, *args, **kwargs):
+        """Calls function in a slot of the bulkhead."""
+        self.acquire()
+        start = time.monotonic()
+        latency = None
+        try:
+            result = function(*args, **kwargs)
+        except (requests.exceptions.Timeout, TimeoutError) as e:
+            # Timeouts zeigen Überlast an; schnelle Fehler (Circuit offen, Verbindung abgelehnt) nicht
+            if not isinstance(e, DeadlineExceeded):
+                latency = time.monotonic() - start
+            raise
+        else:
+            latency = time.monotonic() - start
+            return result
+        finally:
+            self.release(latency)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "maxLimit": self.max_limit,
+                "inFlight": self._in_flight,
+                "waiting": self._waiting,
+                "calls": self.calls,
+                "queued": self.queued,
+                "rejections": self.rejections,
+                "waitSeconds": round(self.wait_seconds, 2),
+                "maxWaitSeconds": round(self.max_wait_seconds, 2),
+                "latencyMs": round(self._latency * 1000) if self._latency is not None else None,
+                "baselineLatencyMs": round(self._baseline * 1000) if self._baseline is not None else None
+            }
+
+
+_bulkheads = {name: Bulkhead(name) for name in UPSTREAMS}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(upstream):
+    """Returns the bulkhead of an upstream (created on first use for unknown names)."""
+    with _bulkheads_lock:
+        bulkhead = _bulkheads.get(upstream)
+        if bulkhead is None:
+            bulkhead = _bulkheads[upstream] = Bulkhead(upstream)
+        return bulkhead
+
+
+def bulkhead_stats():
+    """Limits, usage and wait metrics of all bulkheads."""
+    with _bulkheads_lock:
+        bulkheads = dict(_bulkheads)
+    return {name: bulkhead.stats() for name, bulkhead in bulkheads.items()}
+
+
+def was_not_sent(error):
+    """True if the request certainly never reached the server (connect failed), so even a POST may be repeated."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def is_retryable_error(error, idempotent):
+    """Transport errors are retryable for idempotent calls, otherwise only if nothing was sent."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded, BulkheadFullError)):
+        return False
+    if was_not_sent(error):
+        return True
+    return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                             requests.exceptions.ChunkedEncodingError))
+
+
+def retry_after_seconds(value):
+    """Seconds from a Retry-After header (seconds or HTTP date), None if missing or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class RetryBudget:
+    """
+    Caps retries across all callers: within the sliding window at most `ratio` retries
+    per call plus a reserve of `min_per_second`, so retries cannot multiply the load
+    on an upstream that is already failing.
+    """
+
+    def __init__(self, ratio=None, min_per_second=None, window=None, clock=time.monotonic):
+        self.ratio = ratio if ratio is not None else retry_budget_ratio
+        self.min_per_second = min_per_second if min_per_second is not None else retry_budget_min_per_second
+        self.window = window or retry_budget_window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._retries = deque()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _prune(self, now):
+        for timestamps in (self._calls, self._retries):
+            while timestamps and now - timestamps[0] > self.window:
+                timestamps.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            self._calls.append(now)
+
+    def try_retry(self):
+        """Withdraws one retry; False if the budget is used up."""
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            if len(self._retries) >= self.min_per_second * self.window + self.ratio * len(self._calls):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            self.retries += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._prune(self._clock())
+            return {
+                "callsInWindow": len(self._calls),
+                "retriesInWindow": len(self._retries),
+                "retries": self.retries,
+                "exhausted": self.exhausted
+            }
+
+
+retry_budget = RetryBudget()
+
+
+class RetryPolicy:
+    """
+    Retries a call with exponential backoff and full jitter (a random delay between 0
+    and min(max_delay, base_delay * 2^attempt)).
+
+    Errors are classified by `retryable_error(error, idempotent)`, results by
+    `retry_after(result, idempotent)`, which returns None for "done" or the minimum
+    delay in seconds before the next attempt. Every retry is withdrawn from the
+    shared RetryBudget; no retry is started whose delay would outlast the deadline.
+    """
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None, budget=None,
+                 retryable_status_codes=RETRYABLE_STATUS_CODES, sleep=time.sleep, random=random.random):
+        self.max_attempts = max_attempts or retry_max_attempts
+        self.base_delay = base_delay if base_delay is not None else retry_base_delay
+        self.max_delay = max_delay if max_delay is not None else retry_max_delay
+        self.budget = budget or retry_budget
+        self.retryable_status_codes = retryable_status_codes
+        self._sleep = sleep
+        self._random = random
+
+    def backoff(self, attempt):
+        return self._random() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def response_retry_after(self, response, idempotent):
+        """Minimum delay before repeating a request with this response, or None."""
+        if response.status_code not in self.retryable_status_codes:
+            return None
+        if not idempotent and response.status_code not in REJECTED_STATUS_CODES:
+            return None
+        return retry_after_seconds(response.headers.get("Retry-After")) or 0.0
+
+    def call(self, function, *args, idempotent=True, retryable_error=is_retryable_error, retry_after=None,
+             description="call", **kwargs):
+        """
+        Calls function(*args, **kwargs) until it succeeds, fails permanently, runs out of
+        attempts or the retry budget is used up; the last result is returned or the last
+        error raised.
+        """
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not retryable_error(e, idempotent):
+                    raise
+                delay = self.backoff(attempt)
+                if not self._may_retry(delay, description):
+                    raise
+                logging.warning(f"{description} failed ({e}), retry {attempt + 1}/{self.max_attempts - 1} in {delay:.2f}s")
+            else:
+                minimum = retry_after(result, idempotent) if retry_after else None
+                # Längere Retry-After-Zeiten nicht abwarten, sondern das Ergebnis zurückgeben
+                if minimum is None or minimum > self.max_delay or attempt + 1 >= self.max_attempts:
+                    return result
+                delay = max(minimum, self.backoff(attempt))
+                if not self._may_retry(delay, description):
+                    return result
+                if hasattr(result, "close"):
+                    result.close()
+                logging.warning(f"{description} returned a retryable result, retry {attempt + 1}/{self.max_attempts - 1} in {delay:.2f}s")
+            self._sleep(delay)
+            attempt += 1
+
+    def _may_retry(self, delay, description):
+        # Nach Ablauf der Deadline nicht mehr warten, dann erst das Budget belasten
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            logging.warning(f"Not retrying {description}: deadline ends in {max(0.0, remaining):.2f}s")
+            return False
+        if not self.budget.try_retry():
+            logging.warning(f"Retry budget exhausted, not retrying {description}")
+            return False
+        return True
+
+
+default_retry_policy = RetryPolicy()
+
+
+def is_replayable(kwargs):
+    """Bodies from generators or open files cannot be sent a second time."""
+    data = kwargs.get("data")
+    if data is not None and not isinstance(data, (bytes, str, dict, list, tuple)):
+        return False
+    for value in (kwargs.get("files") or {}).values():
+        content = value[1] if isinstance(value, (tuple, list)) else value
+        if not isinstance(content, (bytes, str)):
+            return False
+    return True
+
+
+def http_request(upstream, method, url, idempotent=None, retry_policy=None, **kwargs):
+    """
+    Sends an HTTP request through the bulkhead and circuit breaker of an upstream,
+    retrying transient failures with the retry policy.
+
+    Args:
+        upstream: Name of the upstream (see UPSTREAMS)
+        method: HTTP method
+        url: URL
+        idempotent: Whether the request may be repeated after it reached the server
+            (default: by method; e.g. token and read-only POSTs pass True)
+        retry_policy: RetryPolicy to use (default_retry_policy); requests with bodies that
+            cannot be replayed are sent once
+        **kwargs: Passed to requests.request (timeout defaults to UPSTREAM_DEFAULT_TIMEOUT
+            and is clipped to the remaining request deadline)
+
+    Returns:
+        requests.Response of the last attempt; 5xx responses are returned as before but
+        count as failure
+
+    Raises:
+        CircuitOpenError (a RequestException) while the circuit is open,
+        BulkheadFullError (a RequestException) if no slot of the upstream became free,
+        DeadlineExceeded (a Timeout) once the request deadline has passed,
+        requests.exceptions.RequestException on transport errors
+    """
+    breaker = get_breaker(upstream)
+    bulkhead = get_bulkhead(upstream)
+    kwargs.setdefault("timeout", upstream_default_timeout)
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    policy = retry_policy or default_retry_policy
+
+    timeout = kwargs.pop("timeout")
+
+    def attempt():
+        # Jeder Versuch bekommt nur noch die verbleibende Zeit der Deadline
+        request_timeout = deadline_timeout(timeout, f"{upstream} {method}")
+        breaker.before_call()
+        try:
+            response = requests.request(method, url, timeout=request_timeout, **kwargs)
+        except requests.exceptions.Timeout as e:
+            if deadline_expired():
+                # Timeout durch die Deadline gekürzt, kein Fehler des Upstreams
+                breaker.release()
+                raise DeadlineExceeded(f"{upstream} {method} completed") from e
+            breaker.record_failure()
+            raise
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            raise
+        except Exception:
+            breaker.release()
+            raise
+        if is_failure_status(response.status_code):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    # Jeder Versuch belegt einen Platz im Bulkhead, die Wartezeit zwischen Versuchen nicht
+    if not is_replayable(kwargs):
+        return bulkhead.call(attempt)
+    return policy.call(bulkhead.call, attempt, idempotent=idempotent, retry_after=policy.response_retry_after,
+                       description=f"{upstream} {method} {url.split('?')[0]}")
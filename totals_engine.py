@@ -0,0 +1,198 @@
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import repeat
+from operator import add, floordiv, le, mul, sub, truediv
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # Ohne NumPy wird mit Listen in reinem Python gerechnet
+    np = None
+
+# Werte werden als skalierte Ganzzahlen gerechnet, gerundet wird kaufmännisch (half-up)
+QUANTITY_SCALE = 1000    # Mengen mit 3 Nachkommastellen
+PRICE_SCALE = 10000      # Preise mit 4 Nachkommastellen
+PERCENT_SCALE = 100      # Rabatte in Prozent mit 2 Nachkommastellen
+CENT_SCALE = 100         # Ergebnisse in Cent
+
+# Größtes Zwischenprodukt, das noch sicher in int64 passt
+_INT64_LIMIT = 2 ** 62
+# Skalierte Werte so nahe an x,5 werden exakt über Decimal gerundet
+_TIE_DISTANCE = 0.5 - 1e-6
+
+
+class DocumentTotals(NamedTuple):
+    """Totals of one document, money values rounded to cents."""
+    unit_discounts: list    # discount per unit of each line
+    line_totals: list       # quantity * (unit price - unit discount) of each line
+    declined: list          # True for lines with quantity or unit price <= 0
+    sub_cost: float         # sum of the line totals
+    discount_percentage: float
+    discount_cost: float    # header discount on sub_cost
+    freight_cost: float
+    cost: float             # sub_cost - discount_cost + freight_cost
+
+    def as_custom_fields(self):
+        """The header totals with the keys used in customFields."""
+        return {
+            "discountPercentage": self.discount_percentage,
+            "discountCost": self.discount_cost,
+            "subCost": self.sub_cost,
+            "cost": self.cost,
+            "freightCost": self.freight_cost
+        }
+
+
+def _to_number(value):
+    """Converts portal/Collmex values (None, '', '1,5', 2) to float."""
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "."))
+        except ValueError:
+            return 0.0
+    return float(value)
+
+
+def _decimal_quantize(value, scale):
+    """Scales a value at its decimal representation, rounding half-up (Decimal ROUND_HALF_UP)."""
+    return int((Decimal(str(value)) * scale).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _quantize(value, scale):
+    """
+    Scales a float to an integer at the given precision, rounding half-up.
+
+    round() is exact unless the scaled float is (nearly) halfway between two integers,
+    e.g. 0.125 or 1.005 * 100; these go through Decimal(str(value)).
+    """
+    scaled = value * scale
+    rounded = round(scaled)
+    if abs(scaled - rounded) > _TIE_DISTANCE:
+        return _decimal_quantize(value, scale)
+    return rounded
+
+
+def _div_half_up(numerator, denominator):
+    """Integer division rounding half away from zero (Decimal ROUND_HALF_UP)."""
+    result = (abs(numerator) * 2 + denominator) // (2 * denominator)
+    return -result if numerator < 0 else result
+
+
+def _scale_column(values, scale):
+    scaled = list(map(mul, values, repeat(float(scale))))
+    rounded = list(map(round, scaled))
+    distances = list(map(abs, map(sub, scaled, rounded)))
+    if distances and max(distances) > _TIE_DISTANCE:
+        for index, distance in enumerate(distances):
+            if distance > _TIE_DISTANCE:
+                rounded[index] = _decimal_quantize(values[index], scale)
+    return rounded
+
+
+def _div_half_up_column(numerators, denominator):
+    if not numerators or min(numerators) >= 0:
+        return list(map(floordiv, map(add, map(mul, numerators, repeat(2)), repeat(denominator)),
+                        repeat(2 * denominator)))
+    return [_div_half_up(numerator, denominator) for numerator in numerators]
+
+
+def _line_totals_python(quantities, unit_prices, discount_percentages):
+    quantity = _scale_column(quantities, QUANTITY_SCALE)
+    price = _scale_column(unit_prices, PRICE_SCALE)
+    percent = _scale_column(discount_percentages, PERCENT_SCALE)
+
+    # Rabatt pro Einheit: Preis (e4) * Prozent (e2) / 100 ergibt e4, gerundet auf Cent
+    unit_discount = _div_half_up_column(list(map(mul, price, percent)), 10 ** 6)
+    # Positionssumme: Menge (e3) * Nettopreis (e4) ergibt e7, gerundet auf Cent
+    net_price = map(sub, price, map(mul, unit_discount, repeat(100)))
+    line = _div_half_up_column(list(map(mul, quantity, net_price)), 10 ** 5)
+    declined = list(map(le, map(min, quantity, price), repeat(0)))
+    return unit_discount, line, declined, sum(line)
+
+
+def _div_half_up_np(numerator, denominator):
+    return np.sign(numerator) * ((np.abs(numerator) * 2 + denominator) // (2 * denominator))
+
+
+def _scale_column_np(values, scale):
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * scale
+    rounded = np.rint(scaled)
+    ties = np.flatnonzero(np.abs(scaled - rounded) > _TIE_DISTANCE)
+    result = rounded.astype(np.int64)
+    for index in ties:
+        result[index] = _decimal_quantize(float(values[index]), scale)
+    return result
+
+
+def _line_totals_numpy(quantities, unit_prices, discount_percentages):
+    quantity = _scale_column_np(quantities, QUANTITY_SCALE)
+    price = _scale_column_np(unit_prices, PRICE_SCALE)
+    percent = _scale_column_np(discount_percentages, PERCENT_SCALE)
+
+    unit_discount = _div_half_up_np(price * percent, 10 ** 6)
+    net_price = price - unit_discount * 100
+    if len(quantity) and int(np.abs(quantity).max()) * int(np.abs(net_price).max()) * 2 >= _INT64_LIMIT:
+        # Zwischenprodukt würde int64 sprengen
+        return _line_totals_python(quantities, unit_prices, discount_percentages)
+    line = _div_half_up_np(quantity * net_price, 10 ** 5)
+    declined = (quantity <= 0) | (price <= 0)
+    return unit_discount, line, declined.tolist(), int(line.sum())
+
+
+def _to_money(cents):
+    """Converts a column of cents to a list of floats."""
+    if np is not None and isinstance(cents, np.ndarray):
+        return (cents / CENT_SCALE).tolist()
+    return list(map(truediv, cents, repeat(CENT_SCALE)))
+
+
+def compute_totals(quantities, unit_prices, discount_percentages, discount_percentage=0.0, freight_cost=0.0):
+    """
+    Computes line totals and document totals in columnar passes.
+
+    Inputs are quantized half-up at their decimal representation to 3 (quantity),
+    4 (unit price) and 2 (percentages) decimals and computed as scaled integers;
+    money values are rounded half-up to the cent.
+
+    Args:
+        quantities: Sequence of line quantities
+        unit_prices: Sequence of line unit prices
+        discount_percentages: Sequence of line discount percentages
+        discount_percentage: Header discount in percent applied to the subtotal
+        freight_cost: Freight added to the total
+
+    Returns:
+        DocumentTotals
+    """
+    if np is not None:
+        unit_discount, line, declined, sub_cents = _line_totals_numpy(quantities, unit_prices, discount_percentages)
+    else:
+        unit_discount, line, declined, sub_cents = _line_totals_python(quantities, unit_prices, discount_percentages)
+
+    discount_cents = _div_half_up(sub_cents * _quantize(discount_percentage, PERCENT_SCALE), 10 ** 4)
+    freight_cents = _quantize(freight_cost, CENT_SCALE)
+    return DocumentTotals(
+        unit_discounts=_to_money(unit_discount),
+        line_totals=_to_money(line),
+        declined=declined,
+        sub_cost=sub_cents / CENT_SCALE,
+        discount_percentage=discount_percentage,
+        discount_cost=discount_cents / CENT_SCALE,
+        freight_cost=freight_cents / CENT_SCALE,
+        cost=(sub_cents - discount_cents + freight_cents) / CENT_SCALE,
+    )
+
+
+def totals_from_line_items(line_items, discount_percentage=0.0, freight_cost=0.0):
+    """
+    Computes the totals of portal line items (quantity, unitPrice, discountPercentage).
+    """
+    quantities, unit_prices, discounts = [], [], []
+    for item in line_items:
+        quantities.append(_to_number(item.get("quantity")))
+        unit_prices.append(_to_number(item.get("unitPrice")))
+        discounts.append(_to_number(item.get("discountPercentage")))
+    return compute_totals(quantities, unit_prices, discounts,
+                          _to_number(discount_percentage), _to_number(freight_cost))
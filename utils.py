@@ -1,4 +1,7 @@
 import uuid
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
 def get_nested(data, *keys, default=None):
@@ -152,4 +155,94 @@ def transform_response(response):
         "submittedDate": get_nested(response, "submittedDate", default=None),
         "attachments": get_nested(response, "attachments", default=None)
     }
-    return transformed
\ No newline at end of file
+    return transformed
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time-to-live per entry and a maximum size.
+    Keeps hit/miss counters for monitoring.
+    """
+
+    def __init__(self, maxsize=256, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, stored_at_utc, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value or default if the key is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Stores a value and evicts the least recently used entries beyond maxsize."""
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, datetime.utcnow(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Removes a key. Returns True if it was cached."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+                return True
+            return False
+
+    def invalidate_where(self, predicate):
+        """Removes all keys for which predicate(key) is true. Returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_if_older(self, key, changed_at):
+        """
+        Removes a key if it was stored before changed_at (naive UTC datetime).
+        Returns True if the entry was removed.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < changed_at:
+                del self._entries[key]
+                self.invalidations += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns size and hit/miss counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }